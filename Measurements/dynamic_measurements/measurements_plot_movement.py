@@ -1,6 +1,16 @@
 import matplotlib.pyplot as plt
+import os
 import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'helper_scripts'))
+from figure_output import parse_output_arguments, show_figures
+from kalman_filter import smooth_recording
+from plot_decimation import plot_decimated
+from recording_loader import load_recording, split_recording
+
+# Option adding the positions of an offline Rauch-Tung-Striebel smoother (see kalman_filter.smooth_recording()) to the plots
+SMOOTHED_OPTION = '--smoothed'
+
 def print_no_document_found_error():
     print("ERROR: No .txt document found")
     print("Please add a .txt document as first argument when calling this script")
@@ -8,117 +18,39 @@ def print_no_document_found_error():
     print("Exiting")
     print("\n")
 
-# Returns the amount of samples recorded
-def get_sample_count(filename):
-    with open(filename) as f:
-        for i, l in enumerate(f):
-            pass
-    return i + 1
-
-def get_data(filename):
-    uwb_positions = []
-    filtered_positions = []
-    raw_accelerations = []
-    filtered_accelerations = []
-
-    with open(filename) as f:
-        for line in f:
-            uwb_position = line.split('|')[0]
-            filtered_position = line.split('|')[1]
-            raw_acceleration = line.split('|')[2]
-            filtered_acceleration = line.split('|')[3]
-
-            uwb_x = float(uwb_position.split(',')[0])
-            uwb_y = float(uwb_position.split(',')[1])
-            uwb_z = float(uwb_position.split(',')[2])
-            
-            filtered_x = float(filtered_position.split(',')[0])
-            filtered_y = float(filtered_position.split(',')[1])
-            filtered_z = float(filtered_position.split(',')[2])
-            
-            raw_acceleration_x = float(raw_acceleration.split(',')[0])
-            raw_acceleration_y = float(raw_acceleration.split(',')[1])
-            raw_acceleration_z = float(raw_acceleration.split(',')[2])
-            
-            filtered_acceleration_x = float(filtered_acceleration.split(',')[0])
-            filtered_acceleration_y = float(filtered_acceleration.split(',')[1])
-            filtered_acceleration_z = float(filtered_acceleration.split(',')[2])
-
-            # Add positions to lists
-            uwb_positions.append([uwb_x, uwb_y, uwb_z])
-            filtered_positions.append([filtered_x, filtered_y, filtered_z])
-            raw_accelerations.append([raw_acceleration_x, raw_acceleration_y, raw_acceleration_z])
-            filtered_accelerations.append([filtered_acceleration_x, filtered_acceleration_y, filtered_acceleration_z])
-    
-    return uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations
+# Returns the value groups of a recording followed by its smoothed positions, which are None unless smoothed is set
+def get_data(filename, smoothed=False):
+    data = load_recording(filename)
+    smoothed_positions = smooth_recording(data)[0] if smoothed else None
+    return split_recording(data) + (smoothed_positions,)
 
 def get_values(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations):
-    uwb_x_coordinates = []
-    uwb_y_coordinates = []
-    uwb_z_coordinates = []
-    filtered_x_coordinates = []
-    filtered_y_coordinates = []
-    filtered_z_coordinates = []
-    raw_x_accelerations = []
-    raw_y_accelerations = []
-    raw_z_accelerations = []
-    filtered_x_accelerations = []
-    filtered_y_accelerations = []
-    filtered_z_accelerations = []
-
-    for p in uwb_positions:
-        uwb_x_coordinate = p[0]
-        uwb_x_coordinates.append(uwb_x_coordinate)
-        uwb_y_coordinate = p[1]
-        uwb_y_coordinates.append(uwb_y_coordinate)
-        uwb_z_coordinate = p[2]
-        uwb_z_coordinates.append(uwb_z_coordinate)
-    
-    for p in filtered_positions:
-        filtered_x_coordinate = p[0]
-        filtered_x_coordinates.append(filtered_x_coordinate)
-        filtered_y_coordinate = p[1]
-        filtered_y_coordinates.append(filtered_y_coordinate)
-        filtered_z_coordinate = p[2]
-        filtered_z_coordinates.append(filtered_z_coordinate)
-
-    for a in raw_accelerations:
-        raw_x_acceleration = a[0]
-        raw_x_accelerations.append(raw_x_acceleration)
-        raw_y_acceleration = a[1]
-        raw_y_accelerations.append(raw_y_acceleration)
-        raw_z_acceleration = a[2]
-        raw_z_accelerations.append(raw_z_acceleration)
-    
-    for a in filtered_accelerations:
-        filtered_x_acceleration = a[0]
-        filtered_x_accelerations.append(filtered_x_acceleration)
-        filtered_y_acceleration = a[1]
-        filtered_y_accelerations.append(filtered_y_acceleration)
-        filtered_z_acceleration = a[2]
-        filtered_z_accelerations.append(filtered_z_acceleration)
-
+    uwb_x_coordinates, uwb_y_coordinates, uwb_z_coordinates = uwb_positions.T
+    filtered_x_coordinates, filtered_y_coordinates, filtered_z_coordinates = filtered_positions.T
+    raw_x_accelerations, raw_y_accelerations, raw_z_accelerations = raw_accelerations.T
+    filtered_x_accelerations, filtered_y_accelerations, filtered_z_accelerations = filtered_accelerations.T
     return uwb_x_coordinates, uwb_y_coordinates, uwb_z_coordinates, filtered_x_coordinates, filtered_y_coordinates, filtered_z_coordinates, raw_x_accelerations, raw_y_accelerations, raw_z_accelerations, filtered_x_accelerations, filtered_y_accelerations, filtered_z_accelerations
 
-def plot(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations, sample_count):
+def plot(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations, sample_count, smoothed_positions=None):
     fig = plt.figure('''figsize=(7, 13)''')
     ax0 = plt.subplot(111)
     #ax1 = plt.subplot(212, projection='3d')
     plt.title("Raw UWB and filtered positions")
-    plot_2D_cartesian(uwb_positions, filtered_positions, ax0)
+    plot_2D_cartesian(uwb_positions, filtered_positions, ax0, smoothed_positions)
     #plot_3D(uwb_positions, filtered_positions, ax1)
-    plt.show()
-    plot_line_chart(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations, sample_count)
+    show_figures('movement')
+    plot_line_chart(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations, sample_count, smoothed_positions)
 
-def plot_2D_cartesian(uwb_positions, filtered_positions, axs):
+def plot_2D_cartesian(uwb_positions, filtered_positions, axs, smoothed_positions=None):
     plt.xlabel = "X Axis"
     plt.ylabel = "Y Axis"
-    # Plot 2D raw UWB positions
-    for x, y, z in uwb_positions:
-        axs.scatter(x, y, c='b', marker='^')
+    # Plot 2D raw UWB positions, one collection for all points
+    axs.scatter(uwb_positions[:, 0], uwb_positions[:, 1], c='b', marker='^')
     # Plot 2D filtered positions
-    for x, y, z in filtered_positions:
-        axs.scatter(x, y, c='r', marker='x')
+    axs.scatter(filtered_positions[:, 0], filtered_positions[:, 1], c='r', marker='x')
+    # Plot 2D smoothed positions
+    if smoothed_positions is not None:
+        axs.scatter(smoothed_positions[:, 0], smoothed_positions[:, 1], c='m', marker='.')
     #plot_ground_truth()
 
 def plot_ground_truth():
@@ -136,65 +68,74 @@ def plot_3D(uwb_positions, filtered_positions, axs):
     axs.set_ylabel('Y Axis')
     axs.set_zlabel('Z Axis')
 
-    # Plot 3D raw uwb positions
-    for x, y, z in uwb_positions:
-        axs.scatter(x, y, z, c='b', marker='^')
+    # Plot 3D raw uwb positions, one collection for all points
+    axs.scatter(uwb_positions[:, 0], uwb_positions[:, 1], uwb_positions[:, 2], c='b', marker='^')
     # Plot 3D filtered positions
-    for x, y, z in filtered_positions:
-        axs.scatter(x, y, z, c='r', marker='x')
+    axs.scatter(filtered_positions[:, 0], filtered_positions[:, 1], filtered_positions[:, 2], c='r', marker='x')
 
-def plot_line_chart(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations, sample_count):
+def plot_line_chart(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations, sample_count, smoothed_positions=None):
     fig = plt.figure()
     uwb_x_coordinates, uwb_y_coordinates, uwb_z_coordinates, filtered_x_coordinates, filtered_y_coordinates, filtered_z_coordinates, raw_x_accelerations, raw_y_accelerations, raw_z_accelerations, filtered_x_accelerations, filtered_y_accelerations, filtered_z_accelerations = get_values(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations)
     plt.title("Raw UWB and filtered positions")
     # Plot coordinates
     ax1 = plt.subplot(311)
-    ax1.plot(range(sample_count), uwb_x_coordinates, label='UWB X', c='b')
-    ax1.plot(range(sample_count), filtered_x_coordinates, label='Filtered X', c='r')
+    plot_decimated(ax1, range(sample_count), uwb_x_coordinates, label='UWB X', c='b')
+    plot_decimated(ax1, range(sample_count), filtered_x_coordinates, label='Filtered X', c='r')
+    if smoothed_positions is not None:
+        plot_decimated(ax1, range(sample_count), smoothed_positions[:, 0], label='Smoothed X', c='m')
     ax1.legend()
 
     ax2 = plt.subplot(312)
-    ax2.plot(range(sample_count), uwb_y_coordinates, label='UWB Y', c='b')
-    ax2.plot(range(sample_count), filtered_y_coordinates, label='Filtered Y', c='r')
+    plot_decimated(ax2, range(sample_count), uwb_y_coordinates, label='UWB Y', c='b')
+    plot_decimated(ax2, range(sample_count), filtered_y_coordinates, label='Filtered Y', c='r')
+    if smoothed_positions is not None:
+        plot_decimated(ax2, range(sample_count), smoothed_positions[:, 1], label='Smoothed Y', c='m')
     ax2.legend()
 
     ax3 = plt.subplot(313)
-    ax3.plot(range(sample_count), uwb_z_coordinates, label='UWB Z', c='b')
-    ax3.plot(range(sample_count), filtered_z_coordinates, label='Filtered Z', c='r')
+    plot_decimated(ax3, range(sample_count), uwb_z_coordinates, label='UWB Z', c='b')
+    plot_decimated(ax3, range(sample_count), filtered_z_coordinates, label='Filtered Z', c='r')
+    if smoothed_positions is not None:
+        plot_decimated(ax3, range(sample_count), smoothed_positions[:, 2], label='Smoothed Z', c='m')
     ax3.axhline(1.67, 0, 1, label='User Height', c='g')
     ax3.legend()
 
-    plt.show()
+    show_figures('positions')
 
     # Plot accelerations
     fig = plt.figure()
     plt.title("Raw and filtered accelerations")
     ax1 = plt.subplot(311)
-    ax1.plot(range(sample_count), raw_x_accelerations, label='Raw X', c='b')
-    ax1.plot(range(sample_count), filtered_x_accelerations, label='Filtered X', c='r')
+    plot_decimated(ax1, range(sample_count), raw_x_accelerations, label='Raw X', c='b')
+    plot_decimated(ax1, range(sample_count), filtered_x_accelerations, label='Filtered X', c='r')
     ax1.legend()
 
     ax2 = plt.subplot(312)
-    ax2.plot(range(sample_count), raw_y_accelerations, label='Raw Y', c='b')
-    ax2.plot(range(sample_count), filtered_y_accelerations, label='Filtered Y', c='r')
+    plot_decimated(ax2, range(sample_count), raw_y_accelerations, label='Raw Y', c='b')
+    plot_decimated(ax2, range(sample_count), filtered_y_accelerations, label='Filtered Y', c='r')
     ax2.legend()
 
     ax3 = plt.subplot(313)
-    ax3.plot(range(sample_count), raw_z_accelerations, label='Raw Z', c='b')
-    ax3.plot(range(sample_count), filtered_z_accelerations, label='Filtered Z', c='r')
+    plot_decimated(ax3, range(sample_count), raw_z_accelerations, label='Raw Z', c='b')
+    plot_decimated(ax3, range(sample_count), filtered_z_accelerations, label='Filtered Z', c='r')
     ax3.axhline(2.0, 0, 1, label='Z Acc Threshold', c='g')
     ax3.axhline(-2.0, 0, 1, c='g')
     ax3.legend()
 
-    plt.show()
+    show_figures('accelerations')
 
 if __name__ == "__main__":
+    parse_output_arguments()
+    smoothed = SMOOTHED_OPTION in sys.argv
+    if smoothed:
+        sys.argv.remove(SMOOTHED_OPTION)
     try:
         filename = sys.argv[1]
     except IndexError:
         print_no_document_found_error()
         exit(1)
     
-    sample_count = get_sample_count(filename)
-    uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations = get_data(filename)
-    plot(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations, sample_count)
+    # The sample count is taken from the parsed data so that the recording is read only once, e.g. from a pipe via '-'
+    uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations, smoothed_positions = get_data(filename, smoothed)
+    sample_count = len(uwb_positions)
+    plot(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations, sample_count, smoothed_positions)
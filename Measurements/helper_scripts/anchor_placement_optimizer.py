@@ -0,0 +1,168 @@
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from dilution_of_precision import dop_values_from_sums, grid_coordinates, unit_vector_products
+from dilution_of_precision_evaluation import ANCHOR_POSITIONS, DEFAULT_Z, calculate_and_plot_dop
+from figure_output import DEFAULT_OUTPUT_FORMATS, enable_headless_output, parse_output_formats
+
+"""
+This script searches anchor layouts with a low dilution of precision over a target area at a given height.
+Anchors can be mounted on a grid of positions on the walls and/or the ceiling of a rectangular room. The search runs
+coordinate descent from random layouts: anchor by anchor, every anchor is moved to the mount position that improves
+the objective the most, until no move improves it any more.
+The unit vector products of every mount position are computed once for all target positions. The DOP values of all
+layouts that differ in one anchor are then evaluated in a single batched step, so every sweep explores thousands of
+layouts. Restarts run in a pool of processes and layouts found before are cached, so restarts ending up in a known
+optimum stop early.
+"""
+
+DEFAULT_ROOM = [0.0, 0.0, 0.0, 3.76, 3.5, 2.6]
+DEFAULT_SURFACES = ['walls', 'ceiling']
+DEFAULT_ANCHOR_COUNT = 4
+DEFAULT_MOUNT_RESOLUTION = 0.25
+DEFAULT_TARGET_RESOLUTION = 0.25
+DEFAULT_RESTARTS = 32
+MAX_SWEEPS = 50
+OBJECTIVES = ['mean', 'max']
+OPTIMIZED_DOP_NAMES = ['PDOP', 'HDOP', 'VDOP']
+# Number of the best layouts printed
+REPORTED_LAYOUT_COUNT = 5
+
+# Returns all mount positions on the given surfaces ('walls', 'ceiling') of a room given as [x_min, y_min, z_min, x_max, y_max, z_max]
+def get_mount_positions(room, surfaces, resolution=DEFAULT_MOUNT_RESOLUTION):
+    x_min, y_min, z_min, x_max, y_max, z_max = room
+    x_coordinates = grid_coordinates(x_min, x_max, resolution)
+    y_coordinates = grid_coordinates(y_min, y_max, resolution)
+    z_coordinates = grid_coordinates(z_min, z_max, resolution)
+    positions = []
+    if 'walls' in surfaces:
+        for x, y in [(x, y_min) for x in x_coordinates] + [(x, y_max) for x in x_coordinates] + [(x_min, y) for y in y_coordinates] + [(x_max, y) for y in y_coordinates]:
+            positions += [[x, y, z] for z in z_coordinates]
+    if 'ceiling' in surfaces:
+        positions += [[x, y, z_max] for x in x_coordinates for y in y_coordinates]
+    if len(positions) == 0:
+        raise ValueError("No mount positions on surfaces {}".format(surfaces))
+    # Corners are part of two walls
+    return np.unique(np.array(positions), axis=0)
+
+# Returns the unit vector products (see dilution_of_precision.unit_vector_products()) of every mount position for all
+# target positions as an array of shape (mount positions, 9, target positions)
+def get_mount_products(mount_positions, target_positions):
+    x, y, z = target_positions.T
+    return np.array([unit_vector_products(mount_position, x, y, z) for mount_position in mount_positions])
+
+# Returns the objective of layouts from the sums of their anchors' unit vector products of shape (..., 9, target positions).
+# Target positions without a solution make a layout infinitely bad.
+def layout_objectives(sums, anchor_count, name='PDOP', objective='mean'):
+    values = dop_values_from_sums(np.moveaxis(sums, -2, 0), anchor_count)[name]
+    values = np.where(np.isnan(values), np.inf, values)
+    return values.mean(axis=-1) if objective == 'mean' else values.max(axis=-1)
+
+# Returns the objective of a single layout given by mount position indices
+def layout_objective(mount_products, layout, name='PDOP', objective='mean'):
+    return float(layout_objectives(mount_products[list(layout)].sum(axis=0), len(layout), name, objective))
+
+# Runs coordinate descent from a random layout and returns the objective and mount position indices of the optimum.
+# known_optima maps layouts already found to their objective; reaching one of them ends the descent early.
+def descend(mount_products, anchor_count, rng, name='PDOP', objective='mean', known_optima=None):
+    known_optima = {} if known_optima is None else known_optima
+    layout = rng.choice(len(mount_products), anchor_count, replace=False)
+    sums = mount_products[layout].sum(axis=0)
+    current_objective = float(layout_objectives(sums, anchor_count, name, objective))
+    for _ in range(MAX_SWEEPS):
+        improved = False
+        for i in rng.permutation(anchor_count):
+            # Objectives of all layouts with anchor i moved to any mount position, at once
+            candidate_objectives = layout_objectives((sums - mount_products[layout[i]])[None] + mount_products, anchor_count, name, objective)
+            # Two anchors never share a mount position
+            candidate_objectives[layout] = np.inf
+            best = int(np.argmin(candidate_objectives))
+            if candidate_objectives[best] < current_objective - 1e-12:
+                sums += mount_products[best] - mount_products[layout[i]]
+                layout[i] = best
+                current_objective = float(candidate_objectives[best])
+                improved = True
+        key = tuple(sorted(layout.tolist()))
+        if not improved or key in known_optima:
+            break
+    key = tuple(sorted(layout.tolist()))
+    # Summing up the products again removes the rounding errors of the incremental updates
+    if key not in known_optima:
+        known_optima[key] = layout_objective(mount_products, key, name, objective)
+    return known_optima[key], key
+
+# Runs one descent per seed with a shared cache of known optima and returns their results
+def descend_group(mount_products, anchor_count, seeds, name='PDOP', objective='mean'):
+    known_optima = {}
+    return [descend(mount_products, anchor_count, np.random.default_rng(seed), name, objective, known_optima) for seed in seeds]
+
+# Runs restarts descents, in a pool of 'jobs' processes if jobs > 1, and returns the distinct optima found, best first.
+# The seeds of the restarts are fixed, so the result never depends on the number of jobs.
+def optimize_layout(mount_products, anchor_count, restarts=DEFAULT_RESTARTS, name='PDOP', objective='mean', jobs=1, seed=0):
+    seeds = [[seed, restart] for restart in range(restarts)]
+    group_size = max(1, -(-restarts // (max(1, jobs) * 4)))
+    seed_groups = [seeds[i:i + group_size] for i in range(0, restarts, group_size)]
+    arguments = (repeat(mount_products), repeat(anchor_count), seed_groups, repeat(name), repeat(objective))
+    if jobs <= 1:
+        group_results = list(map(descend_group, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            group_results = list(executor.map(descend_group, *arguments))
+    optima = dict((layout, layout_objective_value) for results in group_results for layout_objective_value, layout in results)
+    return sorted((layout_objective_value, layout) for layout, layout_objective_value in optima.items())
+
+def parse_floats(string, count):
+    values = [float(value) for value in string.split(',')]
+    if len(values) != count:
+        raise argparse.ArgumentTypeError("Expected {} comma separated values".format(count))
+    return values
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Searches anchor layouts with a low dilution of precision over a target area.")
+    parser.add_argument('--anchors', type=int, default=DEFAULT_ANCHOR_COUNT, help="Number of anchors (default: %(default)s)")
+    parser.add_argument('--room', type=lambda string: parse_floats(string, 6), default=DEFAULT_ROOM, help="Room bounds x_min,y_min,z_min,x_max,y_max,z_max (default: {})".format(','.join(str(value) for value in DEFAULT_ROOM)))
+    parser.add_argument('--surfaces', default=','.join(DEFAULT_SURFACES), help="Comma separated mountable surfaces, walls and/or ceiling (default: %(default)s)")
+    parser.add_argument('--mount-resolution', type=float, default=DEFAULT_MOUNT_RESOLUTION, help="Spacing of mount positions on the surfaces in meters (default: %(default)s)")
+    parser.add_argument('--area', type=lambda string: parse_floats(string, 4), help="Target area x_min,y_min,x_max,y_max (default: the room's floor)")
+    parser.add_argument('--z', type=float, default=DEFAULT_Z, help="Height of the target area (default: %(default)s)")
+    parser.add_argument('--target-resolution', type=float, default=DEFAULT_TARGET_RESOLUTION, help="Spacing of target positions in meters (default: %(default)s)")
+    parser.add_argument('--dop', choices=OPTIMIZED_DOP_NAMES, default='PDOP', help="DOP to minimize (default: %(default)s)")
+    parser.add_argument('--objective', choices=OBJECTIVES, default='mean', help="Minimize the mean or the worst DOP over the target area (default: %(default)s)")
+    parser.add_argument('--restarts', type=int, default=DEFAULT_RESTARTS, help="Number of descents from random layouts (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random layouts (default: %(default)s)")
+    parser.add_argument('--jobs', type=int, default=1, help="Number of processes running descents in parallel (default: %(default)s)")
+    parser.add_argument('--save', help="Write the best layout to this file, one anchor x,y,z per line, usable with --anchors of dilution_of_precision_evaluation.py")
+    parser.add_argument('--output-dir', help="Render headless and save all figures into this directory instead of showing them")
+    parser.add_argument('--output-format', default=','.join(DEFAULT_OUTPUT_FORMATS), help="Comma separated formats of saved figures, png and/or svg (default: %(default)s)")
+    args = parser.parse_args()
+    if args.output_dir is not None:
+        enable_headless_output(args.output_dir, parse_output_formats(args.output_format))
+
+    x_min, y_min, _, x_max, y_max, _ = args.room
+    area = args.area if args.area is not None else [x_min, y_min, x_max, y_max]
+    target_y, target_x = np.meshgrid(grid_coordinates(area[1], area[3], args.target_resolution), grid_coordinates(area[0], area[2], args.target_resolution), indexing='ij')
+    target_positions = np.stack([target_x.ravel(), target_y.ravel(), np.full(target_x.size, args.z)], axis=1)
+    mount_positions = get_mount_positions(args.room, args.surfaces.split(','), args.mount_resolution)
+    if args.anchors > len(mount_positions):
+        parser.error("More anchors than mount positions")
+    mount_products = get_mount_products(mount_positions, target_positions)
+
+    print("")
+    print("Searching layouts of {} anchors on {} mount positions for {} target positions at {}m".format(args.anchors, len(mount_positions), len(target_positions), args.z))
+    optima = optimize_layout(mount_products, args.anchors, args.restarts, args.dop, args.objective, args.jobs, args.seed)
+
+    x, y, z = target_positions.T
+    current_sums = np.sum([unit_vector_products(anchor_position, x, y, z) for anchor_position in ANCHOR_POSITIONS], axis=0)
+    print("{} {} of the current layout: {:.3f}".format(args.objective.capitalize(), args.dop, float(layout_objectives(current_sums, len(ANCHOR_POSITIONS), args.dop, args.objective))))
+    print("{} distinct optima found in {} restarts".format(len(optima), args.restarts))
+    for rank, (layout_objective_value, layout) in enumerate(optima[:REPORTED_LAYOUT_COUNT]):
+        print("{}. {} {}: {:.3f}".format(rank + 1, args.objective.capitalize(), args.dop, layout_objective_value))
+        for anchor_position in mount_positions[list(layout)]:
+            print("   Anchor at ({:.2f}, {:.2f}, {:.2f})".format(*anchor_position))
+    print("")
+
+    best_anchor_positions = mount_positions[list(optima[0][1])]
+    if args.save is not None:
+        np.savetxt(args.save, best_anchor_positions, delimiter=',', fmt='%.3f', header='x,y,z')
+    calculate_and_plot_dop(args.z, args.target_resolution / 5, best_anchor_positions)
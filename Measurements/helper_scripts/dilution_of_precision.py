@@ -0,0 +1,204 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, repeat
+
+"""
+Dilution of precision (DOP) of an UWB anchor layout for many positions at once.
+The geometry matrix A of a position has one row (unit vector from the position to the anchor, -1) per anchor and the
+DOP values are taken from the diagonal of (A^T A)^-1. Because of the constant clock column, the position block of that
+inverse is the inverse of the 3x3 matrix S = U^T U - s s^T / n, with U the unit vectors, s their sum and n the anchor
+count, and the clock variance is 1 / n + s^T S^-1 s / n^2. S is inverted in closed form on whole arrays of positions,
+which evaluates millions of positions per second without a Python loop or a batched 4x4 inverse.
+Any number of anchors is supported, at least 4 of them not coplanar are needed for a solution.
+"""
+
+DOP_NAMES = ['GDOP', 'PDOP', 'HDOP', 'VDOP', 'TDOP']
+
+# Number of positions evaluated at once, which bounds the memory of the temporary arrays
+DEFAULT_CHUNK_SIZE = 262144
+
+# Returns the DOP values of positions of shape (..., 3) as a dictionary of arrays of shape (...).
+# Positions without a unique solution, e.g. on an anchor or with too few or coplanar anchors, get NaN values.
+def dop_values(anchor_positions, positions, chunk_size=DEFAULT_CHUNK_SIZE):
+    anchor_positions = np.asarray(anchor_positions, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    flat_positions = positions.reshape(-1, 3)
+    values = {name: np.empty(len(flat_positions)) for name in DOP_NAMES}
+    for start in range(0, len(flat_positions), chunk_size):
+        chunk = flat_positions[start:start + chunk_size]
+        for name, chunk_values in chunk_dop_values(anchor_positions, chunk[:, 0], chunk[:, 1], chunk[:, 2]).items():
+            values[name][start:start + chunk_size] = chunk_values
+    return {name: values[name].reshape(positions.shape[:-1]) for name in DOP_NAMES}
+
+# Returns the DOP values of positions given by equally shaped x, y and z coordinate arrays
+def chunk_dop_values(anchor_positions, x, y, z):
+    # Sums of the unit vectors from every position to the anchors and of their products, accumulated anchor by anchor
+    sums = np.zeros((9,) + np.shape(x))
+    products = np.empty_like(sums)
+    for anchor_position in anchor_positions:
+        sums += unit_vector_products(anchor_position, x, y, z, products)
+    return dop_values_from_sums(sums, len(anchor_positions))
+
+# Returns the unit vectors from positions to an anchor and their products as a (9, ...) array holding
+# ux, uy, uz, ux * ux, ux * uy, ux * uz, uy * uy, uy * uz, uz * uz, written into out if given
+def unit_vector_products(anchor_position, x, y, z, out=None):
+    if out is None:
+        out = np.empty((9,) + np.shape(x))
+    ux, uy, uz = out[0], out[1], out[2]
+    np.subtract(anchor_position[0], x, out=ux)
+    np.subtract(anchor_position[1], y, out=uy)
+    np.subtract(anchor_position[2], z, out=uz)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distances = np.sqrt(ux * ux + uy * uy + uz * uz)
+        ux /= distances
+        uy /= distances
+        uz /= distances
+    np.multiply(ux, ux, out=out[3])
+    np.multiply(ux, uy, out=out[4])
+    np.multiply(ux, uz, out=out[5])
+    np.multiply(uy, uy, out=out[6])
+    np.multiply(uy, uz, out=out[7])
+    np.multiply(uz, uz, out=out[8])
+    return out
+
+# Returns the DOP values of positions from the sums of their unit_vector_products() over anchor_count anchors
+def dop_values_from_sums(sums, anchor_count):
+    sx, sy, sz, sxx, sxy, sxz, syy, syz, szz = sums
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Elements of the symmetric matrix S
+        a = sxx - sx * sx / anchor_count
+        b = sxy - sx * sy / anchor_count
+        c = sxz - sx * sz / anchor_count
+        d = syy - sy * sy / anchor_count
+        e = syz - sy * sz / anchor_count
+        f = szz - sz * sz / anchor_count
+
+        # Adjugate and determinant of S
+        a00, a11, a22 = d * f - e * e, a * f - c * c, a * d - b * b
+        a01, a02, a12 = c * e - b * f, b * e - c * d, b * c - a * e
+        determinant = a * a00 + b * a01 + c * a02
+
+        x_variance = a00 / determinant
+        y_variance = a11 / determinant
+        z_variance = a22 / determinant
+        weighted_sum = sx * sx * a00 + sy * sy * a11 + sz * sz * a22 + 2 * (sx * sy * a01 + sx * sz * a02 + sy * sz * a12)
+        time_variance = 1 / anchor_count + weighted_sum / determinant / anchor_count ** 2
+
+        # Singular geometries have no (meaningful) inverse, which includes all positions with less than 4 anchors
+        singular = ~(determinant > 1e-9 * np.maximum(a * d * f, 1e-300)) | ~np.isfinite(determinant) | (anchor_count < 4)
+        values = {
+            'GDOP': np.sqrt(x_variance + y_variance + z_variance + time_variance),
+            'PDOP': np.sqrt(x_variance + y_variance + z_variance),
+            'HDOP': np.sqrt(x_variance + y_variance),
+            'VDOP': np.sqrt(z_variance),
+            'TDOP': np.sqrt(time_variance),
+        }
+    for name in DOP_NAMES:
+        values[name][singular] = np.nan
+    return values
+
+# Returns the coordinates from start to end (both included if end lies on the grid) with the given resolution
+def grid_coordinates(start, end, resolution):
+    return start + resolution * np.arange(int(np.floor((end - start) / resolution + 1e-9)) + 1)
+
+# Returns the DOP values of a grid spanned by x, y and z coordinates as arrays of shape (len(z), len(y), len(x)),
+# so a slice at one height is an image with rows along y and columns along x.
+# The grid positions are generated chunk by chunk, so only the DOP values themselves are held for the whole grid.
+def dop_grid(anchor_positions, x_coordinates, y_coordinates, z_coordinates, chunk_size=DEFAULT_CHUNK_SIZE):
+    anchor_positions = np.asarray(anchor_positions, dtype=float)
+    x_coordinates, y_coordinates, z_coordinates = np.asarray(x_coordinates, dtype=float), np.asarray(y_coordinates, dtype=float), np.asarray(z_coordinates, dtype=float)
+    values = {name: np.empty((len(z_coordinates), len(y_coordinates), len(x_coordinates))) for name in DOP_NAMES}
+    rows_per_chunk = max(1, chunk_size // max(1, len(x_coordinates)))
+    for k, z in enumerate(z_coordinates):
+        for start in range(0, len(y_coordinates), rows_per_chunk):
+            y, x = np.meshgrid(y_coordinates[start:start + rows_per_chunk], x_coordinates, indexing='ij')
+            for name, chunk_values in chunk_dop_values(anchor_positions, x, y, np.full(x.shape, z)).items():
+                values[name][k, start:start + rows_per_chunk] = chunk_values
+    return values
+
+# Anchor outage analysis
+# Every subset of failed anchors is evaluated on the same grid as the remaining layout. Groups of subsets are evaluated
+# in separate processes, each returning the statistics of its subsets and the per-position worst value over them.
+
+# DOP values above this threshold are considered degraded
+DEFAULT_DOP_THRESHOLD = 6.0
+# Maximum number of DOP values held by one group of outages
+MAX_GROUP_VALUES = 2 ** 25
+
+# Returns the anchor positions of a file holding one anchor position 'x,y,z' per line. Lines starting with '#' are ignored.
+def load_anchor_positions(filename):
+    anchor_positions = np.loadtxt(filename, delimiter=',', dtype=float, ndmin=2, comments='#')
+    if anchor_positions.shape[1] != 3:
+        raise ValueError("{} must hold one anchor position x,y,z per line".format(filename))
+    return anchor_positions
+
+# Returns the statistics of DOP values of a grid. Positions without a solution count as degraded.
+def dop_map_statistics(values, x_coordinates, y_coordinates, z_coordinates, threshold=DEFAULT_DOP_THRESHOLD):
+    solvable_values = values[np.isfinite(values)]
+    worst_values = np.where(np.isnan(values), np.inf, values)
+    k, j, i = np.unravel_index(np.argmax(worst_values), values.shape)
+    return {
+        'median': np.median(solvable_values) if len(solvable_values) else np.nan,
+        'p95': np.percentile(solvable_values, 95) if len(solvable_values) else np.nan,
+        'max': solvable_values.max() if len(solvable_values) else np.nan,
+        'degraded_fraction': np.mean(~(values <= threshold)),
+        'unsolvable_fraction': np.mean(np.isnan(values)),
+        'worst_position': [float(x_coordinates[i]), float(y_coordinates[j]), float(z_coordinates[k])],
+    }
+
+# Evaluates a group of outages and returns their statistics together with the worst DOP value of every grid position
+# over all of them (infinite where any outage leaves a position without a solution).
+# The unit vector products of all anchors are computed once per chunk of the grid, every outage then only subtracts
+# those of its failed anchors from their sum instead of summing up the remaining anchors again.
+def evaluate_outage_group(anchor_positions, outage_subsets, x_coordinates, y_coordinates, z_coordinates, name='PDOP', threshold=DEFAULT_DOP_THRESHOLD, chunk_size=DEFAULT_CHUNK_SIZE):
+    anchor_count = len(anchor_positions)
+    values = np.empty((len(outage_subsets), len(z_coordinates), len(y_coordinates), len(x_coordinates)))
+    rows_per_chunk = max(1, chunk_size // max(1, len(x_coordinates) * anchor_count))
+    for k, z in enumerate(z_coordinates):
+        for start in range(0, len(y_coordinates), rows_per_chunk):
+            y, x = np.meshgrid(y_coordinates[start:start + rows_per_chunk], x_coordinates, indexing='ij')
+            products = np.array([unit_vector_products(anchor_position, x, y, np.full(x.shape, z)) for anchor_position in anchor_positions])
+            sums = products.sum(axis=0)
+            for i, failed_anchors in enumerate(outage_subsets):
+                remaining_sums = sums - products[list(failed_anchors)].sum(axis=0)
+                values[i, k, start:start + rows_per_chunk] = dop_values_from_sums(remaining_sums, anchor_count - len(failed_anchors))[name]
+
+    statistics = []
+    worst_values = np.full(values.shape[1:], -np.inf)
+    for failed_anchors, outage_values in zip(outage_subsets, values):
+        outage_statistics = dop_map_statistics(outage_values, x_coordinates, y_coordinates, z_coordinates, threshold)
+        outage_statistics['failed_anchors'] = list(failed_anchors)
+        statistics.append(outage_statistics)
+        np.maximum(worst_values, np.where(np.isnan(outage_values), np.inf, outage_values), out=worst_values)
+    return statistics, worst_values
+
+# Evaluates every failure of 1 up to max_failures anchors, in a pool of 'jobs' processes if jobs > 1.
+# Returns the statistics of all outages, ordered by failure count and failed anchor indices, and for every failure count the worst DOP
+# value of every grid position over all outages of that many anchors.
+def evaluate_outages(anchor_positions, x_coordinates, y_coordinates, z_coordinates, max_failures=2, name='PDOP', threshold=DEFAULT_DOP_THRESHOLD, jobs=1):
+    anchor_positions = np.asarray(anchor_positions, dtype=float)
+    groups = []
+    for failure_count in range(1, max_failures + 1):
+        outage_subsets = list(combinations(range(len(anchor_positions)), failure_count))
+        # Every group holds the DOP maps of all its outages, so large grids get smaller groups
+        group_size = max(1, min(-(-len(outage_subsets) // (max(1, jobs) * 4)), MAX_GROUP_VALUES // (len(x_coordinates) * len(y_coordinates) * len(z_coordinates))))
+        groups += [(failure_count, outage_subsets[i:i + group_size]) for i in range(0, len(outage_subsets), group_size)]
+
+    arguments = ([outage_subsets for _, outage_subsets in groups], repeat(x_coordinates), repeat(y_coordinates), repeat(z_coordinates), repeat(name), repeat(threshold))
+    if jobs <= 1:
+        group_results = map(evaluate_outage_group, repeat(anchor_positions), *arguments)
+        return merge_outage_groups(groups, group_results)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # map() yields the results in the order of submission, so the merged results never depend on scheduling
+        return merge_outage_groups(groups, executor.map(evaluate_outage_group, repeat(anchor_positions), *arguments))
+
+def merge_outage_groups(groups, group_results):
+    statistics = []
+    worst_values = {}
+    for (failure_count, _), (group_statistics, group_worst_values) in zip(groups, group_results):
+        statistics += group_statistics
+        if failure_count in worst_values:
+            np.maximum(worst_values[failure_count], group_worst_values, out=worst_values[failure_count])
+        else:
+            worst_values[failure_count] = group_worst_values
+    return statistics, worst_values
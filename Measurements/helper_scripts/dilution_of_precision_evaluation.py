@@ -1,91 +1,47 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import sys
-from matplotlib import cm
+from dilution_of_precision import DEFAULT_DOP_THRESHOLD, DOP_NAMES, dop_grid, evaluate_outages, grid_coordinates, load_anchor_positions
+from figure_output import parse_output_arguments, show_figures
 
 DEFAULT_Z = 1.73
+# Grid spacing of the DOP maps in meters
+DEFAULT_RESOLUTION = 0.05
+# Number of anchors failing at once evaluated by the outage analysis
+DEFAULT_MAX_FAILURES = 2
+# Number of the worst outages printed by the outage analysis
+REPORTED_OUTAGE_COUNT = 10
 
-def distance_between_two_points3D(reference_coordinate, anchor_coordinate):
-    return np.sqrt(pow(reference_coordinate[0] - anchor_coordinate[0], 2) + pow(reference_coordinate[1] - anchor_coordinate[1], 2) + pow(reference_coordinate[2] - anchor_coordinate[2], 2))
-
-def calculate_and_plot_dop(z):
-    # Define anchor coordiantes here
-    anchor_0_pos = [0.02, 0.20, 2.50]
-    anchor_1_pos = [0.02, 3.41, 1.30]
-    anchor_2_pos = [3.74, 3.48, 2.53]
-    anchor_3_pos = [3.74, 0.05, 0.70]
-
-    # Define reference position coordiantes here (reference positions are the positions for which you would like to calculate the DOP)
-    ref_0_pos = [1.0, 0.0, z]
-    ref_1_pos = [2.0, 0.0, z]
-    ref_2_pos = [3.0, 0.0, z]
-    ref_3_pos = [1.0, 1.0, z]
-    ref_4_pos = [2.0, 1.0, z]
-    ref_5_pos = [3.0, 1.0, z]
-    ref_6_pos = [1.0, 2.0, z]
-    ref_7_pos = [2.0, 2.0, z]
-    ref_8_pos = [3.0, 2.0, z]
-    ref_9_pos = [1.0, 3.0, z]
-
-    # 'anchor_pos' should have a length of 4 elements
-    anchor_pos = [anchor_0_pos, anchor_1_pos, anchor_2_pos, anchor_3_pos]
-    ref_pos = [ref_0_pos, ref_1_pos, ref_2_pos, ref_3_pos, ref_4_pos, ref_5_pos, ref_6_pos, ref_7_pos, ref_8_pos, ref_9_pos]
-    
-    # Save calculated DOP values in these lists for later plotting purposes
-    GDOPs = []
-    PDOPs = []
-    HDOPs = []
-    VDOPs = []
-    
-    for ref in ref_pos:
-        A = []
-        for anchor in anchor_pos:
-            distance = distance_between_two_points3D(ref, anchor)
-            A.append((anchor[0] - ref[0]) / distance)
-            A.append((anchor[1] - ref[1]) / distance)
-            A.append((anchor[2] - ref[2]) / distance)
-            A.append(-1.0)
-        A = np.array(A)
-        A = np.reshape(A, (4, len(anchor_pos)))
-        C = np.linalg.inv(A.T.dot(A))
-
-        x_variance = C[0][0]
-        y_variance = C[1][1]
-        z_variance = C[2][2]
-        time_variance = C[3][3]
-
-        # Calculate dilution of precision properties
-        GDOP = np.sqrt(x_variance + y_variance + z_variance + time_variance)
-        GDOPs.append(GDOP)
-
-        TDOP = np.sqrt(time_variance)
-        
-        PDOP = np.sqrt(x_variance + y_variance + z_variance)
-        PDOPs.append(PDOP)
-        
-        HDOP = np.sqrt(x_variance + y_variance)
-        HDOPs.append(HDOP)
-        
-        VDOP = np.sqrt(z_variance)
-        VDOPs.append(VDOP)
-
-    GDOPs.append(np.nan)
-    GDOPs.append(np.nan)
-    PDOPs.append(np.nan)
-    PDOPs.append(np.nan)
-    HDOPs.append(np.nan)
-    HDOPs.append(np.nan)
-    VDOPs.append(np.nan)
-    VDOPs.append(np.nan)
-
-    GDOPs = np.ndarray(buffer=np.array(GDOPs), shape=(4, 3))
-    PDOPs = np.ndarray(buffer=np.array(PDOPs), shape=(4, 3))
-    HDOPs = np.ndarray(buffer=np.array(HDOPs), shape=(4, 3))
-    VDOPs = np.ndarray(buffer=np.array(VDOPs), shape=(4, 3))
+# Define anchor coordiantes here, any number of anchors may be given. Alternatively pass a file with --anchors.
+ANCHOR_POSITIONS = [
+    [0.02, 0.20, 2.50],
+    [0.02, 3.41, 1.30],
+    [3.74, 3.48, 2.53],
+    [3.74, 0.05, 0.70],
+]
+
+# Define reference position coordinates here (reference positions are marked in the DOP maps)
+REFERENCE_POSITIONS = [[1.0, 0.0], [2.0, 0.0], [3.0, 0.0], [1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [1.0, 2.0], [2.0, 2.0], [3.0, 2.0], [1.0, 3.0]]
+
+# Returns the x and y coordinates of a grid with the given resolution covering all anchors and reference positions
+def get_grid_coordinates(resolution, anchor_positions=ANCHOR_POSITIONS):
+    positions = np.concatenate([np.array(anchor_positions)[:, :2], REFERENCE_POSITIONS])
+    (x_min, y_min), (x_max, y_max) = positions.min(axis=0), positions.max(axis=0)
+    return grid_coordinates(x_min, x_max, resolution), grid_coordinates(y_min, y_max, resolution)
+
+def calculate_and_plot_dop(z, resolution=DEFAULT_RESOLUTION, anchor_positions=ANCHOR_POSITIONS):
+    # DOP values of every grid position at altitude z, computed for the whole grid at once
+    x_coordinates, y_coordinates = get_grid_coordinates(resolution, anchor_positions)
+    dops = dop_grid(anchor_positions, x_coordinates, y_coordinates, [z])
+    GDOPs = dops['GDOP'][0]
+    PDOPs = dops['PDOP'][0]
+    HDOPs = dops['HDOP'][0]
+    VDOPs = dops['VDOP'][0]
+    extent = (x_coordinates[0] - resolution / 2, x_coordinates[-1] + resolution / 2, y_coordinates[0] - resolution / 2, y_coordinates[-1] + resolution / 2)
 
     # Plot DOPs
     fig = plt.figure("Dilution of Precision Evaluation", figsize=(23, 9))
-    fig.suptitle("DOP values for every reference position at {}m altitude".format(z))
+    fig.suptitle("DOP values at {}m altitude with a resolution of {}m".format(z, resolution))
     ax0 = plt.subplot(141)
     ax1 = plt.subplot(142)
     ax2 = plt.subplot(143)
@@ -104,11 +60,18 @@ def calculate_and_plot_dop(z):
     ax3.set_xlabel('X')
     ax3.set_ylabel('Y')
 
-    a0 = ax0.imshow(GDOPs, interpolation='None', origin='lower', cmap='jet', extent=(.5 , 3.5, -.5, 3.5))
-    a1 = ax1.imshow(PDOPs, interpolation='None', origin='lower', cmap='jet', extent=(.5 , 3.5, -.5, 3.5))
-    a2 = ax2.imshow(HDOPs, interpolation='None', origin='lower', cmap='jet', extent=(.5 , 3.5, -.5, 3.5))
-    a3 = ax3.imshow(VDOPs, interpolation='None', origin='lower', cmap='jet', extent=(.5 , 3.5, -.5, 3.5))
+    cmap = plt.get_cmap('jet').copy()
+    cmap.set_bad(color='black')
+    a0 = ax0.imshow(GDOPs, interpolation='None', origin='lower', cmap=cmap, extent=extent)
+    a1 = ax1.imshow(PDOPs, interpolation='None', origin='lower', cmap=cmap, extent=extent)
+    a2 = ax2.imshow(HDOPs, interpolation='None', origin='lower', cmap=cmap, extent=extent)
+    a3 = ax3.imshow(VDOPs, interpolation='None', origin='lower', cmap=cmap, extent=extent)
     
+    reference_positions, anchor_positions = np.array(REFERENCE_POSITIONS), np.array(anchor_positions)
+    for axs in [ax0, ax1, ax2, ax3]:
+        axs.scatter(reference_positions[:, 0], reference_positions[:, 1], c='w', edgecolors='k', marker='o', label='Reference positions')
+        axs.scatter(anchor_positions[:, 0], anchor_positions[:, 1], c='k', marker='^', label='Anchors')
+
     a0_colorbar = fig.colorbar(a0, ax=ax0)
     a0_colorbar.ax.set_title("GDOP", size=18)
     a1_colorbar = fig.colorbar(a1, ax=ax1)
@@ -118,11 +81,87 @@ def calculate_and_plot_dop(z):
     a3_colorbar = fig.colorbar(a3, ax=ax3)
     a3_colorbar.ax.set_title("VDOP", size=18)
     
-    current_cmap = cm.get_cmap()
-    current_cmap.set_bad(color='black')
-    plt.show()
+    show_figures('dilution_of_precision')
+
+# Prints the DOP statistics of the whole volume between the lowest and the highest anchor
+def calculate_and_print_volume_dop(resolution=DEFAULT_RESOLUTION, anchor_positions=ANCHOR_POSITIONS):
+    x_coordinates, y_coordinates = get_grid_coordinates(resolution, anchor_positions)
+    z_coordinates = get_volume_z_coordinates(resolution, anchor_positions)
+    dops = dop_grid(anchor_positions, x_coordinates, y_coordinates, z_coordinates)
+    print("DOP values of {} x {} x {} positions with a resolution of {}m".format(len(x_coordinates), len(y_coordinates), len(z_coordinates), resolution))
+    for name in DOP_NAMES:
+        values = dops[name]
+        print("{}: Min {:.3f} | Mean {:.3f} | Median {:.3f} | Max {:.3f}".format(name, np.nanmin(values), np.nanmean(values), np.nanmedian(values), np.nanmax(values)))
+
+def get_volume_z_coordinates(resolution, anchor_positions=ANCHOR_POSITIONS):
+    anchor_heights = np.array(anchor_positions)[:, 2]
+    return grid_coordinates(anchor_heights.min(), anchor_heights.max(), resolution)
+
+# Evaluates the PDOP of every failure of up to max_failures anchors at altitude z (or in the whole volume), prints the
+# outages degrading the most positions and plots the worst PDOP of every position over all outages
+def calculate_and_plot_outages(z, resolution=DEFAULT_RESOLUTION, anchor_positions=ANCHOR_POSITIONS, max_failures=DEFAULT_MAX_FAILURES, threshold=DEFAULT_DOP_THRESHOLD, volume=False, jobs=1):
+    x_coordinates, y_coordinates = get_grid_coordinates(resolution, anchor_positions)
+    z_coordinates = get_volume_z_coordinates(resolution, anchor_positions) if volume else [z]
+    statistics, worst_values = evaluate_outages(anchor_positions, x_coordinates, y_coordinates, z_coordinates, max_failures, 'PDOP', threshold, jobs)
+
+    print("ANCHOR OUTAGE RESULTS")
+    print("{} outages of {} anchors evaluated, positions with a PDOP above {} or without a solution are degraded".format(len(statistics), len(anchor_positions), threshold))
+    print("Failed anchors | Degraded | Unsolvable | Median | P95 | Max PDOP | Worst position")
+    for outage_statistics in sorted(statistics, key=lambda s: (-s['degraded_fraction'], -np.nan_to_num(s['p95'], nan=np.inf)))[:REPORTED_OUTAGE_COUNT]:
+        print("{} | {:.1f}% | {:.1f}% | {:.3f} | {:.3f} | {:.3f} | ({:.2f}, {:.2f}, {:.2f})".format(
+            outage_statistics['failed_anchors'], 100 * outage_statistics['degraded_fraction'], 100 * outage_statistics['unsolvable_fraction'],
+            outage_statistics['median'], outage_statistics['p95'], outage_statistics['max'], *outage_statistics['worst_position']))
+
+    # Plot the worst PDOP over all outages of each failure count, maximized over the heights of a volume.
+    # Positions degraded by any outage are outlined, those without a solution are black.
+    fig = plt.figure("Anchor Outage Evaluation", figsize=(23, 9))
+    fig.suptitle("Worst PDOP of all outages {}".format("in the volume" if volume else "at {}m altitude".format(z)))
+    extent = (x_coordinates[0] - resolution / 2, x_coordinates[-1] + resolution / 2, y_coordinates[0] - resolution / 2, y_coordinates[-1] + resolution / 2)
+    cmap = plt.get_cmap('jet').copy()
+    cmap.set_bad(color='black')
+    for i, (failure_count, values) in enumerate(sorted(worst_values.items())):
+        axs = plt.subplot(1, len(worst_values), i + 1)
+        axs.set_title("Worst PDOP of {} failed anchor{}".format(failure_count, 's' if failure_count > 1 else ''))
+        axs.set_xlabel('X')
+        axs.set_ylabel('Y')
+        values = values.max(axis=0)
+        image = axs.imshow(np.where(np.isinf(values), np.nan, values), interpolation='None', origin='lower', cmap=cmap, extent=extent, vmax=3 * threshold)
+        axs.contour(x_coordinates, y_coordinates, values > threshold, levels=[0.5], colors='w')
+        axs.scatter(np.array(anchor_positions)[:, 0], np.array(anchor_positions)[:, 1], c='k', marker='^')
+        colorbar = fig.colorbar(image, ax=axs)
+        colorbar.ax.set_title("PDOP", size=18)
+    show_figures('anchor_outages')
+
+# Removes an option with a value from argv and returns its value, or default if it was not given
+def pop_option(argv, option, default, cast):
+    if option not in argv:
+        return default
+    index = argv.index(option)
+    value = cast(argv[index + 1])
+    del argv[index:index + 2]
+    return value
+
+# Removes a flag from argv and returns whether it was given
+def pop_flag(argv, flag):
+    given = flag in argv
+    if given:
+        argv.remove(flag)
+    return given
+
+# Removes the grid, anchor and outage options from argv and returns their values
+def parse_grid_arguments(argv=sys.argv):
+    resolution = pop_option(argv, '--resolution', DEFAULT_RESOLUTION, float)
+    anchor_positions = pop_option(argv, '--anchors', ANCHOR_POSITIONS, load_anchor_positions)
+    max_failures = pop_option(argv, '--max-failures', DEFAULT_MAX_FAILURES, int)
+    threshold = pop_option(argv, '--threshold', DEFAULT_DOP_THRESHOLD, float)
+    jobs = pop_option(argv, '--jobs', 1, int)
+    volume = pop_flag(argv, '--volume')
+    outages = pop_flag(argv, '--outages')
+    return resolution, anchor_positions, volume, outages, max_failures, threshold, jobs
 
 if __name__ == "__main__":
+    parse_output_arguments()
+    resolution, anchor_positions, volume, outages, max_failures, threshold, jobs = parse_grid_arguments()
     # See if any argument was given and use it as z value
     print("")
     try:
@@ -131,11 +170,18 @@ if __name__ == "__main__":
     except IndexError:
         print("Using default z value of {}m.".format(DEFAULT_Z))
         print("Note: You can add a custom z value as argument when calling this script.")
-        print("Example: python3 dilution_of_precision_evaluation.py 1.55")
+        print("Example: python3 dilution_of_precision_evaluation.py 1.55 [--resolution 0.01] [--volume] [--anchors anchors.txt]")
+        print("Anchor outages: python3 dilution_of_precision_evaluation.py 1.55 --outages [--max-failures 2] [--threshold 6] [--jobs 4]")
         z = DEFAULT_Z
     except ValueError:
         print("Error: Unable to cast user argument to float.")
         sys.exit(-1)
     print("")
-    
-    calculate_and_plot_dop(z)
+
+    if outages:
+        calculate_and_plot_outages(z, resolution, anchor_positions, max_failures, threshold, volume, jobs)
+        sys.exit(0)
+    if volume:
+        calculate_and_print_volume_dop(resolution, anchor_positions)
+        print("")
+    calculate_and_plot_dop(z, resolution, anchor_positions)
@@ -0,0 +1,159 @@
+import fnmatch
+import hashlib
+import numpy as np
+import os
+import sys
+from dilution_of_precision import dop_grid, grid_coordinates, load_anchor_positions
+from position_metrics import DIMENSIONS_3D, delta_distances
+from recording_loader import DEFAULT_CHUNK_SIZE, UWB_POSITION, iterate_recording
+
+"""
+Persisted DOP lookup tables for annotating recorded samples with the DOP at their position.
+A table holds the DOP values of a 3D grid around an anchor layout. It is computed once per layout and stored as a .npz
+file named after a hash of the anchor positions and the grid parameters, so a changed layout never hits an old table.
+Samples are annotated by trilinear interpolation between the 8 surrounding grid positions, which costs the same for
+every sample however many anchors there are. Samples outside of the grid are annotated with NaN.
+
+Usage: python3 dop_lookup.py [--anchors <anchors.txt>] [--save] <recording.txt or directory> [<recording.txt or directory> ...]
+Without --anchors the anchor layout of dilution_of_precision_evaluation.py is used. With --save the annotations of
+every recording are written next to it as <recording>.dop.npy, an (N, 4) array of GDOP, PDOP, HDOP and VDOP.
+"""
+
+TABLE_VERSION = 1
+TABLE_PREFIX = 'dop_'
+TABLE_SUFFIX = '.npz'
+DEFAULT_TABLE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.dop_tables')
+ANNOTATION_SUFFIX = '.dop.npy'
+
+# DOP values held by a table, in the order of the annotation columns
+TABLE_DOP_NAMES = ['GDOP', 'PDOP', 'HDOP', 'VDOP']
+# Grid spacing of a table in meters
+DEFAULT_TABLE_RESOLUTION = 0.05
+# Distance by which the grid exceeds the anchors in x and y and the highest anchor in z, in meters
+DEFAULT_TABLE_MARGIN = 1.0
+
+def get_table_key(anchor_positions, resolution, margin):
+    rounded_anchor_positions = np.round(np.asarray(anchor_positions, dtype=float), 6)
+    key = "{}:{}:{}:{}".format(TABLE_VERSION, rounded_anchor_positions.tolist(), resolution, margin)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+# Computes the table of an anchor layout. The grid covers the anchors plus margin in x and y and reaches from the floor
+# up to the highest anchor plus margin.
+def build_dop_table(anchor_positions, resolution=DEFAULT_TABLE_RESOLUTION, margin=DEFAULT_TABLE_MARGIN):
+    anchor_positions = np.asarray(anchor_positions, dtype=float)
+    origin = np.array([anchor_positions[:, 0].min() - margin, anchor_positions[:, 1].min() - margin, 0.0])
+    end = np.array([anchor_positions[:, 0].max() + margin, anchor_positions[:, 1].max() + margin, anchor_positions[:, 2].max() + margin])
+    x_coordinates, y_coordinates, z_coordinates = [grid_coordinates(origin[i], end[i], resolution) for i in range(3)]
+    dops = dop_grid(anchor_positions, x_coordinates, y_coordinates, z_coordinates)
+    return {
+        'anchor_positions': anchor_positions,
+        'origin': origin,
+        'resolution': float(resolution),
+        # (Z, Y, X, names) so the values of all DOPs at a grid position are next to each other
+        'values': np.stack([dops[name] for name in TABLE_DOP_NAMES], axis=-1).astype(np.float32),
+    }
+
+# Returns the table of an anchor layout from the table directory, computing and persisting it if there is none yet
+def get_dop_table(anchor_positions, table_directory=DEFAULT_TABLE_DIRECTORY, resolution=DEFAULT_TABLE_RESOLUTION, margin=DEFAULT_TABLE_MARGIN):
+    path = os.path.join(table_directory, TABLE_PREFIX + get_table_key(anchor_positions, resolution, margin) + TABLE_SUFFIX)
+    try:
+        with np.load(path) as f:
+            return {'anchor_positions': f['anchor_positions'], 'origin': f['origin'], 'resolution': float(f['resolution']), 'values': f['values']}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    table = build_dop_table(anchor_positions, resolution, margin)
+    # Write to a temporary file first so that concurrent readers never see a partially written table
+    os.makedirs(table_directory, exist_ok=True)
+    temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temporary_path, 'wb') as f:
+        np.savez(f, **table)
+    os.replace(temporary_path, path)
+    return table
+
+# Returns the DOP values of positions of shape (..., 3) as an array of shape (..., 4) holding GDOP, PDOP, HDOP and VDOP,
+# trilinearly interpolated from the table
+def lookup_dop(table, positions):
+    positions = np.asarray(positions, dtype=float)
+    values = table['values']
+    grid_shape = np.array(values.shape[2::-1])
+    # Fractional grid indices in x, y, z order
+    indices = (positions.reshape(-1, 3) - table['origin']) / table['resolution']
+    inside = np.all((indices >= 0) & (indices <= grid_shape - 1), axis=1)
+    lower = np.clip(np.floor(indices).astype(np.int64), 0, np.maximum(grid_shape - 2, 0))
+    fractions = np.clip(indices - lower, 0, 1)
+
+    result = np.zeros((len(indices), values.shape[-1]))
+    for corner in range(8):
+        offsets = np.array([(corner >> axis) & 1 for axis in range(3)])
+        weights = np.prod(np.where(offsets, fractions, 1 - fractions), axis=1)
+        x, y, z = (np.minimum(lower + offsets, grid_shape - 1)).T
+        result += weights[:, None] * values[z, y, x]
+    result[~inside] = np.nan
+    return result.reshape(positions.shape[:-1] + (values.shape[-1],))
+
+# Annotates the uwb positions of a recording chunk by chunk and returns the (N, 4) annotations together with the Pearson
+# correlation of the PDOP with the 3D jitter, the distance from every position to the next one
+def annotate_recording(table, filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    annotations = []
+    jitters = []
+    previous_position = np.empty((0, 3))
+    for chunk in iterate_recording(filename, chunk_size):
+        positions = chunk[:, UWB_POSITION]
+        annotations.append(lookup_dop(table, positions).astype(np.float32))
+        # The jitter of a position is the distance to the next position, so the last position of a chunk gets its
+        # jitter with the next chunk
+        jitter_positions = np.concatenate([previous_position, positions])
+        jitters.append(delta_distances(jitter_positions, DIMENSIONS_3D))
+        previous_position = positions[-1:]
+    annotations = np.concatenate(annotations) if annotations else np.empty((0, len(TABLE_DOP_NAMES)), dtype=np.float32)
+    jitters = np.concatenate(jitters) if jitters else np.empty(0)
+    pdops = annotations[:len(jitters), TABLE_DOP_NAMES.index('PDOP')]
+    valid = np.isfinite(pdops)
+    correlation = np.corrcoef(pdops[valid], jitters[valid])[0, 1] if valid.sum() > 1 else np.nan
+    return annotations, correlation
+
+def print_annotation_summary(filename, annotations, correlation):
+    print(filename)
+    inside = np.isfinite(annotations[:, 0])
+    print("Samples: {}, outside of the DOP table: {}".format(len(annotations), int((~inside).sum())))
+    for i, name in enumerate(TABLE_DOP_NAMES):
+        values = annotations[inside, i]
+        if len(values):
+            print("{}: Mean {:.3f} | Median {:.3f} | Max {:.3f}".format(name, values.mean(), np.median(values), values.max()))
+    print("Correlation of PDOP and 3D jitter: {:.3f}".format(correlation))
+    print("")
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    anchor_positions = None
+    if '--anchors' in argv:
+        index = argv.index('--anchors')
+        anchor_positions = load_anchor_positions(argv[index + 1])
+        del argv[index:index + 2]
+    save = '--save' in argv
+    if save:
+        argv.remove('--save')
+    if len(argv) == 0:
+        print("ERROR: No recording given")
+        print("Usage: python3 dop_lookup.py [--anchors <anchors.txt>] [--save] <recording.txt or directory> [<recording.txt or directory> ...]")
+        sys.exit(1)
+    if anchor_positions is None:
+        from dilution_of_precision_evaluation import ANCHOR_POSITIONS
+        anchor_positions = ANCHOR_POSITIONS
+
+    # Directories stand for all recordings they hold
+    filenames = []
+    for argument in argv:
+        if os.path.isdir(argument):
+            filenames += [os.path.join(argument, filename) for filename in sorted(fnmatch.filter(os.listdir(argument), '*.txt'))]
+        else:
+            filenames.append(argument)
+
+    table = get_dop_table(anchor_positions)
+    print("")
+    for filename in filenames:
+        annotations, correlation = annotate_recording(table, filename)
+        print_annotation_summary(filename, annotations, correlation)
+        if save:
+            np.save(filename + ANNOTATION_SUFFIX, annotations)
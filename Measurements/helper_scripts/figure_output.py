@@ -0,0 +1,78 @@
+import matplotlib
+import matplotlib.pyplot as plt
+import os
+import re
+import sys
+
+"""
+Headless rendering of the evaluation figures.
+By default show_figures() simply calls plt.show(). Once headless output is enabled, e.g. by passing
+'--output-dir <directory>' to a script, a non-interactive backend is used instead and every open figure is written to
+the output directory and closed right away, so a whole campaign can be rendered unattended without growing memory.
+"""
+
+OUTPUT_DIRECTORY_OPTION = '--output-dir'
+OUTPUT_FORMAT_OPTION = '--output-format'
+DEFAULT_OUTPUT_FORMATS = ['png']
+SUPPORTED_OUTPUT_FORMATS = ['png', 'svg']
+
+output_directory = None
+output_formats = DEFAULT_OUTPUT_FORMATS
+# Number of figures saved per name, used to keep the filenames of repeated plots apart
+saved_figure_counts = {}
+
+def enable_headless_output(directory, formats=DEFAULT_OUTPUT_FORMATS):
+    global output_directory, output_formats
+    for output_format in formats:
+        if output_format not in SUPPORTED_OUTPUT_FORMATS:
+            raise ValueError("Unsupported output format '{}', use one of {}".format(output_format, ', '.join(SUPPORTED_OUTPUT_FORMATS)))
+    matplotlib.use('Agg', force=True)
+    os.makedirs(directory, exist_ok=True)
+    output_directory = directory
+    output_formats = list(formats)
+
+# Splits a comma separated list of output formats like 'png,svg'
+def parse_output_formats(string):
+    return [output_format.strip().lower() for output_format in string.split(',') if output_format.strip()]
+
+# Removes '--output-dir <directory>' and '--output-format <formats>' from the command line arguments and enables
+# headless output if an output directory was given. Scripts reading positional arguments from sys.argv call this first.
+def parse_output_arguments(argv=sys.argv):
+    options = {}
+    i = 1
+    while i < len(argv):
+        option, _, value = argv[i].partition('=')
+        if option not in (OUTPUT_DIRECTORY_OPTION, OUTPUT_FORMAT_OPTION):
+            i += 1
+            continue
+        if value:
+            del argv[i]
+        elif i + 1 < len(argv):
+            value = argv[i + 1]
+            del argv[i:i + 2]
+        else:
+            print("ERROR: Missing value of {}".format(option))
+            sys.exit(1)
+        options[option] = value
+    if OUTPUT_DIRECTORY_OPTION in options:
+        formats = parse_output_formats(options.get(OUTPUT_FORMAT_OPTION, ','.join(DEFAULT_OUTPUT_FORMATS)))
+        enable_headless_output(options[OUTPUT_DIRECTORY_OPTION], formats)
+    return output_directory
+
+def get_figure_filename(name):
+    name = re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_').lower() or 'figure'
+    count = saved_figure_counts.get(name, 0) + 1
+    saved_figure_counts[name] = count
+    return name if count == 1 else '{}_{}'.format(name, count)
+
+# Shows all open figures or, in headless mode, saves them under the given name and closes them
+def show_figures(name):
+    if output_directory is None:
+        plt.show()
+        return
+    for number in plt.get_fignums():
+        figure = plt.figure(number)
+        filename = get_figure_filename(name)
+        for output_format in output_formats:
+            figure.savefig(os.path.join(output_directory, '{}.{}'.format(filename, output_format)), format=output_format)
+        plt.close(figure)
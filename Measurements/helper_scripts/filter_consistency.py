@@ -0,0 +1,194 @@
+import fnmatch
+import numpy as np
+import os
+import sys
+from statistics import NormalDist
+from kalman_filter import iterate_batch_replay
+from recording_loader import load_recording
+
+"""
+Statistical consistency of the Kalman filter's noise constants, checked on its innovations while replaying recordings.
+If the noise constants match the recorded data, the innovation y of every update is white and its normalized innovation
+squared NIS = y' * S^(-1) * y is chi-square distributed with one degree of freedom per measurement. That is 2 per axis
+(position and acceleration) and 6 for all axes together.
+- Mean NIS: should be the degrees of freedom. Larger means too little noise is assumed and the filter is overconfident,
+  smaller means too much noise is assumed.
+- Windowed consistency: the NIS summed over every window of consecutive updates has to lie within the two-sided
+  chi-square confidence interval of the window's degrees of freedom. The interval bounds come from the Wilson-Hilferty
+  approximation, so no statistics package is needed.
+- Autocorrelation: the normalized position innovation of every axis should be uncorrelated with its past values.
+All recordings are replayed as one batch (see kalman_filter.iterate_batch_replay()) and the statistics of all of them are
+accumulated with array operations while replaying, so memory does not grow with the length of the recordings. Per
+recording only sums and counts are kept, which are merged into the statistics of a campaign by adding them up.
+
+Usage: python3 filter_consistency.py [--cold-start] [--static-z-acceleration] [--window <samples>] <recording.txt or directory> ...
+"""
+
+AXIS_NAMES = ['X', 'Y', 'Z']
+# Names of the NIS columns, one per axis and one of all axes together
+NIS_NAMES = AXIS_NAMES + ['All']
+# Measurements per axis and thereby degrees of freedom of the NIS of an axis
+AXIS_DEGREES_OF_FREEDOM = 2
+NIS_DEGREES_OF_FREEDOM = np.array([AXIS_DEGREES_OF_FREEDOM] * len(AXIS_NAMES) + [AXIS_DEGREES_OF_FREEDOM * len(AXIS_NAMES)])
+# Number of consecutive updates of a window, 2 seconds
+DEFAULT_WINDOW_SIZE = 20
+# Probability of a consistent window to lie within the confidence interval
+DEFAULT_CONFIDENCE = 0.95
+# Lags of the innovation autocorrelation in samples
+DEFAULT_MAX_LAG = 5
+
+# Returns the approximated quantile of a chi-square distribution with the given degrees of freedom (Wilson-Hilferty)
+def chi_square_quantile(probability, degrees_of_freedom):
+    degrees_of_freedom = np.asarray(degrees_of_freedom, dtype=float)
+    variance = 2 / (9 * degrees_of_freedom)
+    return degrees_of_freedom * np.maximum(1 - variance + NormalDist().inv_cdf(probability) * np.sqrt(variance), 0) ** 3
+
+# Returns the lower and upper bound of the two-sided confidence interval of a chi-square distribution
+def chi_square_interval(degrees_of_freedom, confidence=DEFAULT_CONFIDENCE):
+    return chi_square_quantile((1 - confidence) / 2, degrees_of_freedom), chi_square_quantile((1 + confidence) / 2, degrees_of_freedom)
+
+# Returns the NIS of every axis for innovations of shape (..., 3 axes, 2) and innovation covariances of shape
+# (..., 3 axes, 2, 2), with the 2x2 inverse in closed form
+def normalized_innovations_squared(innovations, innovation_covariances):
+    s00, s01, s10, s11 = innovation_covariances[..., 0, 0], innovation_covariances[..., 0, 1], innovation_covariances[..., 1, 0], innovation_covariances[..., 1, 1]
+    y0, y1 = innovations[..., 0], innovations[..., 1]
+    determinant = s00 * s11 - s01 * s10
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (s11 * y0 ** 2 - (s01 + s10) * y0 * y1 + s00 * y1 ** 2) / determinant
+
+# Replays loaded recordings and returns the consistency sums of every recording as a dictionary of arrays with one row
+# per recording:
+# 'update_count': number of updates
+# 'nis_sums': sums of the NIS of every axis and of all axes together, shape (4,)
+# 'window_count': number of windows of window_size consecutive updates
+# 'windows_below', 'windows_above': number of windows whose NIS sum is below or above the confidence interval, shape (4,)
+# 'innovation_sums', 'innovation_square_sums': sums of the normalized position innovations of every axis, shape (3,)
+# 'innovation_lag_product_sums': sums of the products of the normalized position innovations with the ones 1 to
+# max_lag updates later, shape (max_lag, 3)
+# 'innovation_lag_counts': number of these products, shape (max_lag,)
+# The sums are accumulated while replaying, so only the last window_size and max_lag samples of every recording are
+# kept, never the innovation sequences of whole recordings. The initialising sample, samples after the end of a
+# recording and rejected updates are no updates.
+def consistency_sums(recordings, parameter_sets=None, z_acceleration_reliable=True, seed_from_recording=True, window_size=DEFAULT_WINDOW_SIZE, confidence=DEFAULT_CONFIDENCE, max_lag=DEFAULT_MAX_LAG):
+    recording_count = len(recordings)
+    window_size = max(1, min(window_size, max((len(recording) for recording in recordings), default=0)))
+    lower_bounds, upper_bounds = chi_square_interval(NIS_DEGREES_OF_FREEDOM * window_size, confidence)
+    sums = {
+        'update_count': np.zeros(recording_count, dtype=np.int64),
+        'nis_sums': np.zeros((recording_count, len(NIS_NAMES))),
+        'window_count': np.zeros(recording_count, dtype=np.int64),
+        'windows_below': np.zeros((recording_count, len(NIS_NAMES)), dtype=np.int64),
+        'windows_above': np.zeros((recording_count, len(NIS_NAMES)), dtype=np.int64),
+        'innovation_sums': np.zeros((recording_count, 3)),
+        'innovation_square_sums': np.zeros((recording_count, 3)),
+        'innovation_lag_product_sums': np.zeros((recording_count, max_lag, 3)),
+        'innovation_lag_counts': np.zeros((recording_count, max_lag), dtype=np.int64),
+    }
+    # Ring buffers of the last window_size NIS and last max_lag normalized innovations of every recording, sample t is
+    # held at t modulo their length. Samples before the first one count as not updated, so windows and lags reaching
+    # before the start of a recording are never counted.
+    window_nis = np.zeros((recording_count, window_size, len(NIS_NAMES)))
+    window_updated = np.zeros((recording_count, window_size), dtype=bool)
+    lagged_innovations = np.zeros((recording_count, max_lag, 3))
+    lagged_updated = np.zeros((recording_count, max_lag), dtype=bool)
+    lags = np.arange(1, max_lag + 1)
+
+    for step in iterate_batch_replay(recordings, parameter_sets, None, z_acceleration_reliable, seed_from_recording):
+        t, updated, innovation_covariance = step['t'], step['updated'], step['innovation_covariance']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            nis = normalized_innovations_squared(step['innovation'], innovation_covariance)
+            # Position innovations normalized by their standard deviation, which are uncorrelated with unit variance if consistent
+            normalized_innovations = np.where(updated[:, np.newaxis], step['innovation'][..., 0] / np.sqrt(innovation_covariance[..., 0, 0]), 0)
+        nis = np.where(updated[:, np.newaxis], np.concatenate([nis, nis.sum(axis=-1, keepdims=True)], axis=-1), 0)
+
+        sums['update_count'] += updated
+        sums['nis_sums'] += nis
+        sums['innovation_sums'] += normalized_innovations
+        sums['innovation_square_sums'] += normalized_innovations ** 2
+        lag_indices = (t - lags) % max_lag
+        sums['innovation_lag_product_sums'] += lagged_innovations[:, lag_indices] * normalized_innovations[:, np.newaxis]
+        sums['innovation_lag_counts'] += lagged_updated[:, lag_indices] & updated[:, np.newaxis]
+        lagged_innovations[:, t % max_lag] = normalized_innovations
+        lagged_updated[:, t % max_lag] = updated
+
+        # The window ending with sample t
+        window_nis[:, t % window_size] = nis
+        window_updated[:, t % window_size] = updated
+        complete_windows = window_updated.all(axis=1)
+        nis_window_sums = window_nis.sum(axis=1)
+        sums['window_count'] += complete_windows
+        sums['windows_below'] += complete_windows[:, np.newaxis] & (nis_window_sums < lower_bounds)
+        sums['windows_above'] += complete_windows[:, np.newaxis] & (nis_window_sums > upper_bounds)
+    return sums
+
+# Adds up the consistency sums of many recordings, given as one dictionary per recording with values of any array-like type
+def merge_consistency_sums(sums):
+    return {key: np.sum([np.asarray(recording_sums[key]) for recording_sums in sums], axis=0) for key in sums[0]}
+
+# Returns the consistency statistics of consistency sums of one recording or merged ones:
+# 'mean_nis': mean NIS of every axis and of all axes together, to be compared with NIS_DEGREES_OF_FREEDOM
+# 'consistent_window_rate', 'window_below_rate', 'window_above_rate': shares of windows within, below and above the
+# confidence interval
+# 'innovation_autocorrelation': autocorrelation of the normalized position innovations of every axis, shape (max_lag, 3)
+# 'autocorrelation_bound': the magnitude below which an autocorrelation is insignificant at 95% confidence
+def consistency_statistics(sums):
+    update_count = float(sums['update_count'])
+    window_count = float(sums['window_count'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        innovation_means = np.asarray(sums['innovation_sums']) / update_count
+        innovation_variances = np.asarray(sums['innovation_square_sums']) / update_count - innovation_means ** 2
+        lag_product_means = np.asarray(sums['innovation_lag_product_sums']) / np.asarray(sums['innovation_lag_counts'])[:, np.newaxis]
+        return {
+            'update_count': int(update_count),
+            'window_count': int(window_count),
+            'mean_nis': np.asarray(sums['nis_sums']) / update_count,
+            'consistent_window_rate': 1 - (np.asarray(sums['windows_below']) + np.asarray(sums['windows_above'])) / window_count,
+            'window_below_rate': np.asarray(sums['windows_below']) / window_count,
+            'window_above_rate': np.asarray(sums['windows_above']) / window_count,
+            'innovation_autocorrelation': (lag_product_means - innovation_means ** 2) / innovation_variances,
+            'autocorrelation_bound': NormalDist().inv_cdf(0.975) / np.sqrt(update_count),
+        }
+
+def print_consistency_statistics(title, statistics, window_size=DEFAULT_WINDOW_SIZE, confidence=DEFAULT_CONFIDENCE):
+    print("{} ({} updates, {} windows of {} updates)".format(title, statistics['update_count'], statistics['window_count'], window_size))
+    print("Mean NIS X | Y | Z | All: {:.2f} | {:.2f} | {:.2f} | {:.2f} (consistent: {} | {} | {} | {})".format(*statistics['mean_nis'], *NIS_DEGREES_OF_FREEDOM))
+    print("Windows within the {:g}% interval X | Y | Z | All: {:.1%} | {:.1%} | {:.1%} | {:.1%}".format(confidence * 100, *statistics['consistent_window_rate']))
+    print("Windows below | above the interval All: {:.1%} | {:.1%}".format(statistics['window_below_rate'][-1], statistics['window_above_rate'][-1]))
+    for axis, autocorrelations in zip(AXIS_NAMES, statistics['innovation_autocorrelation'].T):
+        print("Innovation autocorrelation {} at lags 1-{}: {} (insignificant below {:.3f})".format(axis, len(autocorrelations), ' | '.join('{:.3f}'.format(value) for value in autocorrelations), statistics['autocorrelation_bound']))
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    cold_start = '--cold-start' in argv
+    if cold_start:
+        argv.remove('--cold-start')
+    static_z_acceleration = '--static-z-acceleration' in argv
+    if static_z_acceleration:
+        argv.remove('--static-z-acceleration')
+    window_size = DEFAULT_WINDOW_SIZE
+    if '--window' in argv:
+        index = argv.index('--window')
+        window_size = int(argv[index + 1])
+        del argv[index:index + 2]
+    if len(argv) == 0:
+        print("Usage: python3 filter_consistency.py [--cold-start] [--static-z-acceleration] [--window <samples>] <recording.txt or directory> ...")
+        sys.exit(1)
+
+    filenames = []
+    for argument in argv:
+        if os.path.isdir(argument):
+            filenames += [os.path.join(argument, filename) for filename in sorted(fnmatch.filter(os.listdir(argument), '*.txt'))]
+        else:
+            filenames.append(argument)
+
+    print("")
+    recordings = [load_recording(filename) for filename in filenames]
+    # All recordings are replayed at once
+    sums = consistency_sums(recordings, z_acceleration_reliable=not static_z_acceleration, seed_from_recording=not cold_start, window_size=window_size)
+    recording_sums = [{key: values[i] for key, values in sums.items()} for i in range(len(filenames))]
+    for filename, values in zip(filenames, recording_sums):
+        print_consistency_statistics(filename, consistency_statistics(values), window_size)
+        print("")
+    if len(filenames) > 1:
+        print_consistency_statistics("All recordings", consistency_statistics(merge_consistency_sums(recording_sums)), window_size)
+        print("")
@@ -0,0 +1,334 @@
+import fnmatch
+import numpy as np
+import os
+import sys
+from recording_loader import AXIS_COUNT, FILTERED_ACCELERATION, FILTERED_POSITION, GROUP_COUNT, RAW_ACCELERATION, UWB_POSITION, load_recording
+
+"""
+Offline replay of the Kalman filter of the related LocationApp for Android (KalmanFilterImpl.kt).
+The app's filter estimates position, velocity and acceleration of all three axes with a constant acceleration model
+and measures the uwb position and the raw acceleration of every axis. All of its matrices are block diagonal with one
+block per axis, so the replay runs three independent 3-state filters side by side as stacked arrays, which gives the
+same estimates as the app's 9-state filter.
+Any number of filters is replayed in lock-step as one batch, each with its own recording and its own noise constants.
+Their states and covariances are stacked arrays, so the time loop only holds a handful of array operations per sample
+however many filters there are. Recordings of different lengths are padded, and filters whose recording has ended are
+masked and keep their last state.
+The noise constants, the scaling of the process noise with the overall acceleration and the dynamic Z estimation
+after a height change are taken over from the app. The device's roll is not recorded, so the Z acceleration is assumed
+to be reliable (the device is not lying on its back) unless told otherwise.
+For post-processing, smooth_batch() follows the replay with a Rauch-Tung-Striebel backward pass. Its gains only depend
+on the covariances, so they are solved for all samples at once and the backward loop is a single product per sample.
+
+Usage: python3 kalman_filter.py [--cold-start] [--static-z-acceleration] <recording.txt or directory> ...
+Replays every recording and compares the replayed filtered positions with the recorded ones. The recordings do not
+hold the sample the app initialised its filter with, so by default the replay starts from the recorded filtered
+position and acceleration of the first sample. With --cold-start it is initialised from the first uwb position like
+in the app.
+"""
+
+# UWB position calculation delivery frequency in seconds
+TIME_DELTA = 0.1
+# Absolute Z acceleration above which the user is considered to intentionally change its height
+ACCELERATION_HEIGHT_CHANGE_THRESHOLD = 2.0
+PROCESS_NOISE_Z_COORDINATE_REGULAR = 0.0000001
+PROCESS_NOISE_Z_COORDINATE_DYNAMIC = 100.0
+MEASUREMENT_NOISE_Z_ACCELERATION_REGULAR = 10000.0
+MEASUREMENT_NOISE_Z_ACCELERATION_STATIC = 50000.0
+# Period of time in seconds in which the filter is highly dynamic in Z coordinate estimation after a height change
+DYNAMIC_Z_FILTER_TIME_PERIOD = 2.0
+
+# Noise values of the app per axis (rows x, y, z), for position, velocity and acceleration
+INITIAL_STATE_COVARIANCE = np.array([[0.01, 0.01, 0.01], [0.01, 0.01, 0.01], [0.001, 0.001, 0.01]])
+PROCESS_NOISE = np.array([[0.01, 0.01, 0.01], [0.01, 0.01, 0.01], [PROCESS_NOISE_Z_COORDINATE_REGULAR, 0.000001, 0.000001]])
+# Measurement noise per axis, for position and acceleration
+MEASUREMENT_NOISE = np.array([[0.04, 0.002], [0.025, 0.0001], [5000.0, MEASUREMENT_NOISE_Z_ACCELERATION_REGULAR]])
+
+# The tunable constants of the filter
+DEFAULT_FILTER_PARAMETERS = {
+    'process_noise_z_coordinate_regular': PROCESS_NOISE_Z_COORDINATE_REGULAR,
+    'process_noise_z_coordinate_dynamic': PROCESS_NOISE_Z_COORDINATE_DYNAMIC,
+    'measurement_noise_z_acceleration_regular': MEASUREMENT_NOISE_Z_ACCELERATION_REGULAR,
+    'measurement_noise_z_acceleration_static': MEASUREMENT_NOISE_Z_ACCELERATION_STATIC,
+    'acceleration_height_change_threshold': ACCELERATION_HEIGHT_CHANGE_THRESHOLD,
+}
+
+# Position and acceleration in the state of an axis, which are the measured ones, as a slice so that indexing with it
+# gives views
+MEASURED_STATES = slice(0, 3, 2)
+
+# State transition matrix of an axis
+STATE_TRANSITION = np.array([
+    [1.0, TIME_DELTA, 0.5 * TIME_DELTA ** 2],
+    [0.0, 1.0, TIME_DELTA],
+    [0.0, 0.0, 1.0],
+])
+
+# Index of the smoothed positions in a recording extended by add_smoothed_channel(), after the recorded value groups
+SMOOTHED_POSITION = GROUP_COUNT
+
+def get_filter_parameters(**parameters):
+    unknown_parameters = set(parameters) - set(DEFAULT_FILTER_PARAMETERS)
+    if unknown_parameters:
+        raise ValueError("Unknown filter parameters {}".format(sorted(unknown_parameters)))
+    return dict(DEFAULT_FILTER_PARAMETERS, **parameters)
+
+# Returns the number of samples after a height change in which the filter is dynamic in Z coordinate estimation
+def get_dynamic_z_sample_count():
+    return int(round(DYNAMIC_Z_FILTER_TIME_PERIOD / TIME_DELTA))
+
+# Returns the values of every filter parameter over a batch of parameter sets as arrays of shape (B,)
+def get_parameter_arrays(parameter_sets):
+    return {name: np.array([parameters[name] for parameters in parameter_sets], dtype=float) for name in DEFAULT_FILTER_PARAMETERS}
+
+# Returns the diagonals of the process noise of a batch of filters as an array of shape (B, 3 axes, 3). Like in the app
+# it is scaled by the squared overall acceleration of the sample.
+def get_process_noise(parameter_arrays, dynamic_z, squared_overall_accelerations):
+    process_noise = np.repeat(PROCESS_NOISE[np.newaxis], len(dynamic_z), axis=0)
+    process_noise[:, 2, 0] = np.where(dynamic_z, parameter_arrays['process_noise_z_coordinate_dynamic'], parameter_arrays['process_noise_z_coordinate_regular'])
+    process_noise *= squared_overall_accelerations[:, np.newaxis, np.newaxis]
+    return process_noise
+
+# Returns the diagonals of the measurement noise of a batch of filters as an array of shape (B, 3 axes, 2)
+def get_measurement_noise(parameter_arrays, z_acceleration_reliable=True):
+    measurement_noise = np.repeat(MEASUREMENT_NOISE[np.newaxis], len(parameter_arrays['measurement_noise_z_acceleration_regular']), axis=0)
+    measurement_noise[:, 2, 1] = parameter_arrays['measurement_noise_z_acceleration_regular' if z_acceleration_reliable else 'measurement_noise_z_acceleration_static']
+    return measurement_noise
+
+# Returns the initial state of shape (..., 3 axes, 3) and covariance of shape (..., 3 axes, 3, 3) for positions and
+# accelerations of shape (..., 3)
+def initial_filter_state(positions, accelerations):
+    positions, accelerations = np.asarray(positions, dtype=float), np.asarray(accelerations, dtype=float)
+    state = np.stack([positions, np.zeros_like(positions), accelerations], axis=-1)
+    covariance = np.zeros(state.shape + (3,)) + INITIAL_STATE_COVARIANCE[..., np.newaxis] * np.eye(3)
+    return state, covariance
+
+# x = F * x, P = F * P * F' + Q for states of shape (..., 3) and covariances of shape (..., 3, 3).
+# F only adds multiples of the later states to the earlier ones, so it is applied as row and column operations, which
+# is much faster than stacked 3x3 matrix products.
+def predict(state, covariance, process_noise):
+    state = state.copy()
+    state[..., 0] += TIME_DELTA * state[..., 1] + 0.5 * TIME_DELTA ** 2 * state[..., 2]
+    state[..., 1] += TIME_DELTA * state[..., 2]
+    covariance = covariance.copy()
+    covariance[..., 0, :] += TIME_DELTA * covariance[..., 1, :] + 0.5 * TIME_DELTA ** 2 * covariance[..., 2, :]
+    covariance[..., 1, :] += TIME_DELTA * covariance[..., 2, :]
+    covariance[..., :, 0] += TIME_DELTA * covariance[..., :, 1] + 0.5 * TIME_DELTA ** 2 * covariance[..., :, 2]
+    covariance[..., :, 1] += TIME_DELTA * covariance[..., :, 2]
+    # The diagonal as a view on the flattened matrices
+    covariance.reshape(covariance.shape[:-2] + (9,))[..., ::4] += process_noise
+    return state, covariance
+
+# Updates states of shape (..., 3) and covariances of shape (..., 3, 3) with measured positions and accelerations of
+# shape (..., 2). The innovation covariance of an axis is a 2x2 matrix, so the gain is computed in closed form. Returns
+# the innovations of shape (..., 2), the innovation covariances of shape (..., 2, 2) and whether the update was accepted.
+# Like in the app, filters without a positive definite innovation covariance keep their predicted state and get their
+# covariance reset.
+def update(state, covariance, measurement, measurement_noise):
+    # y = z - H * x
+    innovation = measurement - state[..., MEASURED_STATES]
+    # S = H * P * H' + R
+    innovation_covariance = covariance[..., MEASURED_STATES, MEASURED_STATES].copy()
+    innovation_covariance.reshape(innovation_covariance.shape[:-2] + (4,))[..., ::3] += measurement_noise
+    s00, s01, s10, s11 = innovation_covariance[..., 0, 0], innovation_covariance[..., 0, 1], innovation_covariance[..., 1, 0], innovation_covariance[..., 1, 1]
+    determinant = s00 * s11 - s01 * s10
+    positive_definite = (s00 > 0) & (determinant > 0)
+    determinant = np.where(positive_definite, determinant, 1.0)
+    # K = P * H' * S^(-1), one column per measurement
+    position_columns, acceleration_columns = covariance[..., :, 0], covariance[..., :, 2]
+    position_gain = (position_columns * s11[..., np.newaxis] - acceleration_columns * s10[..., np.newaxis]) / determinant[..., np.newaxis]
+    acceleration_gain = (acceleration_columns * s00[..., np.newaxis] - position_columns * s01[..., np.newaxis]) / determinant[..., np.newaxis]
+    # x = x + K * y, P = P - K * (H * P)
+    updated_state = state + position_gain * innovation[..., 0, np.newaxis] + acceleration_gain * innovation[..., 1, np.newaxis]
+    updated_covariance = covariance - position_gain[..., :, np.newaxis] * covariance[..., np.newaxis, 0, :] - acceleration_gain[..., :, np.newaxis] * covariance[..., np.newaxis, 2, :]
+    # The app solves all axes at once, so a single axis failing resets the covariance of all of them
+    accepted = np.all(positive_definite, axis=-1)
+    if np.all(accepted):
+        return updated_state, updated_covariance, innovation, innovation_covariance, accepted
+    state = np.where(accepted[..., np.newaxis, np.newaxis], updated_state, state)
+    covariance = np.where(accepted[..., np.newaxis, np.newaxis, np.newaxis], updated_covariance, INITIAL_STATE_COVARIANCE[..., np.newaxis] * np.eye(3))
+    return state, covariance, innovation, innovation_covariance, accepted
+
+# Pads loaded recordings of different lengths into one array of shape (R, T, 4, 3) with T the longest length and
+# returns it together with the lengths
+def pad_recordings(recordings):
+    lengths = np.array([len(recording) for recording in recordings], dtype=np.int64)
+    padded_recordings = np.zeros((len(recordings), lengths.max(initial=0), GROUP_COUNT, AXIS_COUNT))
+    for i, recording in enumerate(recordings):
+        padded_recordings[i, :len(recording)] = recording
+    return padded_recordings, lengths
+
+# Replays a batch of B filters in lock-step over loaded recordings of shape (N, 4, 3). Filter b replays recording
+# recording_indices[b] (default: filter i replays recording i) with the constants parameter_sets[b] (default: the app's
+# constants for all filters), so many parameter sets share one copy of every recording.
+# Each filter is initialised with the first sample of its recording, either from its uwb position like in the app or,
+# with seed_from_recording, from its recorded filtered position and acceleration.
+# Yields one dictionary per sample index t holding the stacked states of shape (B, 3 axes, 3), the covariances of shape
+# (B, 3 axes, 3, 3), the innovations of shape (B, 3 axes, 2) and the innovation covariances of shape (B, 3 axes, 2, 2)
+# after the sample, as well as the predicted states and covariances before its update. 'active' tells which filters have
+# a sample t, filters whose recording ended keep their last state. 'updated' tells which filters were updated with
+# sample t, which is none for the initialising sample 0.
+def iterate_batch_replay(recordings, parameter_sets=None, recording_indices=None, z_acceleration_reliable=True, seed_from_recording=False):
+    padded_recordings, recording_lengths = pad_recordings(recordings)
+    recording_indices = np.arange(len(recordings)) if recording_indices is None else np.asarray(recording_indices, dtype=np.int64)
+    parameter_sets = [DEFAULT_FILTER_PARAMETERS] * len(recording_indices) if parameter_sets is None else parameter_sets
+    if len(parameter_sets) != len(recording_indices):
+        raise ValueError("Got {} parameter sets for {} filters".format(len(parameter_sets), len(recording_indices)))
+    if len(recording_indices) == 0 or padded_recordings.shape[1] == 0:
+        return
+
+    parameter_arrays = get_parameter_arrays(parameter_sets)
+    measurement_noise = get_measurement_noise(parameter_arrays, z_acceleration_reliable)
+    lengths = recording_lengths[recording_indices]
+    squared_overall_accelerations = np.sum(padded_recordings[:, :, RAW_ACCELERATION] ** 2, axis=-1)
+    # Measured positions and accelerations of every recording and sample, of shape (R, T, 3 axes, 2)
+    measurements = np.stack([padded_recordings[:, :, UWB_POSITION], padded_recordings[:, :, RAW_ACCELERATION]], axis=-1)
+    height_changes = np.abs(padded_recordings[recording_indices, :, RAW_ACCELERATION, 2]) >= parameter_arrays['acceleration_height_change_threshold'][:, np.newaxis]
+    first_samples = padded_recordings[recording_indices, 0]
+    if seed_from_recording:
+        state, covariance = initial_filter_state(first_samples[:, FILTERED_POSITION], first_samples[:, FILTERED_ACCELERATION])
+    else:
+        state, covariance = initial_filter_state(first_samples[:, UWB_POSITION], np.zeros((len(recording_indices), 3)))
+    innovation = np.zeros((len(recording_indices), 3, 2))
+    innovation_covariance = np.zeros((len(recording_indices), 3, 2, 2))
+    yield {'t': 0, 'active': lengths > 0, 'updated': np.zeros(len(recording_indices), dtype=bool), 'state': state, 'covariance': covariance,
+           'predicted_state': state, 'predicted_covariance': covariance, 'innovation': innovation, 'innovation_covariance': innovation_covariance}
+
+    dynamic_z_sample_count = get_dynamic_z_sample_count()
+    # Sample index of the last height change of every filter, which makes its following predictions dynamic in Z
+    last_height_changes = np.full(len(recording_indices), -dynamic_z_sample_count - 1)
+    # Single recordings are replayed without gathering them for every sample
+    single_recording = len(recording_indices) == 1 and len(recordings) == 1
+    for t in range(1, padded_recordings.shape[1]):
+        active = t < lengths
+        all_active = bool(active.all())
+        dynamic_z = t - last_height_changes <= dynamic_z_sample_count
+        if single_recording:
+            sample_accelerations, measurement = squared_overall_accelerations[:, t], measurements[:, t]
+        else:
+            sample_accelerations, measurement = squared_overall_accelerations[recording_indices, t], measurements[recording_indices, t]
+        process_noise = get_process_noise(parameter_arrays, dynamic_z, sample_accelerations)
+        predicted_state, predicted_covariance = predict(state, covariance, process_noise)
+        updated_state, updated_covariance, innovation, innovation_covariance, accepted = update(predicted_state, predicted_covariance, measurement, measurement_noise)
+        # A Z acceleration above the threshold in an update makes the following predictions dynamic for
+        # DYNAMIC_Z_FILTER_TIME_PERIOD, another one restarts the period
+        last_height_changes = np.where(active & height_changes[:, t], t, last_height_changes)
+        if all_active:
+            state, covariance = updated_state, updated_covariance
+        else:
+            state = np.where(active[:, np.newaxis, np.newaxis], updated_state, state)
+            covariance = np.where(active[:, np.newaxis, np.newaxis, np.newaxis], updated_covariance, covariance)
+        yield {'t': t, 'active': active, 'updated': active & accepted, 'state': state, 'covariance': covariance,
+               'predicted_state': predicted_state, 'predicted_covariance': predicted_covariance, 'innovation': innovation, 'innovation_covariance': innovation_covariance}
+
+# Replays a batch of filters like iterate_batch_replay() and returns the filtered positions and accelerations of every
+# filter, both of shape (B, T, 3). Samples after the end of a filter's recording are NaN.
+def replay_batch(recordings, parameter_sets=None, recording_indices=None, z_acceleration_reliable=True, seed_from_recording=False):
+    filter_count = len(recordings) if recording_indices is None else len(recording_indices)
+    sample_count = max([len(recording) for recording in recordings], default=0)
+    filtered_positions = np.full((filter_count, sample_count, 3), np.nan)
+    filtered_accelerations = np.full((filter_count, sample_count, 3), np.nan)
+    for step in iterate_batch_replay(recordings, parameter_sets, recording_indices, z_acceleration_reliable, seed_from_recording):
+        active = step['active']
+        filtered_positions[active, step['t']] = step['state'][active, :, 0]
+        filtered_accelerations[active, step['t']] = step['state'][active, :, 2]
+    return filtered_positions, filtered_accelerations
+
+# Replays a single loaded recording of shape (N, 4, 3) and returns the filtered positions and accelerations, both of
+# shape (N, 3). The first sample is returned as initialised.
+def replay_recording(data, parameters=DEFAULT_FILTER_PARAMETERS, z_acceleration_reliable=True, seed_from_recording=False):
+    filtered_positions, filtered_accelerations = replay_batch([data], [parameters], None, z_acceleration_reliable, seed_from_recording)
+    return filtered_positions[0], filtered_accelerations[0]
+
+# Smooths a batch of filters replayed like iterate_batch_replay() with a Rauch-Tung-Striebel backward pass and returns
+# the smoothed positions and accelerations of every filter, both of shape (B, T, 3). The smoothed estimate of a sample
+# uses all samples of the recording, before and after it. Samples after the end of a filter's recording are NaN.
+# The backward pass runs over all filters in lock-step as well and only needs the smoothed states, not their covariances.
+def smooth_batch(recordings, parameter_sets=None, recording_indices=None, z_acceleration_reliable=True, seed_from_recording=False):
+    filter_count = len(recordings) if recording_indices is None else len(recording_indices)
+    states, covariances, predicted_states, predicted_covariances = [], [], [], []
+    for step in iterate_batch_replay(recordings, parameter_sets, recording_indices, z_acceleration_reliable, seed_from_recording):
+        states.append(step['state'])
+        covariances.append(step['covariance'])
+        predicted_states.append(step['predicted_state'])
+        predicted_covariances.append(step['predicted_covariance'])
+    if len(states) == 0:
+        return np.empty((filter_count, 0, 3)), np.empty((filter_count, 0, 3))
+
+    lengths = np.array([len(recording) for recording in recordings], dtype=np.int64)
+    lengths = lengths if recording_indices is None else lengths[np.asarray(recording_indices, dtype=np.int64)]
+    states, covariances, predicted_states, predicted_covariances = np.array(states), np.array(covariances), np.array(predicted_states), np.array(predicted_covariances)
+    # The gains only depend on the covariances, so they are computed for all samples at once before the backward pass.
+    # C = P(t|t) * F' * P(t+1|t)^(-1), computed as the transposed solution of P(t+1|t) * C' = F * P(t|t)
+    smoother_gains = np.linalg.solve(predicted_covariances[1:], STATE_TRANSITION @ covariances[:-1]).swapaxes(-1, -2)
+    # The last sample of a recording has nothing after it, so its smoothed state is its filtered state
+    smoother_gains[np.arange(len(states) - 1)[:, np.newaxis] + 1 >= lengths] = 0
+    smoothed_states = np.empty_like(states)
+    smoothed_states[-1] = states[-1]
+    for t in range(len(states) - 2, -1, -1):
+        # x(t|T) = x(t|t) + C * (x(t+1|T) - x(t+1|t))
+        smoothed_states[t] = states[t] + (smoother_gains[t] @ (smoothed_states[t + 1] - predicted_states[t + 1])[..., np.newaxis])[..., 0]
+
+    smoothed_states = smoothed_states.swapaxes(0, 1)
+    padding = np.arange(len(states)) >= lengths[:, np.newaxis]
+    smoothed_states[padding] = np.nan
+    return smoothed_states[..., 0], smoothed_states[..., 2]
+
+# Smooths a single loaded recording of shape (N, 4, 3) and returns the smoothed positions and accelerations, both of shape (N, 3)
+def smooth_recording(data, parameters=DEFAULT_FILTER_PARAMETERS, z_acceleration_reliable=True):
+    smoothed_positions, smoothed_accelerations = smooth_batch([data], [parameters], None, z_acceleration_reliable)
+    return smoothed_positions[0], smoothed_accelerations[0]
+
+# Returns loaded recordings extended by their smoothed positions as value group SMOOTHED_POSITION, each of shape
+# (N, 5, 3). All recordings are smoothed at once.
+def add_smoothed_channel(recordings, z_acceleration_reliable=True):
+    smoothed_positions = smooth_batch(recordings, None, None, z_acceleration_reliable)[0]
+    return [np.concatenate([data, positions[:len(data), np.newaxis]], axis=1) for data, positions in zip(recordings, smoothed_positions)]
+
+# Returns the mean and maximum absolute difference and the RMS difference per axis between replayed and recorded positions
+def differential_statistics(replayed_positions, recorded_positions):
+    differences = np.abs(replayed_positions - recorded_positions)
+    if len(differences) == 0:
+        return np.full(3, np.nan), np.full(3, np.nan), np.full(3, np.nan)
+    return differences.mean(axis=0), differences.max(axis=0), np.sqrt(np.mean(differences ** 2, axis=0))
+
+def print_differential_statistics(title, sample_count, mean_differences, max_differences, rms_differences):
+    print("{} ({} samples)".format(title, sample_count))
+    print("Mean difference x,y,z: {:.4f}, {:.4f}, {:.4f}".format(*mean_differences))
+    print("Max difference x,y,z: {:.4f}, {:.4f}, {:.4f}".format(*max_differences))
+    print("RMS difference x,y,z: {:.4f}, {:.4f}, {:.4f}".format(*rms_differences))
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    cold_start = '--cold-start' in argv
+    if cold_start:
+        argv.remove('--cold-start')
+    static_z_acceleration = '--static-z-acceleration' in argv
+    if static_z_acceleration:
+        argv.remove('--static-z-acceleration')
+    if len(argv) == 0:
+        print("Usage: python3 kalman_filter.py [--cold-start] [--static-z-acceleration] <recording.txt or directory> ...")
+        sys.exit(1)
+
+    filenames = []
+    for argument in argv:
+        if os.path.isdir(argument):
+            filenames += [os.path.join(argument, filename) for filename in sorted(fnmatch.filter(os.listdir(argument), '*.txt'))]
+        else:
+            filenames.append(argument)
+
+    print("")
+    recordings = [load_recording(filename) for filename in filenames]
+    # All recordings are replayed at once
+    replayed_positions = replay_batch(recordings, z_acceleration_reliable=not static_z_acceleration, seed_from_recording=not cold_start)[0]
+    all_replayed_positions, all_recorded_positions = [], []
+    for filename, data, positions in zip(filenames, recordings, replayed_positions):
+        # The first sample is the initialisation and not a replayed one
+        all_replayed_positions.append(positions[1:len(data)])
+        all_recorded_positions.append(data[1:, FILTERED_POSITION])
+        print_differential_statistics(filename, len(data) - 1, *differential_statistics(all_replayed_positions[-1], all_recorded_positions[-1]))
+        print("")
+    if len(filenames) > 1:
+        all_replayed_positions, all_recorded_positions = np.concatenate(all_replayed_positions), np.concatenate(all_recorded_positions)
+        print_differential_statistics("All recordings", len(all_replayed_positions), *differential_statistics(all_replayed_positions, all_recorded_positions))
+        print("")
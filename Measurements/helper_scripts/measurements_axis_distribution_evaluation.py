@@ -1,7 +1,9 @@
 import numpy as np
 import sys
+from figure_output import parse_output_arguments, show_figures
 from math import sqrt, pow
 from matplotlib import pyplot as plt
+from plot_decimation import plot_decimated
 from scipy.stats import norm
 from scipy.stats import shapiro, normaltest, anderson
 from statsmodels.graphics.gofplots import qqplot
@@ -14,13 +16,6 @@ def print_no_document_found_error():
     print("Usage: python3 measurements_evaluation.py <your_doc.txt>")
     print("Exiting")
 
-# Returns the amount of samples collected - necessary for mean and standard deviation calculations
-def get_sample_count(filename):
-    with open(filename) as f:
-        for i, l in enumerate(f):
-            pass
-    return i + 1
-
 def distance_between_two_points2D(sample_point, reference_point):
     return sqrt(pow(sample_point[0] - reference_point[0], 2) + pow(sample_point[1] - reference_point[1], 2))
 
@@ -48,9 +43,6 @@ def evaluate_data(filename, reference_point):
     sample_distances_z = []
 
     ''' Go! '''
-    # Get amount of samples collected
-    sample_count = get_sample_count(filename)
-
     # Go through samples
     with open(filename) as file:
         for line in file:
@@ -72,6 +64,9 @@ def evaluate_data(filename, reference_point):
             sample_distances_y.append(sample_distance_y)
             sample_distances_z.append(sample_distance_z)
 
+    # Get amount of samples collected
+    sample_count = len(sample_x_coords)
+
     return sample_count, sample_x_coords, sample_y_coords, sample_z_coords, sample_distances_x, sample_distances_y, sample_distances_z
   
 def plot_distribution(data):
@@ -100,32 +95,33 @@ def plot_distribution(data):
 		    print('Anderson: %.3f: %.3f, data does not look normal (reject H0)' % (sl, cv))
     plt.plot(bins, norm.pdf(bins, mu, sigma))
     qqplot(np.array(data), line='s')
-    plt.show()
+    show_figures('distribution')
 
 def plot_coordinates(reference_point, sample_count, data_x, data_y, data_z):
     fig = plt.figure()
     
     ax1 = fig.add_subplot(311)
-    ax1.plot(range(sample_count), data_x, label='Distances X', c='r')
+    plot_decimated(ax1, range(sample_count), data_x, label='Distances X', c='r')
     ax1.axhline(np.mean(data_x), 0, 1, label='Measurement Mean X', c='y')
     ax1.axhline(0, 0, 1, label='Actual X')
     ax1.legend()
 
     ax2 = fig.add_subplot(312)
-    ax2.plot(range(sample_count), data_y, label='Distances Y', c='r')
+    plot_decimated(ax2, range(sample_count), data_y, label='Distances Y', c='r')
     ax2.axhline(np.mean(data_y), 0, 1, label='Measurement Mean Y', c='y')
     ax2.axhline(0, 0, 1, label='Actual Y')
     ax2.legend()
 
     ax3 = fig.add_subplot(313)
-    ax3.plot(range(sample_count), data_z, label='Distances Z', c='r')
+    plot_decimated(ax3, range(sample_count), data_z, label='Distances Z', c='r')
     ax3.axhline(np.mean(data_z), 0, 1, label='Measurement Mean Z', c='y')
     ax3.axhline(0, 0, 1, label='Actual Z')
     ax3.legend()
 
-    plt.show()
+    show_figures('coordinates')
 
 if __name__ == "__main__":
+    parse_output_arguments()
     try:
         filename = sys.argv[1]
     except IndexError:
@@ -1,5 +1,6 @@
 import numpy as np
 import sys
+from figure_output import parse_output_arguments, show_figures
 from math import sqrt, pow
 from matplotlib import pyplot as plt
 from scipy.stats import norm
@@ -14,13 +15,6 @@ def print_no_document_found_error():
     print("Usage: python3 measurements_evaluation.py <your_doc.txt>")
     print("Exiting")
 
-# Returns the amount of samples collected - necessary for mean and standard deviation calculations
-def get_sample_count(filename):
-    with open(filename) as f:
-        for i, l in enumerate(f):
-            pass
-    return i + 1
-
 def distance_between_two_points2D(sample_point, reference_point):
     return sqrt(pow(sample_point[0] - reference_point[0], 2) + pow(sample_point[1] - reference_point[1], 2))
 
@@ -69,9 +63,6 @@ def evaluate_data(filename, reference_point):
     delta_distances_3D = []
 
     ''' Go! '''
-    # Get amount of samples collected
-    sample_count = get_sample_count(filename)
-
     # Go through samples
     with open(filename) as file:
         for line in file:
@@ -108,6 +99,9 @@ def evaluate_data(filename, reference_point):
             distance_to_ref_point_3D = distance_between_two_points3D(sample_point, reference_point)
             distances_to_ref_point_3D.append(distance_to_ref_point_3D)
 
+    # Get amount of samples collected - necessary for mean and standard deviation calculations
+    sample_count = len(sample_points)
+
     '''#############################################################
     #################### ACCURACY DETERMINATION ####################
     #############################################################'''
@@ -216,9 +210,10 @@ def plot(data):
 		    print('Anderson: %.3f: %.3f, data does not look normal (reject H0)' % (sl, cv))
     plt.plot(bins, norm.pdf(bins, mu, sigma))
     qqplot(np.array(data), line='s')
-    plt.show()
+    show_figures('distribution')
 
 if __name__ == "__main__":
+    parse_output_arguments()
     try:
         filename = sys.argv[1]
     except IndexError:
@@ -0,0 +1,74 @@
+import numpy as np
+import os
+
+"""
+Partial aggregates of a measurement campaign evaluated in shards, e.g. on several machines.
+A partial aggregate holds the per-file evaluation results of one shard: counts, centroids, sums and square sums of
+residuals, per-file means, maxima and quantile sketches, but no raw measurements. Every result key is stored as one
+array stacked over the shard's files in a single .npz file. Vectors of different lengths per file, like sparse quantile
+sketches, are stored concatenated together with the offsets of every file's vector. Merging the partial aggregates of all shards gives back the
+per-file results of the whole campaign in the order of a single run, so the final report is the same.
+"""
+
+PARTIAL_AGGREGATE_VERSION = 3
+
+FILENAMES_KEY = '__filenames__'
+REFERENCE_POSITIONS_KEY = '__reference_positions__'
+VERSION_KEY = '__version__'
+# Suffix of the key holding the offsets of a key stored concatenated
+OFFSETS_SUFFIX = '__offsets__'
+
+# Returns the values of a result key over all files as stored arrays: stacked, or concatenated together with the offsets
+# of every file's values if they are vectors of different lengths
+def stack_values(key, values):
+    values = [np.asarray(value) for value in values]
+    if all(value.ndim == 1 for value in values) and len(set(len(value) for value in values)) > 1:
+        offsets = np.cumsum([0] + [len(value) for value in values])
+        return {key: np.concatenate(values), key + OFFSETS_SUFFIX: offsets}
+    return {key: np.array(values)}
+
+# Persists the per-file results of a shard. It is written to a temporary file first so that an interrupted run never
+# leaves a partially written aggregate behind.
+def save_partial_aggregate(path, filenames, reference_positions, results):
+    stacked_results = {}
+    for key in (results[0] if results else []):
+        stacked_results.update(stack_values(key, [result[key] for result in results]))
+    temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temporary_path, 'wb') as f:
+        np.savez_compressed(f, **stacked_results, **{
+            FILENAMES_KEY: np.array([os.path.basename(filename) for filename in filenames], dtype=str),
+            REFERENCE_POSITIONS_KEY: np.array(reference_positions, dtype=float).reshape(-1, 3),
+            VERSION_KEY: PARTIAL_AGGREGATE_VERSION,
+        })
+    os.replace(temporary_path, path)
+
+# Returns the filenames, reference positions and per-file results of one partial aggregate.
+# Results hold scalars as floats and vectors as lists like persisted summaries (see recording_summaries.load_summary()).
+def load_partial_aggregate(path):
+    with np.load(path) as f:
+        if int(f[VERSION_KEY]) != PARTIAL_AGGREGATE_VERSION:
+            raise ValueError("{} is a partial aggregate of version {}, expected version {}".format(path, int(f[VERSION_KEY]), PARTIAL_AGGREGATE_VERSION))
+        filenames = f[FILENAMES_KEY].tolist()
+        reference_positions = f[REFERENCE_POSITIONS_KEY].tolist()
+        stacked_results = {key: f[key] for key in f.files if key not in (FILENAMES_KEY, REFERENCE_POSITIONS_KEY, VERSION_KEY) and not key.endswith(OFFSETS_SUFFIX)}
+        offsets = {key[:-len(OFFSETS_SUFFIX)]: f[key] for key in f.files if key.endswith(OFFSETS_SUFFIX)}
+    results = [{} for _ in filenames]
+    for key, values in stacked_results.items():
+        for i, result in enumerate(results):
+            if key in offsets:
+                result[key] = values[offsets[key][i]:offsets[key][i + 1]].tolist()
+            else:
+                result[key] = values[i].tolist() if values.ndim <= 2 else values[i]
+    return filenames, reference_positions, results
+
+# Merges the partial aggregates of all shards. The files are ordered by name as in a single run over the whole campaign,
+# which keeps every merged sum in the same order. Files contained in more than one shard are an error.
+def merge_partial_aggregates(paths):
+    entries = {}
+    for path in paths:
+        for filename, reference_position, result in zip(*load_partial_aggregate(path)):
+            if filename in entries:
+                raise ValueError("{} is contained in more than one partial aggregate".format(filename))
+            entries[filename] = (reference_position, result)
+    filenames = sorted(entries)
+    return filenames, [entries[filename][0] for filename in filenames], [entries[filename][1] for filename in filenames]
@@ -0,0 +1,52 @@
+import numpy as np
+
+"""
+Level-of-detail decimation for long time series plots.
+Instead of every sample, a decimated line only holds the minimum and maximum sample of every pixel wide bucket of the
+current view. That looks the same as the full line at the current resolution, keeps every peak visible and draws in
+constant time no matter how long the recording is. Whenever the view is zoomed or panned, the visible range is
+decimated again, so details appear as soon as there are enough pixels to show them.
+"""
+
+# Number of buckets per horizontal pixel of the axes
+BUCKETS_PER_PIXEL = 1
+
+# Returns the indices of the minimum and maximum value of every bucket of the samples in [start, end), in ascending order.
+# The first and last index are always kept so that the decimated line spans the same range as the full one.
+def min_max_indices(y, bucket_count, start=0, end=None):
+    end = len(y) if end is None else end
+    count = end - start
+    if count <= 2 * bucket_count:
+        return np.arange(start, end)
+    bucket_size = -(-count // bucket_count)
+    padded = np.full(bucket_size * bucket_count, np.nan)
+    padded[:count] = y[start:end]
+    buckets = padded.reshape(bucket_count, bucket_size)
+    # The last buckets may consist of padding only
+    filled = ~np.all(np.isnan(buckets), axis=1)
+    offsets = np.arange(bucket_count)[filled] * bucket_size + start
+    minima = offsets + np.nanargmin(buckets[filled], axis=1)
+    maxima = offsets + np.nanargmax(buckets[filled], axis=1)
+    return np.unique(np.concatenate(([start, end - 1], minima, maxima)))
+
+def get_bucket_count(axs):
+    return max(1, int(axs.get_window_extent().width * BUCKETS_PER_PIXEL))
+
+# Plots y against the ascending x values like axs.plot(), but decimated to the view resolution of axs.
+# Returns the Line2D, which is updated whenever the x limits of axs change.
+def plot_decimated(axs, x, y, **kwargs):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    indices = min_max_indices(y, get_bucket_count(axs))
+    line, = axs.plot(x[indices], y[indices], **kwargs)
+
+    def update(axs):
+        x_min, x_max = sorted(axs.get_xlim())
+        # Include one sample outside the view on both sides so that the line reaches the borders
+        start = max(0, int(np.searchsorted(x, x_min, side='left')) - 1)
+        end = min(len(x), int(np.searchsorted(x, x_max, side='right')) + 1)
+        indices = min_max_indices(y, get_bucket_count(axs), start, end)
+        line.set_data(x[indices], y[indices])
+
+    axs.callbacks.connect('xlim_changed', update)
+    return line
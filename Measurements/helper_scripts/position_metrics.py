@@ -0,0 +1,221 @@
+import numpy as np
+
+"""
+Vectorized accuracy, precision and jitter metrics of position series.
+All functions take whole (N, 3) position arrays instead of single points. 2D metrics only use the x and y coordinates.
+"""
+
+DIMENSIONS_2D = 2
+DIMENSIONS_3D = 3
+
+# Returns the lengths of (N, 3) vectors, using the first 'dimensions' coordinates only
+def vector_lengths(vectors, dimensions=DIMENSIONS_3D):
+    return np.sqrt(np.square(vectors[:, :dimensions]).sum(axis=1))
+
+# Returns the distances of all points to a reference point
+def distances_to_point(points, reference_point, dimensions=DIMENSIONS_3D):
+    return vector_lengths(np.asarray(points) - np.asarray(reference_point), dimensions)
+
+# Returns the distances between consecutive points, which is one value less than there are points
+def delta_distances(points, dimensions=DIMENSIONS_3D):
+    return vector_lengths(np.diff(np.asarray(points), axis=0), dimensions)
+
+def centroid(points):
+    return np.asarray(points).sum(axis=0) / len(points)
+
+# Returns mean, rms, max and std of some distances. The mean and the squared distances are computed once and shared.
+def distance_statistics(distances):
+    distances = np.asarray(distances)
+    mean = distances.mean()
+    return {
+        'mean': mean,
+        'rms': np.sqrt(np.square(distances).mean()),
+        'max': distances.max(),
+        'std': np.sqrt(np.square(distances - mean).mean()),
+    }
+
+# Returns the jitter metrics of a position series. Each delta series is built once and all of its statistics are
+# derived from it. The delta arrays themselves are returned as 'delta_distances_2D' and 'delta_distances_3D' so that
+# callers can reuse them, e.g. for plotting.
+def jitter_statistics(points):
+    metrics = {}
+    for dimensions in (DIMENSIONS_2D, DIMENSIONS_3D):
+        deltas = delta_distances(points, dimensions)
+        metrics['delta_distances_{}D'.format(dimensions)] = deltas
+        for statistic, value in distance_statistics(deltas).items():
+            metrics['{}_delta_distance_{}D'.format(statistic, dimensions)] = value
+    return metrics
+
+# Returns the accuracy, precision and jitter metrics of a position series as a flat dictionary.
+# Keys are named like 'mean_distance_to_reference_2D', 'std_distance_to_centroid_3D' or 'rms_delta_distance_2D'.
+# The centroid and the delta arrays of jitter_statistics() are included as well. If reference_point is None, accuracy
+# metrics are left out.
+def position_metrics(points, reference_point=None):
+    points = np.asarray(points)
+    points_centroid = centroid(points)
+    metrics = {'centroid': points_centroid}
+    metrics.update(jitter_statistics(points))
+    for dimensions in (DIMENSIONS_2D, DIMENSIONS_3D):
+        series = {'distance_to_centroid': distances_to_point(points, points_centroid, dimensions)}
+        if reference_point is not None:
+            series['distance_to_reference'] = distances_to_point(points, reference_point, dimensions)
+        for name, distances in series.items():
+            for statistic, value in distance_statistics(distances).items():
+                metrics['{}_{}_{}D'.format(statistic, name, dimensions)] = value
+    return metrics
+
+# Segmented metrics
+# The functions below evaluate many position series at once. All series are concatenated into one (M, 3) array and
+# offsets holds the start index of every series followed by M, so series i is points[offsets[i]:offsets[i + 1]].
+# Every metric is returned as an array holding one value per series.
+
+def segment_lengths(offsets):
+    return np.diff(offsets)
+
+# Returns the index of the series each of the M values belongs to
+def segment_ids(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), segment_lengths(offsets))
+
+# Returns the per-series sums of 1D values or, for 2D values, of each of their columns
+def segment_sums(values, ids, segment_count):
+    if values.ndim == 1:
+        return np.bincount(ids, weights=values, minlength=segment_count)
+    return np.stack([np.bincount(ids, weights=column, minlength=segment_count) for column in values.T], axis=1)
+
+# Returns per-series mean, rms, max and std of some distances, see distance_statistics()
+def segmented_distance_statistics(distances, ids, segment_count):
+    counts = np.bincount(ids, minlength=segment_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = segment_sums(distances, ids, segment_count) / counts
+        square_means = segment_sums(np.square(distances), ids, segment_count) / counts
+        variances = segment_sums(np.square(distances - means[ids]), ids, segment_count) / counts
+    # ids are sorted, so every non-empty series is one contiguous run of values
+    maxima = np.full(segment_count, np.nan)
+    non_empty = counts > 0
+    maxima[non_empty] = np.maximum.reduceat(distances, np.searchsorted(ids, np.arange(segment_count))[non_empty])
+    return {
+        'mean': means,
+        'rms': np.sqrt(square_means),
+        'max': maxima,
+        'std': np.sqrt(variances),
+    }
+
+# Returns the jitter metrics of all series, see jitter_statistics(). Deltas across the border of two series are dropped,
+# the remaining deltas and the series they belong to are returned as 'delta_distances_2D/3D' and 'delta_ids'.
+def segmented_jitter_statistics(points, offsets):
+    ids = segment_ids(offsets)
+    segment_count = len(offsets) - 1
+    within_segment = ids[1:] == ids[:-1]
+    delta_ids = ids[1:][within_segment]
+    metrics = {'delta_ids': delta_ids}
+    for dimensions in (DIMENSIONS_2D, DIMENSIONS_3D):
+        deltas = delta_distances(points, dimensions)[within_segment]
+        metrics['delta_distances_{}D'.format(dimensions)] = deltas
+        for statistic, values in segmented_distance_statistics(deltas, delta_ids, segment_count).items():
+            metrics['{}_delta_distance_{}D'.format(statistic, dimensions)] = values
+    return metrics
+
+# Returns the metrics of position_metrics() for all series at once. The centroids are returned as a (n, 3) array and
+# reference_points must be a (n, 3) array holding the reference point of every series or None.
+def segmented_position_metrics(points, offsets, reference_points=None):
+    points = np.asarray(points)
+    ids = segment_ids(offsets)
+    segment_count = len(offsets) - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centroids = segment_sums(points, ids, segment_count) / segment_lengths(offsets)[:, np.newaxis]
+    metrics = {'centroid': centroids}
+    metrics.update(segmented_jitter_statistics(points, offsets))
+    for dimensions in (DIMENSIONS_2D, DIMENSIONS_3D):
+        series = {'distance_to_centroid': vector_lengths(points - centroids[ids], dimensions)}
+        if reference_points is not None:
+            series['distance_to_reference'] = vector_lengths(points - np.asarray(reference_points)[ids], dimensions)
+        for name, distances in series.items():
+            for statistic, values in segmented_distance_statistics(distances, ids, segment_count).items():
+                metrics['{}_{}_{}D'.format(statistic, name, dimensions)] = values
+    return metrics
+
+# Running metrics
+# The functions below compute the metrics of position_metrics() from a stream of chunks, holding only one chunk and a
+# few running accumulators in memory. Every accumulator is a dictionary of count, mean, m2 (the sum of squared
+# differences from the mean) and max. Chunks are merged with the parallel variant of Welford's algorithm by Chan et al.,
+# so accumulators of different chunks or files can be merged in any order as well.
+
+def new_accumulator():
+    return {'count': 0, 'mean': 0.0, 'm2': 0.0, 'max': -np.inf}
+
+# Merges accumulator b into accumulator a and returns a
+def merge_accumulators(a, b):
+    count = a['count'] + b['count']
+    if b['count'] == 0:
+        return a
+    delta = b['mean'] - a['mean']
+    a['mean'] += delta * b['count'] / count
+    a['m2'] += b['m2'] + delta * delta * a['count'] * b['count'] / count
+    a['max'] = max(a['max'], b['max'])
+    a['count'] = count
+    return a
+
+# Adds some values to an accumulator and returns it
+def update_accumulator(accumulator, values):
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return accumulator
+    mean = values.mean()
+    return merge_accumulators(accumulator, {'count': len(values), 'mean': mean, 'm2': np.square(values - mean).sum(), 'max': values.max()})
+
+# Returns mean, rms, max and std of the values of an accumulator, see distance_statistics()
+def accumulator_statistics(accumulator):
+    variance = accumulator['m2'] / accumulator['count']
+    return {
+        'mean': accumulator['mean'],
+        'rms': np.sqrt(variance + accumulator['mean'] ** 2),
+        'max': accumulator['max'],
+        'std': np.sqrt(variance),
+    }
+
+# Returns the metrics of position_metrics(), except for the delta arrays, of several position series read in chunks.
+# get_chunks must return a new iterator over the chunks every time it is called. Every chunk is an (n, S, 3) array
+# holding the next n points of all S series, e.g. a chunk of a recording. A list of S metrics dictionaries is returned.
+# The chunks are read twice, first for centroid, accuracy and jitter and then for precision, which needs the centroid.
+def running_position_metrics(get_chunks, reference_point=None):
+    names = ['delta_distance', 'distance_to_centroid'] + (['distance_to_reference'] if reference_point is not None else [])
+    accumulators = None
+
+    # First pass
+    for chunk in get_chunks():
+        chunk = np.asarray(chunk, dtype=float)
+        if accumulators is None:
+            series_count = chunk.shape[1]
+            accumulators = [{'{}_{}D'.format(name, dimensions): new_accumulator() for name in names for dimensions in (DIMENSIONS_2D, DIMENSIONS_3D)} for _ in range(series_count)]
+            sums = np.zeros((series_count, 3))
+            count = 0
+            previous_points = chunk[:0]
+        sums += chunk.sum(axis=0)
+        count += len(chunk)
+        # Include the last points of the previous chunk so that no delta is lost at chunk borders
+        delta_points = np.concatenate([previous_points, chunk])
+        previous_points = chunk[-1:]
+        for series, series_accumulators in enumerate(accumulators):
+            for dimensions in (DIMENSIONS_2D, DIMENSIONS_3D):
+                update_accumulator(series_accumulators['delta_distance_{}D'.format(dimensions)], delta_distances(delta_points[:, series], dimensions))
+                if reference_point is not None:
+                    update_accumulator(series_accumulators['distance_to_reference_{}D'.format(dimensions)], distances_to_point(chunk[:, series], reference_point, dimensions))
+    if accumulators is None:
+        raise ValueError("No points to evaluate")
+    centroids = sums / count
+
+    # Second pass
+    for chunk in get_chunks():
+        chunk = np.asarray(chunk, dtype=float)
+        for series, series_accumulators in enumerate(accumulators):
+            for dimensions in (DIMENSIONS_2D, DIMENSIONS_3D):
+                update_accumulator(series_accumulators['distance_to_centroid_{}D'.format(dimensions)], distances_to_point(chunk[:, series], centroids[series], dimensions))
+
+    all_metrics = []
+    for series, series_accumulators in enumerate(accumulators):
+        metrics = {'centroid': centroids[series], 'count': count}
+        for key, accumulator in series_accumulators.items():
+            for statistic, value in accumulator_statistics(accumulator).items():
+                metrics['{}_{}'.format(statistic, key)] = value
+        all_metrics.append(metrics)
+    return all_metrics
@@ -0,0 +1,103 @@
+import numpy as np
+
+"""
+Mergeable quantile sketches for residuals and distances in bounded memory.
+A sketch is a plain array of bucket counts with logarithmically growing buckets as in DDSketch by Masson et al.
+Every quantile taken from a sketch is within the sketch's relative accuracy of the exact quantile, however many values
+were added to it. Its size only depends on the relative accuracy, never on the number of values.
+All sketches of the same relative accuracy share the same bucket layout, so sketches of different files, processes or
+machines are merged by simply adding them, e.g. sketches.sum(axis=0).
+A dense sketch has thousands of buckets, most of them empty for a short series. Sketches kept per file are therefore
+sparse: the indices of their nonzero buckets and the counts in them, so their size is bounded by the number of values.
+Sparse sketches are merged into a dense one by adding up their counts per bucket (see merge_sparse_sketches()).
+
+Layout of a sketch with K buckets per sign:
+[0, K) negative values, most negative first | K values smaller than MIN_VALUE in magnitude | (K, 2K] positive values
+"""
+
+DEFAULT_RELATIVE_ACCURACY = 0.005
+# Values smaller than MIN_VALUE in magnitude are counted as 0, larger values than MAX_VALUE as MAX_VALUE (both in meters)
+MIN_VALUE = 1e-4
+MAX_VALUE = 1e4
+
+def get_gamma(relative_accuracy):
+    return (1 + relative_accuracy) / (1 - relative_accuracy)
+
+# Returns the number of buckets per sign
+def get_bucket_count(relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    return int(np.ceil(np.log(MAX_VALUE / MIN_VALUE) / np.log(get_gamma(relative_accuracy)))) + 1
+
+def get_sketch_size(relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    return 2 * get_bucket_count(relative_accuracy) + 1
+
+# Returns an empty sketch, or an array of empty sketches if a shape is given
+def new_sketch(shape=(), relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    return np.zeros(tuple(np.atleast_1d(shape)) + (get_sketch_size(relative_accuracy),), dtype=np.int64)
+
+# Returns the bucket of every value
+def get_buckets(values, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    values = np.asarray(values, dtype=float)
+    bucket_count = get_bucket_count(relative_accuracy)
+    magnitudes = np.abs(values)
+    with np.errstate(divide='ignore'):
+        indices = np.ceil(np.log(np.maximum(magnitudes, MIN_VALUE) / MIN_VALUE) / np.log(get_gamma(relative_accuracy)))
+    indices = np.clip(indices, 0, bucket_count - 1).astype(np.int64)
+    return np.where(magnitudes < MIN_VALUE, bucket_count, np.where(values > 0, bucket_count + 1 + indices, bucket_count - 1 - indices))
+
+# Returns the value that represents each bucket, which is within the relative accuracy of all values of the bucket
+def get_bucket_values(relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    gamma = get_gamma(relative_accuracy)
+    magnitudes = 2 * MIN_VALUE * gamma ** np.arange(get_bucket_count(relative_accuracy)) / (gamma + 1)
+    return np.concatenate([-magnitudes[::-1], [0.0], magnitudes])
+
+# Returns one sketch per column of values, so (N, D) values result in (D, size) sketches and (N,) values in one sketch
+def sketch(values, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    values = np.asarray(values, dtype=float)
+    sketches = segmented_sketches(values.reshape(len(values), -1), np.zeros(len(values), dtype=np.int64), 1, relative_accuracy)[0]
+    return sketches if values.ndim > 1 else sketches[0]
+
+# Returns the sketches of many series at once. Values of shape (M, D) are split into segment_count series by the segment
+# id of every row (see position_metrics.segment_ids()), which results in (segment_count, D, size) sketches.
+def segmented_sketches(values, ids, segment_count, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    values = np.asarray(values, dtype=float)
+    size = get_sketch_size(relative_accuracy)
+    column_count = values.shape[1]
+    positions = (np.asarray(ids)[:, None] * column_count + np.arange(column_count)) * size + get_buckets(values, relative_accuracy)
+    return np.bincount(positions.ravel(), minlength=segment_count * column_count * size).reshape(segment_count, column_count, size)
+
+# Returns the sketches of many series like segmented_sketches(), but sparse and without ever building the dense
+# sketches. Returns one array of bucket indices and one array of counts per segment. The bucket index of a value in
+# column d is d * size + its bucket, so the sketches of all D columns of a segment are held by one pair of arrays.
+def segmented_sparse_sketches(values, ids, segment_count, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    values = np.asarray(values, dtype=float)
+    column_count = values.shape[1]
+    segment_size = column_count * get_sketch_size(relative_accuracy)
+    positions = np.asarray(ids, dtype=np.int64)[:, None] * segment_size + np.arange(column_count) * get_sketch_size(relative_accuracy) + get_buckets(values, relative_accuracy)
+    positions, counts = np.unique(positions.ravel(), return_counts=True)
+    bounds = np.searchsorted(positions, np.arange(segment_count + 1) * segment_size)
+    buckets = (positions % segment_size).astype(np.int32)
+    return [buckets[bounds[i]:bounds[i + 1]] for i in range(segment_count)], [counts[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(segment_count)]
+
+# Adds up sparse sketches of column_count columns (see segmented_sparse_sketches()), given as sequences of bucket index
+# and count arrays, into dense sketches of shape (column_count, size)
+def merge_sparse_sketches(buckets, counts, column_count, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    size = get_sketch_size(relative_accuracy)
+    buckets = np.concatenate([np.asarray(file_buckets, dtype=np.int64) for file_buckets in buckets] + [np.empty(0, dtype=np.int64)])
+    counts = np.concatenate([np.asarray(file_counts, dtype=np.int64) for file_counts in counts] + [np.empty(0, dtype=np.int64)])
+    sketches = np.zeros(column_count * size, dtype=np.int64)
+    np.add.at(sketches, buckets, counts)
+    return sketches.reshape(column_count, size)
+
+# Returns the given quantiles (between 0 and 1) of a sketch or of every sketch along the last axis.
+# NaN is returned for empty sketches.
+def sketch_quantiles(sketches, quantiles, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    sketches = np.asarray(sketches)
+    quantiles = np.asarray(quantiles, dtype=float)
+    bucket_values = get_bucket_values(relative_accuracy)
+    cumulative_counts = np.cumsum(sketches.reshape(-1, sketches.shape[-1]), axis=1)
+    result = np.full((len(cumulative_counts),) + quantiles.shape, np.nan)
+    for i, row in enumerate(cumulative_counts):
+        if row[-1] > 0:
+            # The quantile lies in the first bucket holding more values than its rank
+            result[i] = bucket_values[np.searchsorted(row, quantiles * (row[-1] - 1), side='right')]
+    return result.reshape(sketches.shape[:-1] + quantiles.shape)
@@ -2,26 +2,20 @@ import fnmatch
 import numpy as np
 import os
 import sys
+from figure_output import parse_output_arguments, show_figures
 from matplotlib import pyplot as plt
+from plot_decimation import plot_decimated
 from scipy.stats import norm
 
 
-def get_sample_count(filename):
-    with open(filename) as f:
-        for i, l in enumerate(f):
-            pass
-    return i + 1
-
 def evaulate_and_plot_data(directory):
     files = fnmatch.filter(os.listdir(directory), '*.txt')
     coordinates_array = []
     x_array = []
     y_array = []
     z_array = []
-    sample_count = 0
 
     for filename in files:
-        sample_count += get_sample_count(filename)
         x_reference = float((filename.split('(')[1].split(')')[0].split('_')[0]).replace(',', '.'))
         y_reference = float((filename.split('(')[1].split(')')[0].split('_')[1]).replace(',', '.'))
         z_reference = float((filename.split('(')[1].split(')')[0].split('_')[2]).replace(',', '.'))
@@ -34,6 +28,8 @@ def evaulate_and_plot_data(directory):
                 z = round(float(line.split(',')[2]), 3) - z_reference
                 z_array.append(z)
                 coordinates_array.append([x, y, z])
+    # The sample count follows from the parsed values so that every file is read only once
+    sample_count = len(x_array)
     coordinate_matrix = np.matrix(coordinates_array)
     x_array = np.array(x_array)
     y_array = np.array(y_array)
@@ -61,32 +57,33 @@ def plot_distribution(data):
     sigma = np.std(data)
     print("Mean: {}, std: {}".format(mu, sigma))
     plt.plot(bins, norm.pdf(bins, mu, sigma))
-    plt.show()
+    show_figures('distribution')
 
 def plot_coordinates(sample_count, data_x, data_y, data_z):
     fig = plt.figure()
     
     ax1 = fig.add_subplot(311)
-    ax1.plot(range(sample_count), data_x, label='Distances X', c='r')
+    plot_decimated(ax1, range(sample_count), data_x, label='Distances X', c='r')
     ax1.axhline(np.mean(data_x), 0, 1, label='Measurement Mean X', c='y')
     ax1.axhline(0, 0, 1, label='Actual X')
     ax1.legend()
 
     ax2 = fig.add_subplot(312)
-    ax2.plot(range(sample_count), data_y, label='Distances Y', c='r')
+    plot_decimated(ax2, range(sample_count), data_y, label='Distances Y', c='r')
     ax2.axhline(np.mean(data_y), 0, 1, label='Measurement Mean Y', c='y')
     ax2.axhline(0, 0, 1, label='Actual Y')
     ax2.legend()
 
     ax3 = fig.add_subplot(313)
-    ax3.plot(range(sample_count), data_z, label='Distances Z', c='r')
+    plot_decimated(ax3, range(sample_count), data_z, label='Distances Z', c='r')
     ax3.axhline(np.mean(data_z), 0, 1, label='Measurement Mean Z', c='y')
     ax3.axhline(0, 0, 1, label='Actual Z')
     ax3.legend()
 
-    plt.show()
+    show_figures('distances')
 
 if __name__ == "__main__":
+    parse_output_arguments()
     try:
         pwd = sys.argv[1]
     except IndexError:
@@ -0,0 +1,87 @@
+import hashlib
+import numpy as np
+import os
+from recording_loader import load_recording
+
+"""
+Opt-in binary cache for parsed recordings.
+Every parsed recording is stored as a .npy file inside a cache directory. The entry name is made up of a hash of the
+recording's absolute path and a hash of its modification time and size, so an edited or replaced recording never
+hits its old entry. Entries are read memory-mapped, which skips text parsing entirely on later runs.
+The cache is kept below a size cap by evicting the least recently used entries.
+"""
+
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+ENTRY_SUFFIX = '.npy'
+
+def hash_string(string):
+    return hashlib.sha1(string.encode('utf-8')).hexdigest()[:16]
+
+# Returns the hash of the recording's path and the hash of its current state
+def get_cache_key(filename):
+    stat = os.stat(filename)
+    path_hash = hash_string(os.path.abspath(filename))
+    state_hash = hash_string("{}:{}".format(stat.st_mtime_ns, stat.st_size))
+    return path_hash, state_hash
+
+# Returns the parsed recording, either memory-mapped from the cache directory or parsed and then written to it.
+# Without a cache directory, or for inputs that are no regular files (e.g. '-' for stdin), this is plain load_recording().
+def load_recording_cached(filename, cache_directory=None, cache_size=DEFAULT_CACHE_SIZE):
+    if cache_directory is None or not isinstance(filename, str) or not os.path.isfile(filename):
+        return load_recording(filename)
+
+    os.makedirs(cache_directory, exist_ok=True)
+    path_hash, state_hash = get_cache_key(filename)
+    entry = os.path.join(cache_directory, path_hash + '-' + state_hash + ENTRY_SUFFIX)
+    try:
+        data = np.load(entry, mmap_mode='r')
+        # Mark entry as recently used
+        os.utime(entry)
+        return data
+    except (OSError, ValueError):
+        pass
+
+    data = load_recording(filename)
+    remove_stale_entries(cache_directory, path_hash)
+    write_entry(entry, data)
+    evict_entries(cache_directory, cache_size)
+    return data
+
+# Write to a temporary file first so that concurrent readers never see a partially written entry
+def write_entry(entry, data):
+    temporary_entry = '{}.{}.tmp'.format(entry, os.getpid())
+    with open(temporary_entry, 'wb') as f:
+        np.save(f, data)
+    os.replace(temporary_entry, entry)
+
+# Remove entries of former states of a recording
+def remove_stale_entries(cache_directory, path_hash):
+    for name in os.listdir(cache_directory):
+        if name.startswith(path_hash + '-') and name.endswith(ENTRY_SUFFIX):
+            remove_entry(os.path.join(cache_directory, name))
+
+# Remove least recently used entries until the cache fits into cache_size bytes
+def evict_entries(cache_directory, cache_size):
+    entries = []
+    for name in os.listdir(cache_directory):
+        if not name.endswith(ENTRY_SUFFIX):
+            continue
+        path = os.path.join(cache_directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= cache_size:
+            break
+        remove_entry(path)
+        total_size -= size
+
+def remove_entry(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
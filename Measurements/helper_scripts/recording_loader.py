@@ -0,0 +1,72 @@
+import io
+import numpy as np
+import sys
+from itertools import islice
+
+"""
+Shared loader for recordings created by the related LocationApp for Android.
+Each line of a recording holds four groups of x, y, z values separated by '|':
+uwb position | filtered position | raw acceleration | filtered acceleration
+The whole file is parsed in one pass into a single (N, 4, 3) float array.
+"""
+
+# Indices of the value groups along the second axis of a loaded recording
+UWB_POSITION = 0
+FILTERED_POSITION = 1
+RAW_ACCELERATION = 2
+FILTERED_ACCELERATION = 3
+
+GROUP_COUNT = 4
+AXIS_COUNT = 3
+
+# Number of lines parsed at once by iterate_recording()
+DEFAULT_CHUNK_SIZE = 100000
+
+def parse_recording(text):
+    data = np.loadtxt(io.StringIO(text.replace('|', ',')), delimiter=',', dtype=float, ndmin=2)
+    return data.reshape(-1, GROUP_COUNT, AXIS_COUNT)
+
+# Returns all samples of a recording as an array of shape (N, 4, 3), so the sample count is simply its length.
+# The source may be a filename, an already opened file or '-' for stdin. It is read exactly once from start to end,
+# which makes non-seekable inputs such as pipes work as well.
+def load_recording(source):
+    if source == '-':
+        return parse_recording(sys.stdin.read())
+    if hasattr(source, 'read'):
+        return parse_recording(source.read())
+    with open(source) as f:
+        return parse_recording(f.read())
+
+# Yields the samples of a recording in chunks of at most chunk_size samples, each an array of shape (n, 4, 3).
+# Only one chunk is held in memory at a time, so recordings larger than the available memory can be processed.
+# The source may be a filename, an already opened file or '-' for stdin.
+def iterate_recording(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    if source == '-':
+        yield from iterate_lines(sys.stdin, chunk_size)
+    elif hasattr(source, 'read'):
+        yield from iterate_lines(source, chunk_size)
+    else:
+        with open(source) as f:
+            yield from iterate_lines(f, chunk_size)
+
+def iterate_lines(f, chunk_size):
+    while True:
+        lines = list(islice(f, chunk_size))
+        if not lines:
+            return
+        lines = [line for line in lines if line.strip()]
+        if lines:
+            yield parse_recording(''.join(lines))
+
+# Returns (N, 3) views on the uwb positions, filtered positions, raw accelerations and filtered accelerations of a loaded recording
+def split_recording(data):
+    return data[:, UWB_POSITION], data[:, FILTERED_POSITION], data[:, RAW_ACCELERATION], data[:, FILTERED_ACCELERATION]
+
+# Concatenates loaded recordings into one (M, 4, 3) array. Also returns the offsets index, which holds the start of every
+# recording followed by M, so recording i is data[offsets[i]:offsets[i + 1]].
+def concatenate_recordings(recordings):
+    offsets = np.zeros(len(recordings) + 1, dtype=np.int64)
+    np.cumsum([len(recording) for recording in recordings], out=offsets[1:])
+    if len(recordings) == 0:
+        return np.empty((0, GROUP_COUNT, AXIS_COUNT)), offsets
+    return np.concatenate(recordings), offsets
@@ -0,0 +1,183 @@
+import fnmatch
+import json
+import numpy as np
+import os
+import sys
+from recording_loader import GROUP_COUNT, AXIS_COUNT, load_recording
+
+"""
+Multi-resolution min/max/mean pyramids of recordings.
+The pyramid of a recording is stored in a '<recording>.pyramid' directory next to it. Level 0 is the parsed recording
+itself, every bucket of level k aggregates PYRAMID_FACTOR buckets of level k - 1, i.e. PYRAMID_FACTOR^k samples. Levels
+are .npy files which are read memory-mapped, so plotting or summarizing a time window only touches the buckets of that
+window instead of the full resolution data.
+Usage: python3 recording_pyramid.py <recording.txt or directory> ...
+"""
+
+PYRAMID_SUFFIX = '.pyramid'
+PYRAMID_FACTOR = 8
+# Increase whenever the layout of a pyramid changes, which invalidates all persisted pyramids
+PYRAMID_VERSION = 1
+META_FILENAME = 'meta.json'
+
+# Indices of the statistics along the second axis of a level > 0
+MINIMUM = 0
+MAXIMUM = 1
+MEAN = 2
+
+def get_pyramid_directory(filename):
+    return filename + PYRAMID_SUFFIX
+
+def get_level_path(pyramid_directory, level):
+    return os.path.join(pyramid_directory, 'level_{}.npy'.format(level))
+
+def get_recording_state(filename):
+    stat = os.stat(filename)
+    return "{}:{}".format(stat.st_mtime_ns, stat.st_size)
+
+# Returns the number of samples in every bucket of a level, only the last bucket may hold less than factor^level
+def bucket_counts(sample_count, level, factor=PYRAMID_FACTOR):
+    size = factor ** level
+    counts = np.full(-(-sample_count // size), size, dtype=np.int64)
+    if len(counts) > 0:
+        counts[-1] = sample_count - (len(counts) - 1) * size
+    return counts
+
+# Aggregates groups of factor buckets into one. Takes and returns arrays of shape (buckets, 3, 4, 3) holding minimum,
+# maximum and mean of every bucket as well as the sample counts of the given buckets.
+def aggregate_level(level_data, counts, factor=PYRAMID_FACTOR):
+    bucket_count = -(-len(level_data) // factor)
+    padding = bucket_count * factor - len(level_data)
+    padded = np.concatenate([level_data, np.full((padding,) + level_data.shape[1:], np.nan)])
+    padded_counts = np.concatenate([counts, np.zeros(padding, dtype=np.int64)]).reshape(bucket_count, factor)
+    groups = padded.reshape((bucket_count, factor) + level_data.shape[1:])
+    aggregated = np.empty((bucket_count,) + level_data.shape[1:])
+    aggregated[:, MINIMUM] = np.nanmin(groups[:, :, MINIMUM], axis=1)
+    aggregated[:, MAXIMUM] = np.nanmax(groups[:, :, MAXIMUM], axis=1)
+    weighted_means = np.nan_to_num(groups[:, :, MEAN]) * padded_counts[:, :, np.newaxis, np.newaxis]
+    aggregated[:, MEAN] = weighted_means.sum(axis=1) / padded_counts.sum(axis=1)[:, np.newaxis, np.newaxis]
+    return aggregated, padded_counts.sum(axis=1)
+
+# Builds and persists the pyramid of a recording and returns its directory
+def build_pyramid(filename, factor=PYRAMID_FACTOR):
+    data = load_recording(filename)
+    state = get_recording_state(filename)
+    pyramid_directory = get_pyramid_directory(filename)
+    os.makedirs(pyramid_directory, exist_ok=True)
+    # Without meta data the pyramid counts as missing, so an interrupted build is never read
+    meta_path = os.path.join(pyramid_directory, META_FILENAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    np.save(get_level_path(pyramid_directory, 0), data)
+    level = 0
+    # Level 1 is built from the samples, where minimum, maximum and mean are the sample itself
+    level_data = np.repeat(data[:, np.newaxis], 3, axis=1)
+    counts = np.ones(len(data), dtype=np.int64)
+    while len(level_data) > 1:
+        level_data, counts = aggregate_level(level_data, counts, factor)
+        level += 1
+        np.save(get_level_path(pyramid_directory, level), level_data)
+
+    meta = {'version': PYRAMID_VERSION, 'state': state, 'factor': factor, 'sample_count': len(data), 'level_count': level + 1}
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+    return pyramid_directory
+
+# Returns the persisted pyramid of a recording or None if there is none or the recording changed since.
+# A pyramid is a dictionary of its meta data and 'levels', a list of memory-mapped level arrays.
+def load_pyramid(filename):
+    pyramid_directory = get_pyramid_directory(filename)
+    try:
+        with open(os.path.join(pyramid_directory, META_FILENAME)) as f:
+            meta = json.load(f)
+        if meta['version'] != PYRAMID_VERSION or meta['state'] != get_recording_state(filename):
+            return None
+        meta['levels'] = [np.load(get_level_path(pyramid_directory, level), mmap_mode='r') for level in range(meta['level_count'])]
+        return meta
+    except (OSError, ValueError, KeyError):
+        return None
+
+# Returns the pyramid of a recording and builds it first if it is missing or outdated
+def get_pyramid(filename):
+    pyramid = load_pyramid(filename)
+    if pyramid is None:
+        build_pyramid(filename)
+        pyramid = load_pyramid(filename)
+    return pyramid
+
+# Returns minimum, maximum and mean of the buckets [first, last) of a level as three (n, 4, 3) arrays
+def read_buckets(pyramid, level, first, last):
+    buckets = np.asarray(pyramid['levels'][level][first:last])
+    if level == 0:
+        return buckets, buckets, buckets
+    return buckets[:, MINIMUM], buckets[:, MAXIMUM], buckets[:, MEAN]
+
+# Returns the data of the samples [start, end) for plotting with at most max_buckets values per channel.
+# The finest level that fits is used. Returns the level, the first sample index of every bucket and the minimum,
+# maximum and mean of every bucket as (n, 4, 3) arrays. Buckets at the window borders may reach beyond the window.
+def read_window(pyramid, start, end, max_buckets=2000):
+    start, end = max(0, start), min(pyramid['sample_count'], end)
+    factor = pyramid['factor']
+    level = 0
+    while level < pyramid['level_count'] - 1 and -(-(end - start) // factor ** level) > max_buckets:
+        level += 1
+    size = factor ** level
+    first, last = start // size, -(-end // size)
+    minima, maxima, means = read_buckets(pyramid, level, first, last)
+    return level, np.arange(first, last) * size, minima, maxima, means
+
+# Returns the exact minimum, maximum and mean of the samples [start, end) as (4, 3) arrays.
+# The window is split into whole buckets, using coarse levels in its middle and finer ones towards its borders, so only
+# O(factor * levels) buckets besides the coarsest ones are read.
+def window_summary(pyramid, start, end):
+    start, end = max(0, start), min(pyramid['sample_count'], end)
+    if start >= end:
+        raise ValueError("Empty window [{}, {})".format(start, end))
+    factor = pyramid['factor']
+    top_level = pyramid['level_count'] - 1
+    pieces = []
+    # Walk up at the start of the window while a coarser level still has whole buckets inside it
+    level = 0
+    while level < top_level:
+        size_above = factor ** (level + 1)
+        aligned_start = -(-start // size_above) * size_above
+        if (end // size_above) * size_above <= aligned_start:
+            break
+        pieces.append((level, start // factor ** level, aligned_start // factor ** level))
+        start = aligned_start
+        level += 1
+    # Walk down at the end of the window
+    while level >= 0:
+        size = factor ** level
+        aligned_end = end if level == 0 else (end // size) * size
+        pieces.append((level, start // size, aligned_end // size))
+        start = aligned_end
+        level -= 1
+
+    minima, maxima, sums, count = [], [], 0, 0
+    for level, first, last in pieces:
+        if first >= last:
+            continue
+        level_minima, level_maxima, level_means = read_buckets(pyramid, level, first, last)
+        counts = bucket_counts(pyramid['sample_count'], level, factor)[first:last]
+        minima.append(level_minima.min(axis=0))
+        maxima.append(level_maxima.max(axis=0))
+        sums = sums + (level_means * counts[:, np.newaxis, np.newaxis]).sum(axis=0)
+        count += counts.sum()
+    return np.min(minima, axis=0), np.max(maxima, axis=0), sums / count
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 recording_pyramid.py <recording.txt or directory> ...")
+        sys.exit(1)
+    for argument in sys.argv[1:]:
+        if os.path.isdir(argument):
+            filenames = [os.path.join(argument, filename) for filename in sorted(fnmatch.filter(os.listdir(argument), '*.txt'))]
+        else:
+            filenames = [argument]
+        for filename in filenames:
+            if load_pyramid(filename) is None:
+                print("Building pyramid of {}".format(filename))
+                build_pyramid(filename)
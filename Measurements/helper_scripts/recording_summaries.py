@@ -0,0 +1,60 @@
+import numpy as np
+import os
+
+"""
+Persisted per-file evaluation summaries of a measurement campaign.
+The summary of a recording is stored as a .npz file in a '.summaries' directory next to the recordings. Every summary
+remembers the modification time and size of the recording it was made from, so only new or changed recordings have to
+be evaluated again while all others are taken from their summaries.
+"""
+
+SUMMARY_DIRECTORY_NAME = '.summaries'
+SUMMARY_SUFFIX = '.npz'
+# Increase whenever the content of a summary changes, which invalidates all persisted summaries
+SUMMARY_VERSION = 4
+
+STATE_KEY = '__state__'
+VERSION_KEY = '__version__'
+
+def get_summary_directory(directory):
+    return os.path.join(directory, SUMMARY_DIRECTORY_NAME)
+
+def get_summary_path(summary_directory, filename):
+    return os.path.join(summary_directory, os.path.basename(filename) + SUMMARY_SUFFIX)
+
+def get_recording_state(filename):
+    stat = os.stat(filename)
+    return "{}:{}".format(stat.st_mtime_ns, stat.st_size)
+
+# Returns the persisted summary of a recording as a dictionary or None if there is none or the recording changed since.
+# Scalars are returned as floats and vectors as lists, everything else as arrays.
+def load_summary(summary_directory, filename):
+    try:
+        with np.load(get_summary_path(summary_directory, filename)) as f:
+            if int(f[VERSION_KEY]) != SUMMARY_VERSION or str(f[STATE_KEY]) != get_recording_state(filename):
+                return None
+            return {key: (f[key].tolist() if f[key].ndim <= 1 else f[key]) for key in f.files if key not in (STATE_KEY, VERSION_KEY)}
+    except (OSError, ValueError, KeyError):
+        return None
+
+# Persists the summary of a recording compressed. It is written to a temporary file first so that an interrupted run never leaves
+# a partially written summary behind.
+def save_summary(summary_directory, filename, summary):
+    os.makedirs(summary_directory, exist_ok=True)
+    summary_path = get_summary_path(summary_directory, filename)
+    temporary_summary_path = '{}.{}.tmp'.format(summary_path, os.getpid())
+    with open(temporary_summary_path, 'wb') as f:
+        np.savez_compressed(f, **summary, **{STATE_KEY: get_recording_state(filename), VERSION_KEY: SUMMARY_VERSION})
+    os.replace(temporary_summary_path, summary_path)
+
+# Removes the summaries of recordings which no longer exist
+def remove_orphaned_summaries(summary_directory, filenames):
+    if not os.path.isdir(summary_directory):
+        return
+    names = set(os.path.basename(filename) + SUMMARY_SUFFIX for filename in filenames)
+    for name in os.listdir(summary_directory):
+        if name.endswith(SUMMARY_SUFFIX) and name not in names:
+            try:
+                os.remove(os.path.join(summary_directory, name))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,34 @@
+import numpy as np
+from position_metrics import segment_sums
+
+"""
+Group-by of measurements on their reference positions and mapping of reference positions onto a regular grid.
+Reference positions are compared as exact float triples, which is safe as they are parsed from filenames and never
+computed.
+"""
+
+# Returns the distinct reference positions as a (n, 3) array sorted by x, y and z as well as the group index of every
+# given reference position, so that unique_reference_positions[group_ids] == reference_positions.
+def group_by_reference_position(reference_positions):
+    unique_reference_positions, group_ids = np.unique(np.asarray(reference_positions, dtype=float).reshape(-1, 3), axis=0, return_inverse=True)
+    return unique_reference_positions, group_ids.reshape(-1)
+
+# Returns the mean of the values of every group. Values may be 1D or (N, k) arrays.
+def group_means(values, group_ids, group_count):
+    values = np.asarray(values, dtype=float)
+    counts = np.bincount(group_ids, minlength=group_count)
+    if values.ndim > 1:
+        counts = counts[:, np.newaxis]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return segment_sums(values, group_ids, group_count) / counts
+
+# Places one value per reference position into a grid spanned by the distinct x and y coordinates of all reference
+# positions. Returns those x and y coordinates and the (len(y), len(x)) grid. Grid cells without a reference position,
+# i.e. holes in the measurements, are NaN. The reference positions must differ in x or y.
+def grid_of_reference_positions(reference_positions, values):
+    reference_positions = np.asarray(reference_positions, dtype=float).reshape(-1, 3)
+    x_coordinates, x_indices = np.unique(reference_positions[:, 0], return_inverse=True)
+    y_coordinates, y_indices = np.unique(reference_positions[:, 1], return_inverse=True)
+    grid = np.full((len(y_coordinates), len(x_coordinates)), np.nan)
+    grid[y_indices, x_indices] = values
+    return x_coordinates, y_coordinates, grid
@@ -0,0 +1,46 @@
+import numpy as np
+from quantile_sketch import DEFAULT_RELATIVE_ACCURACY, get_sketch_size, merge_sparse_sketches, segmented_sketches, segmented_sparse_sketches, sketch_quantiles
+
+"""
+Tests of the sparse quantile sketches kept per file. Run with: python3 -m pytest test_quantile_sketch.py
+"""
+
+# Files of a campaign of many short recordings, 50 measurements on 3 axes each
+FILE_COUNT = 200
+FILE_SAMPLE_COUNT = 50
+COLUMN_COUNT = 3
+
+def get_campaign(seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 0.2, (FILE_COUNT * FILE_SAMPLE_COUNT, COLUMN_COUNT))
+    ids = np.repeat(np.arange(FILE_COUNT), FILE_SAMPLE_COUNT)
+    return values, ids
+
+# A file's sparse sketch never holds more buckets than it has values, however fine the relative accuracy
+def test_sparse_sketch_size_is_bounded_by_value_count():
+    values, ids = get_campaign()
+    for relative_accuracy in [DEFAULT_RELATIVE_ACCURACY, 0.001]:
+        buckets, counts = segmented_sparse_sketches(values, ids, FILE_COUNT, relative_accuracy)
+        for file_buckets, file_counts in zip(buckets, counts):
+            assert len(file_buckets) == len(file_counts) <= FILE_SAMPLE_COUNT * COLUMN_COUNT
+            assert file_buckets.nbytes + file_counts.nbytes <= FILE_SAMPLE_COUNT * COLUMN_COUNT * 12
+            assert file_counts.sum() == FILE_SAMPLE_COUNT * COLUMN_COUNT
+        # Far below a dense sketch per column
+        assert file_buckets.nbytes + file_counts.nbytes < COLUMN_COUNT * get_sketch_size(relative_accuracy) * 8 / 10
+
+# Merging the sparse sketches of all files gives the dense sketches and therefore the same quantiles
+def test_merged_sparse_sketches_equal_dense_sketches():
+    values, ids = get_campaign()
+    buckets, counts = segmented_sparse_sketches(values, ids, FILE_COUNT)
+    dense_sketches = segmented_sketches(values, ids, FILE_COUNT)
+    merged_sketches = merge_sparse_sketches(buckets, counts, COLUMN_COUNT)
+    assert np.array_equal(merged_sketches, dense_sketches.sum(axis=0))
+    assert np.array_equal(merge_sparse_sketches(buckets[7:8], counts[7:8], COLUMN_COUNT), dense_sketches[7])
+    assert np.array_equal(sketch_quantiles(merged_sketches, [0.5, 0.9]), sketch_quantiles(dense_sketches.sum(axis=0), [0.5, 0.9]))
+
+# Files without values have empty sketches
+def test_empty_segments():
+    values, ids = get_campaign()
+    buckets, counts = segmented_sparse_sketches(values, ids + 1, FILE_COUNT + 2)
+    assert len(buckets[0]) == len(buckets[-1]) == 0
+    assert merge_sparse_sketches([], [], COLUMN_COUNT).sum() == 0
@@ -1,11 +1,31 @@
+import argparse
 import fnmatch
 import matplotlib.pyplot as plt
 import os
 import sys
-from matplotlib import cm
-from numpy import array, lexsort, mean, nan, ndarray, std, sqrt, square
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from numpy import array, maximum, mean, std, sqrt, square
 from statistics import median
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'helper_scripts'))
+from figure_output import DEFAULT_OUTPUT_FORMATS, enable_headless_output, parse_output_formats, show_figures
+from filter_consistency import DEFAULT_WINDOW_SIZE, NIS_DEGREES_OF_FREEDOM, consistency_statistics, consistency_sums, merge_consistency_sums
+from position_metrics import DIMENSIONS_2D, DIMENSIONS_3D, segment_ids, segment_sums, segmented_position_metrics, vector_lengths
+from quantile_sketch import DEFAULT_RELATIVE_ACCURACY, merge_sparse_sketches, segmented_sparse_sketches, sketch_quantiles
+from recording_cache import DEFAULT_CACHE_SIZE, load_recording_cached
+from partial_aggregates import merge_partial_aggregates, save_partial_aggregate
+from recording_loader import AXIS_COUNT, concatenate_recordings, split_recording
+from reference_grid import grid_of_reference_positions, group_by_reference_position, group_means
+from recording_summaries import get_summary_directory, load_summary, remove_orphaned_summaries, save_summary
+
+
+# Quantiles of the distances to reference position in the percentile results
+REPORTED_QUANTILES = [0.5, 0.9, 0.95, 0.99]
+# Dimensions of the distances to reference position whose quantiles are reported, 2D and 3D
+REFERENCE_DISTANCE_DIMENSIONS = [DIMENSIONS_2D, DIMENSIONS_3D]
+# Prefix of the result keys holding the filter consistency sums, see filter_consistency.consistency_sums()
+CONSISTENCY_PREFIX = 'consistency_'
 
 def print_no_document_found_error():
     print("ERROR: No .txt document found")
@@ -14,351 +34,223 @@ def print_no_document_found_error():
     print("Exiting")
     print("\n")
 
-# Returns the amount of measurements recorded
-def get_measurement_count(filename):
-    with open(filename) as f:
-        for i, l in enumerate(f):
-            pass
-    return i + 1
-
-def distance_on_axis(measurement, reference):
-    return measurement - reference
-
-def distance_between_two_points2D(measurement_point, reference_point):
-    if reference_point == None:
-        return
-    return sqrt(pow(measurement_point[0] - reference_point[0], 2) + pow(measurement_point[1] - reference_point[1], 2))
-
-def distance_between_two_points3D(measurement_point, reference_point):
-    if reference_point == None:
-        return
-    return sqrt(pow(measurement_point[0] - reference_point[0], 2) + pow(measurement_point[1] - reference_point[1], 2) + pow(measurement_point[2] - reference_point[2], 2))
-
-# Calculates the distance between consecutive positions in a list. The parameter fun must be either distance_between_two_points_2D or distance_between_two_points_3D. The parameter points must be a list that stores positions in a form of [x, y, z].
-def delta_distances(fun, points):
-    return list(map(fun, points, points[1:]))[:len(points)-1]
-
 def standard_deviation(measurements):
     return std(measurements)
 
-def root_mean_square(data):
-    return sqrt(mean(square(data)))
+# Returns the mean and standard deviation on each axis of all files' residuals, combined from the per-file residual sums
+def axis_means_and_standard_deviations(results, key):
+    measurement_count = sum(result['measurement_count'] for result in results)
+    means = array([result[key + '_sums'] for result in results]).sum(axis=0) / measurement_count
+    square_means = array([result[key + '_square_sums'] for result in results]).sum(axis=0) / measurement_count
+    return means.tolist(), sqrt(maximum(square_means - square(means), 0)).tolist()
 
-def evaluate_and_plot_data(directory):
-    files = fnmatch.filter(os.listdir(directory), '*.txt')
+def has_consistency_sums(result):
+    return CONSISTENCY_PREFIX + 'update_count' in result
 
-    reference_positions = []
-    uwb_mean_positions = []
-    filtered_mean_positions = []
+# Returns a result without its filter consistency sums
+def without_consistency_sums(result):
+    return {key: value for key, value in result.items() if not key.startswith(CONSISTENCY_PREFIX)}
 
-    uwb_distances_on_x_axis_to_reference_x = []
-    uwb_distances_on_y_axis_to_reference_y = []
-    uwb_distances_on_z_axis_to_reference_z = []
-    filtered_distances_on_x_axis_to_reference_x = []
-    filtered_distances_on_y_axis_to_reference_y = []
-    filtered_distances_on_z_axis_to_reference_z = []
+# Returns the filter consistency statistics of all files, combined from the per-file consistency sums
+def merged_consistency_statistics(results):
+    return consistency_statistics(merge_consistency_sums([{key[len(CONSISTENCY_PREFIX):]: value for key, value in result.items() if key.startswith(CONSISTENCY_PREFIX)} for result in results]))
 
-    uwb_distances_on_x_axis_to_measurement_centroid_x = []
-    uwb_distances_on_y_axis_to_measurement_centroid_y = []
-    uwb_distances_on_z_axis_to_measurement_centroid_z = []
-    filtered_distances_on_x_axis_to_measurement_centroid_x = []
-    filtered_distances_on_y_axis_to_measurement_centroid_y = []
-    filtered_distances_on_z_axis_to_measurement_centroid_z = []
-
-    uwb_positions_dictionary = {}
-    filtered_positions_dictionary = {}
+# Returns the given quantiles of all files' values in each of column_count columns, taken from the merged sparse per-file
+# quantile sketches. The result holds one list of per-column values for every quantile.
+def merged_quantiles(results, key, quantiles, column_count, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    sketches = merge_sparse_sketches([result[key + '_sketch_buckets'] for result in results], [result[key + '_sketch_counts'] for result in results], column_count, relative_accuracy)
+    return sketch_quantiles(sketches, quantiles, relative_accuracy).T.tolist()
 
+# Parses a shard given as INDEX/COUNT into (index, count)
+def parse_shard(shard):
+    try:
+        shard_index, shard_count = [int(value) for value in shard.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Shard must be given as INDEX/COUNT, e.g. 0/4")
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise argparse.ArgumentTypeError("Shard index must be at least 0 and less than the shard count")
+    return shard_index, shard_count
+
+# Extracts the reference position out of a filename like 'N(1_2_1,73)_15-10-2020-19-17-32.txt'
+def parse_reference_position(filename):
+    x_reference = float((filename.split('(')[1].split(')')[0].split('_')[0]).replace(',', '.'))
+    y_reference = float((filename.split('(')[1].split(')')[0].split('_')[1]).replace(',', '.'))
+    z_reference = float((filename.split('(')[1].split(')')[0].split('_')[2]).replace(',', '.'))
+    return [x_reference, y_reference, z_reference]
+
+# Evaluates the measurements of many files at once and returns one result dictionary per file.
+# All recordings are concatenated into one array with an offsets index, so every per-file statistic comes from a single
+# segmented reduction over the whole campaign instead of a Python loop over files.
+# The evaluation has no shared state, so groups of files can be evaluated in separate processes and merged afterwards.
+# Distributions of residuals are kept as sparse quantile sketches of the given relative accuracy, not as the residuals
+# themselves, so the size of a result is bounded by the file's number of measurements.
+# With consistency, the app's Kalman filter is replayed over all files as well and the results hold its consistency sums.
+def evaluate_campaign(paths, reference_positions, cache_directory=None, cache_size=DEFAULT_CACHE_SIZE, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, consistency=False):
+    # Load all measurements, each file in one pass
+    recordings = [load_recording_cached(path, cache_directory, cache_size) for path in paths]
+    data, offsets = concatenate_recordings(recordings)
+    uwb_positions, filtered_positions, _, _ = split_recording(data)
+    references = array(reference_positions, dtype=float).reshape(-1, 3)
+    ids = segment_ids(offsets)
+
+    # Accuracy, precision and jitter metrics of both position series of all files
+    uwb_metrics = segmented_position_metrics(uwb_positions, offsets, references)
+    filtered_metrics = segmented_position_metrics(filtered_positions, offsets, references)
+
+    # Distances on each axis to reference position and to measurement centroid
+    distances_on_axes = {
+        'uwb_distances_on_axes_to_reference': uwb_positions - references[ids],
+        'filtered_distances_on_axes_to_reference': filtered_positions - references[ids],
+        'uwb_distances_on_axes_to_measurement_centroid': uwb_positions - uwb_metrics['centroid'][ids],
+        'filtered_distances_on_axes_to_measurement_centroid': filtered_positions - filtered_metrics['centroid'][ids],
+    }
+    # Sums and square sums of the distances on each axis, which let axis means and deviations be merged across files
+    distances_on_axes_sums = {}
+    for key, distances in distances_on_axes.items():
+        distances_on_axes_sums[key + '_sums'] = segment_sums(distances, ids, len(paths))
+        distances_on_axes_sums[key + '_square_sums'] = segment_sums(square(distances), ids, len(paths))
+
+    # Quantile sketches of the distances on each axis and of the 2D and 3D distances to reference position
+    sketches = {key: segmented_sparse_sketches(distances, ids, len(paths), relative_accuracy) for key, distances in distances_on_axes.items()}
+    for channel in ['uwb', 'filtered']:
+        distances = distances_on_axes[channel + '_distances_on_axes_to_reference']
+        distances_to_reference = array([vector_lengths(distances, dimensions) for dimensions in REFERENCE_DISTANCE_DIMENSIONS]).T
+        sketches[channel + '_distances_to_reference_point'] = segmented_sparse_sketches(distances_to_reference, ids, len(paths), relative_accuracy)
+
+    # Innovation statistics of the app's Kalman filter replayed over all files at once
+    consistency = consistency_sums(recordings) if consistency else {}
+
+    results = []
+    for i, reference_position in enumerate(reference_positions):
+        start, end = offsets[i], offsets[i + 1]
+        result = {
+            'reference_position': reference_position,
+            'measurement_count': int(end - start),
+            'uwb_measurements_centroid': uwb_metrics['centroid'][i].tolist(),
+            'filtered_measurements_centroid': filtered_metrics['centroid'][i].tolist(),
+            'quantile_relative_accuracy': relative_accuracy,
+        }
+        for key, (buckets, counts) in sketches.items():
+            result[key + '_sketch_buckets'] = buckets[i]
+            result[key + '_sketch_counts'] = counts[i]
+        for key, sums in distances_on_axes_sums.items():
+            result[key] = sums[i].tolist()
+        for key, sums in consistency.items():
+            result[CONSISTENCY_PREFIX + key] = sums[i].tolist()
+        # Accuracy, precision and jitter
+        for channel, metrics in [('uwb', uwb_metrics), ('filtered', filtered_metrics)]:
+            for dimensions in ['2D', '3D']:
+                result['{}_mean_distance_to_reference_point_{}'.format(channel, dimensions)] = metrics['mean_distance_to_reference_' + dimensions][i]
+                result['{}_std_distances_to_reference_point_{}'.format(channel, dimensions)] = metrics['std_distance_to_reference_' + dimensions][i]
+                result['{}_mean_distance_to_measurement_centroid_{}'.format(channel, dimensions)] = metrics['mean_distance_to_centroid_' + dimensions][i]
+                result['{}_std_distances_to_measurement_centroid_{}'.format(channel, dimensions)] = metrics['std_distance_to_centroid_' + dimensions][i]
+                result['{}_mean_delta_distance_{}'.format(channel, dimensions)] = metrics['mean_delta_distance_' + dimensions][i]
+                result['{}_rms_delta_distance_{}'.format(channel, dimensions)] = metrics['rms_delta_distance_' + dimensions][i]
+        results.append(result)
+    return results
+
+# Evaluates all files, in a pool of 'jobs' processes if jobs > 1, and returns their results in the order of the given paths.
+# With a pool, the files are split into consecutive groups and every worker evaluates whole groups as one campaign.
+def evaluate_files(paths, reference_positions, jobs=1, cache_directory=None, cache_size=DEFAULT_CACHE_SIZE, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, consistency=False):
+    if jobs <= 1 or len(paths) <= 1:
+        return evaluate_campaign(paths, reference_positions, cache_directory, cache_size, relative_accuracy, consistency)
+    group_size = max(1, -(-len(paths) // (jobs * 4)))
+    path_groups = [paths[i:i + group_size] for i in range(0, len(paths), group_size)]
+    reference_position_groups = [reference_positions[i:i + group_size] for i in range(0, len(paths), group_size)]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # map() yields the results in the order of submission, so the merged results never depend on scheduling
+        return [result for results in executor.map(evaluate_campaign, path_groups, reference_position_groups, repeat(cache_directory), repeat(cache_size), repeat(relative_accuracy), repeat(consistency)) for result in results]
+
+# Returns the results of all files. Results persisted as summaries are reused, only new or changed files are evaluated
+# and their summaries are persisted afterwards. Without a summary directory all files are evaluated.
+# Summaries holding quantile sketches of another relative accuracy are evaluated again as well, and so are summaries
+# without consistency sums if they are asked for. Consistency sums of summaries are dropped if they are not asked for,
+# so all results hold the same keys.
+# Summaries of recordings that are not in campaign_paths (default: paths) are removed. A shard passes the paths of the
+# whole campaign, so it never removes the summaries of the other shards.
+def evaluate_files_incrementally(paths, reference_positions, summary_directory=None, jobs=1, cache_directory=None, cache_size=DEFAULT_CACHE_SIZE, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, consistency=False, campaign_paths=None):
+    if summary_directory is None:
+        return evaluate_files(paths, reference_positions, jobs, cache_directory, cache_size, relative_accuracy, consistency)
+
+    remove_orphaned_summaries(summary_directory, paths if campaign_paths is None else campaign_paths)
+    results = [load_summary(summary_directory, path) for path in paths]
+    if not consistency:
+        results = [None if result is None else without_consistency_sums(result) for result in results]
+    changed_indices = [i for i, result in enumerate(results) if result is None or result['quantile_relative_accuracy'] != relative_accuracy or (consistency and not has_consistency_sums(result))]
+    changed_results = evaluate_files([paths[i] for i in changed_indices], [reference_positions[i] for i in changed_indices], jobs, cache_directory, cache_size, relative_accuracy, consistency)
+    for i, result in zip(changed_indices, changed_results):
+        save_summary(summary_directory, paths[i], result)
+        results[i] = result
+    return results
+
+# Returns the paths, reference positions and results of all files in a directory ordered by filename.
+# A shard (index, count) restricts the evaluation to every count-th file starting with the index-th one.
+def evaluate_directory(directory, jobs=1, cache_directory=None, cache_size=DEFAULT_CACHE_SIZE, use_summaries=True, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, shard=None, consistency=False):
+    campaign_files = sorted(fnmatch.filter(os.listdir(directory), '*.txt'))
+    files = campaign_files
+    if shard is not None:
+        shard_index, shard_count = shard
+        files = campaign_files[shard_index::shard_count]
+    paths = [os.path.join(directory, filename) for filename in files]
+    reference_positions = [parse_reference_position(filename) for filename in files]
+
+    summary_directory = get_summary_directory(directory) if use_summaries else None
+    campaign_paths = [os.path.join(directory, filename) for filename in campaign_files]
+    results = evaluate_files_incrementally(paths, reference_positions, summary_directory, jobs, cache_directory, cache_size, relative_accuracy, consistency, campaign_paths)
+    return paths, reference_positions, results
+
+def evaluate_and_plot_data(directory, jobs=1, cache_directory=None, cache_size=DEFAULT_CACHE_SIZE, use_summaries=True, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, shard=None, consistency=False):
+    _, reference_positions, results = evaluate_directory(directory, jobs, cache_directory, cache_size, use_summaries, relative_accuracy, shard, consistency)
+    report_and_plot_results(reference_positions, results, relative_accuracy)
+
+# Evaluates the partial aggregates of all shards of a campaign as a whole, see partial_aggregates.py
+def merge_and_plot_data(partial_aggregate_paths):
+    _, reference_positions, results = merge_partial_aggregates(partial_aggregate_paths)
+    if len(results) == 0:
+        raise ValueError("The partial aggregates contain no files")
+    relative_accuracies = set(result['quantile_relative_accuracy'] for result in results)
+    if len(relative_accuracies) > 1:
+        raise ValueError("The partial aggregates hold quantile sketches of different relative accuracies: {}".format(sorted(relative_accuracies)))
+    report_and_plot_results(reference_positions, results, relative_accuracies.pop())
+
+# Prints the final accuracy, precision, jitter and percentile results of the per-file results and plots them. The
+# consistency results are printed as well if all results hold consistency sums.
+def report_and_plot_results(reference_positions, results, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
     # Accuracy
-    uwb_mean_distances_to_reference_point_2D = []
-    filtered_mean_distances_to_reference_point_2D = []
-    uwb_mean_distances_to_reference_point_3D = []
-    filtered_mean_distances_to_reference_point_3D = []
-    uwb_mean_distances_to_reference_point_stds_2D = []
-    filtered_mean_distances_to_reference_point_stds_2D = []
-    uwb_mean_distances_to_reference_point_stds_3D = []
-    filtered_mean_distances_to_reference_point_stds_3D = []
+    uwb_mean_distances_to_reference_point_2D = [result['uwb_mean_distance_to_reference_point_2D'] for result in results]
+    filtered_mean_distances_to_reference_point_2D = [result['filtered_mean_distance_to_reference_point_2D'] for result in results]
+    uwb_mean_distances_to_reference_point_3D = [result['uwb_mean_distance_to_reference_point_3D'] for result in results]
+    filtered_mean_distances_to_reference_point_3D = [result['filtered_mean_distance_to_reference_point_3D'] for result in results]
+    uwb_mean_distances_to_reference_point_stds_2D = [result['uwb_std_distances_to_reference_point_2D'] for result in results]
+    filtered_mean_distances_to_reference_point_stds_2D = [result['filtered_std_distances_to_reference_point_2D'] for result in results]
+    uwb_mean_distances_to_reference_point_stds_3D = [result['uwb_std_distances_to_reference_point_3D'] for result in results]
+    filtered_mean_distances_to_reference_point_stds_3D = [result['filtered_std_distances_to_reference_point_3D'] for result in results]
 
     # Precision
-    uwb_mean_distances_to_measurement_centroid_2D = []
-    filtered_mean_distances_to_measurement_centroid_2D = []
-    uwb_mean_distances_to_measurement_centroid_3D = []
-    filtered_mean_distances_to_measurement_centroid_3D = []
-    uwb_mean_distances_to_measurement_centroid_stds_2D = []
-    filtered_mean_distances_to_measurement_centroid_stds_2D = []
-    uwb_mean_distances_to_measurement_centroid_stds_3D = []
-    filtered_mean_distances_to_measurement_centroid_stds_3D = []
+    uwb_mean_distances_to_measurement_centroid_2D = [result['uwb_mean_distance_to_measurement_centroid_2D'] for result in results]
+    filtered_mean_distances_to_measurement_centroid_2D = [result['filtered_mean_distance_to_measurement_centroid_2D'] for result in results]
+    uwb_mean_distances_to_measurement_centroid_3D = [result['uwb_mean_distance_to_measurement_centroid_3D'] for result in results]
+    filtered_mean_distances_to_measurement_centroid_3D = [result['filtered_mean_distance_to_measurement_centroid_3D'] for result in results]
+    uwb_mean_distances_to_measurement_centroid_stds_2D = [result['uwb_std_distances_to_measurement_centroid_2D'] for result in results]
+    filtered_mean_distances_to_measurement_centroid_stds_2D = [result['filtered_std_distances_to_measurement_centroid_2D'] for result in results]
+    uwb_mean_distances_to_measurement_centroid_stds_3D = [result['uwb_std_distances_to_measurement_centroid_3D'] for result in results]
+    filtered_mean_distances_to_measurement_centroid_stds_3D = [result['filtered_std_distances_to_measurement_centroid_3D'] for result in results]
 
     # Jitter
-    uwb_mean_delta_distances_2D = []
-    uwb_rms_delta_distances_2D = []
-    filtered_mean_delta_distances_2D = []
-    filtered_rms_delta_distances_2D = []
-    uwb_mean_delta_distances_3D = []
-    uwb_rms_delta_distances_3D = []
-    filtered_mean_delta_distances_3D = []
-    filtered_rms_delta_distances_3D = []
-
-    for filename in files:
-        direction = filename.split('(')[0]
-        x_reference = float((filename.split('(')[1].split(')')[0].split('_')[0]).replace(',', '.'))
-        y_reference = float((filename.split('(')[1].split(')')[0].split('_')[1]).replace(',', '.'))
-        z_reference = float((filename.split('(')[1].split(')')[0].split('_')[2]).replace(',', '.'))
-        reference_position = [x_reference, y_reference, z_reference]
-        reference_positions.append(reference_position)
-        ''' Local variables '''
-        # Variables making up the mean coordinate
-        uwb_x_mean = 0.0
-        uwb_y_mean = 0.0
-        uwb_z_mean = 0.0
-        filtered_x_mean = 0.0
-        filtered_y_mean = 0.0
-        filtered_z_mean = 0.0
-
-        uwb_x_values = []
-        uwb_y_values = []
-        uwb_z_values = []
-        filtered_x_values = []
-        filtered_y_values = []
-        filtered_z_values = []
-
-        # List holding all measurement points
-        uwb_measurement_points = []
-        filtered_measurement_points = []
-
-        # Lists holding all distances from measurement points to reference point
-        uwb_distances_to_ref_point_2D = []
-        uwb_distances_to_ref_point_3D = []
-        filtered_distances_to_ref_point_2D = []
-        filtered_distances_to_ref_point_3D = []
-
-        # Lists holding all distances from measurement points to measurement centroids
-        uwb_distances_to_measurement_centroid_2D = []
-        uwb_distances_to_measurement_centroid_3D = []
-        filtered_distances_to_measurement_centroid_2D = []
-        filtered_distances_to_measurement_centroid_3D = []
-        
-        # Lists holding all distance differences from positions to their next one
-        uwb_delta_distances_2D = []
-        uwb_delta_distances_3D = []
-        filtered_delta_distances_2D = []
-        filtered_delta_distances_3D = []
-
-        ''' Go! '''
-        # Get amount of measurements collected
-        measurement_count = get_measurement_count(filename)
-        with open(filename) as f:
-            for line in f:
-                uwb_position = line.split('|')[0]
-                filtered_position = line.split('|')[1]
-
-                # Extract x, y and z coordinates out of each line
-                uwb_x = float(uwb_position.split(',')[0])
-                uwb_y = float(uwb_position.split(',')[1])
-                uwb_z = float(uwb_position.split(',')[2])
-                filtered_x = float(filtered_position.split(',')[0])
-                filtered_y = float(filtered_position.split(',')[1])
-                filtered_z = float(filtered_position.split(',')[2])
-                
-                # Add individual coordinates to coordniate's means
-                uwb_x_mean += uwb_x
-                uwb_y_mean += uwb_y
-                uwb_z_mean += uwb_z
-                filtered_x_mean += filtered_x
-                filtered_y_mean += filtered_y
-                filtered_z_mean += filtered_z
-
-                uwb_x_values.append(uwb_x)
-                uwb_y_values.append(uwb_y)
-                uwb_z_values.append(uwb_z)
-                filtered_x_values.append(filtered_x)
-                filtered_y_values.append(filtered_y)
-                filtered_z_values.append(filtered_z)
-
-                # Make up coordinate and add to list
-                uwb_measurement_point = [uwb_x, uwb_y, uwb_z]
-                uwb_measurement_points.append(uwb_measurement_point)
-                filtered_measurement_point = [filtered_x, filtered_y, filtered_z]
-                filtered_measurement_points.append(filtered_measurement_point)
-
-                # Calculate distance of measurement point to reference position in 2D and 3D
-                uwb_distance_to_ref_point_2D = distance_between_two_points2D(uwb_measurement_point, reference_position)
-                uwb_distances_to_ref_point_2D.append(uwb_distance_to_ref_point_2D)
-                uwb_distance_to_ref_point_3D = distance_between_two_points3D(uwb_measurement_point, reference_position)
-                uwb_distances_to_ref_point_3D.append(uwb_distance_to_ref_point_3D)
-                filtered_distance_to_ref_point_2D = distance_between_two_points2D(filtered_measurement_point, reference_position)
-                filtered_distances_to_ref_point_2D.append(filtered_distance_to_ref_point_2D)
-                filtered_distance_to_ref_point_3D = distance_between_two_points3D(filtered_measurement_point, reference_position)
-                filtered_distances_to_ref_point_3D.append(filtered_distance_to_ref_point_3D)
-
-                # Calculate distances on each axis to reference position
-                uwb_distance_x = uwb_x - reference_position[0]
-                uwb_distances_on_x_axis_to_reference_x.append(uwb_distance_x)
-                uwb_distance_y = uwb_y - reference_position[1]
-                uwb_distances_on_y_axis_to_reference_y.append(uwb_distance_y)
-                uwb_distance_z = uwb_z - reference_position[2]
-                uwb_distances_on_z_axis_to_reference_z.append(uwb_distance_z)
-                filtered_distance_x = filtered_x - reference_position[0]
-                filtered_distances_on_x_axis_to_reference_x.append(filtered_distance_x)
-                filtered_distance_y = filtered_y - reference_position[1]
-                filtered_distances_on_y_axis_to_reference_y.append(filtered_distance_y)
-                filtered_distance_z = filtered_z - reference_position[2]
-                filtered_distances_on_z_axis_to_reference_z.append(filtered_distance_z)
-        
-        '''#############################################################
-        #################### ACCURACY EVALUATION ####################
-        #############################################################'''
-
-        # Calculate mean distance of measurements to reference point
-        uwb_mean_distance_to_ref_point_2D = mean(uwb_distances_to_ref_point_2D)
-        uwb_mean_distances_to_reference_point_2D.append(uwb_mean_distance_to_ref_point_2D)
-        uwb_mean_distance_to_ref_point_3D = mean(uwb_distances_to_ref_point_3D)
-        uwb_mean_distances_to_reference_point_3D.append(uwb_mean_distance_to_ref_point_3D)
-        filtered_mean_distance_to_ref_point_2D = mean(filtered_distances_to_ref_point_2D)
-        filtered_mean_distances_to_reference_point_2D.append(filtered_mean_distance_to_ref_point_2D)
-        filtered_mean_distance_to_ref_point_3D = mean(filtered_distances_to_ref_point_3D)
-        filtered_mean_distances_to_reference_point_3D.append(filtered_mean_distance_to_ref_point_3D)
-
-        # Get distance standard deviations of distance to reference point
-        uwb_std_2D_distances_to_ref_point = standard_deviation(uwb_distances_to_ref_point_2D)
-        uwb_mean_distances_to_reference_point_stds_2D.append(uwb_std_2D_distances_to_ref_point)
-        uwb_std_3D_distances_to_ref_point = standard_deviation(uwb_distances_to_ref_point_3D)
-        uwb_mean_distances_to_reference_point_stds_3D.append(uwb_std_3D_distances_to_ref_point)
-        filtered_std_2D_distances_to_ref_point = standard_deviation(filtered_distances_to_ref_point_2D)
-        filtered_mean_distances_to_reference_point_stds_2D.append(filtered_std_2D_distances_to_ref_point)
-        filtered_std_3D_distances_to_ref_point = standard_deviation(filtered_distances_to_ref_point_3D)
-        filtered_mean_distances_to_reference_point_stds_3D.append(filtered_std_3D_distances_to_ref_point)
-
-        '''#############################################################
-        #################### PRECISION EVALUATION ###################
-        #############################################################'''
-        # Get measurements' centroid and add to dictionary
-        uwb_x_mean /= measurement_count
-        uwb_y_mean /= measurement_count
-        uwb_z_mean /= measurement_count
-        uwb_measurements_centroid = [uwb_x_mean, uwb_y_mean, uwb_z_mean]
-        uwb_reference_position_string = [str(coordinate) for coordinate in reference_position]
-        uwb_reference_position_string = ','.join(uwb_reference_position_string)
-        uwb_positions_dictionary.setdefault(uwb_reference_position_string, [])
-        uwb_positions_dictionary[uwb_reference_position_string].append(uwb_measurements_centroid)
-
-        filtered_x_mean /= measurement_count
-        filtered_y_mean /= measurement_count
-        filtered_z_mean /= measurement_count
-        filtered_measurements_centroid = [filtered_x_mean, filtered_y_mean, filtered_z_mean]
-        filtered_reference_position_string = [str(coordinate) for coordinate in reference_position]
-        filtered_reference_position_string = ','.join(filtered_reference_position_string)
-        filtered_positions_dictionary.setdefault(filtered_reference_position_string, [])
-        filtered_positions_dictionary[filtered_reference_position_string].append(filtered_measurements_centroid)
-
-        # Calculate distance of each measurement point to measurements' centroid
-        for uwb_measurement_point in uwb_measurement_points:
-            uwb_distance_to_measurement_centroid_2D = distance_between_two_points2D(uwb_measurement_point, uwb_measurements_centroid)
-            uwb_distances_to_measurement_centroid_2D.append(uwb_distance_to_measurement_centroid_2D)
-            uwb_distance_to_measurement_centroid_3D = distance_between_two_points3D(uwb_measurement_point, uwb_measurements_centroid)
-            uwb_distances_to_measurement_centroid_3D.append(uwb_distance_to_measurement_centroid_3D)
-        for filtered_measurement_point in filtered_measurement_points:
-            filtered_distance_to_measurement_centroid_2D = distance_between_two_points2D(filtered_measurement_point, filtered_measurements_centroid)
-            filtered_distances_to_measurement_centroid_2D.append(filtered_distance_to_measurement_centroid_2D)
-            filtered_distance_to_measurement_centroid_3D = distance_between_two_points3D(filtered_measurement_point, filtered_measurements_centroid)
-            filtered_distances_to_measurement_centroid_3D.append(filtered_distance_to_measurement_centroid_3D)
-        
-        # Calculate distance for each measured axis value to measurement centroid axis value
-        for uwb_x in uwb_x_values:
-            uwb_x_to_x_axis_mean_distance = distance_on_axis(uwb_x, uwb_x_mean)
-            uwb_distances_on_x_axis_to_measurement_centroid_x.append(uwb_x_to_x_axis_mean_distance)
-        for uwb_y in uwb_y_values:
-            uwb_y_to_y_axis_mean_distance = distance_on_axis(uwb_y, uwb_y_mean)
-            uwb_distances_on_y_axis_to_measurement_centroid_y.append(uwb_y_to_y_axis_mean_distance)
-        for uwb_z in uwb_z_values:
-            uwb_z_to_z_axis_mean_distance = distance_on_axis(uwb_z, uwb_z_mean)
-            uwb_distances_on_z_axis_to_measurement_centroid_z.append(uwb_z_to_z_axis_mean_distance)
-
-        for filtered_x in filtered_x_values:
-            filtered_x_to_x_axis_mean_distance = distance_on_axis(filtered_x, filtered_x_mean)
-            filtered_distances_on_x_axis_to_measurement_centroid_x.append(filtered_x_to_x_axis_mean_distance)
-        for filtered_y in filtered_y_values:
-            filtered_y_to_y_axis_mean_distance = distance_on_axis(filtered_y, filtered_y_mean)
-            filtered_distances_on_y_axis_to_measurement_centroid_y.append(filtered_y_to_y_axis_mean_distance)
-        for filtered_z in filtered_z_values:
-            filtered_z_to_z_axis_mean_distance = distance_on_axis(filtered_z, filtered_z_mean)
-            filtered_distances_on_z_axis_to_measurement_centroid_z.append(filtered_z_to_z_axis_mean_distance)
-
-        # Calculate mean distance of measurements to measurement centroid
-        uwb_mean_distance_to_measurement_centroid_2D = mean(uwb_distances_to_measurement_centroid_2D)
-        uwb_mean_distances_to_measurement_centroid_2D.append(uwb_mean_distance_to_measurement_centroid_2D)
-        uwb_mean_distance_to_measurement_centroid_3D = mean(uwb_distances_to_measurement_centroid_3D)
-        uwb_mean_distances_to_measurement_centroid_3D.append(uwb_mean_distance_to_measurement_centroid_3D)
-        filtered_mean_distance_to_measurement_centroid_2D = mean(filtered_distances_to_measurement_centroid_2D)
-        filtered_mean_distances_to_measurement_centroid_2D.append(filtered_mean_distance_to_measurement_centroid_2D)
-        filtered_mean_distance_to_measurement_centroid_3D = mean(filtered_distances_to_measurement_centroid_3D)
-        filtered_mean_distances_to_measurement_centroid_3D.append(filtered_mean_distance_to_measurement_centroid_3D)
-
-        # Calculate distance standard deviations of distance to measurement centroid
-        uwb_std_2D_distances_to_measurement_centroid = standard_deviation(uwb_distances_to_measurement_centroid_2D)
-        uwb_mean_distances_to_measurement_centroid_stds_2D.append(uwb_std_2D_distances_to_measurement_centroid)
-        uwb_std_3D_distances_to_measurement_centroid = standard_deviation(uwb_distances_to_measurement_centroid_3D)
-        uwb_mean_distances_to_measurement_centroid_stds_3D.append(uwb_std_3D_distances_to_measurement_centroid)
-        filtered_std_2D_distances_to_measurement_centroid = standard_deviation(filtered_distances_to_measurement_centroid_2D)
-        filtered_mean_distances_to_measurement_centroid_stds_2D.append(filtered_std_2D_distances_to_measurement_centroid)
-        filtered_std_3D_distances_to_measurement_centroid = standard_deviation(filtered_distances_to_measurement_centroid_3D)
-        filtered_mean_distances_to_measurement_centroid_stds_3D.append(filtered_std_3D_distances_to_measurement_centroid)
-
-        ''' TODO: Take mean distance or distance from centroid to reference point? '''
-        # Calculate distances from measurement centroid to reference point
-        uwb_distance_measurement_centroid_to_ref_point_2D = distance_between_two_points2D(uwb_measurements_centroid, reference_position)
-        uwb_distance_measurement_centroid_to_ref_point_3D = distance_between_two_points3D(uwb_measurements_centroid, reference_position)
-        filtered_distance_measurement_centroid_to_ref_point_2D = distance_between_two_points2D(filtered_measurements_centroid, reference_position)
-        filtered_distance_measurement_centroid_to_ref_point_3D = distance_between_two_points3D(filtered_measurements_centroid, reference_position)
-
-        '''###################################################################
-        ########################## JITTER EVALUATION #########################
-        ###################################################################'''
-        # 2D Get mean and rms distance differences from measurements to their next ones
-        uwb_mean_mean_delta_distance_2D = mean(delta_distances(distance_between_two_points2D, uwb_measurement_points))
-        uwb_mean_delta_distances_2D.append(uwb_mean_mean_delta_distance_2D)
-        uwb_rms_delta_distance_2D = root_mean_square(delta_distances(distance_between_two_points2D, uwb_measurement_points))
-        uwb_rms_delta_distances_2D.append(uwb_rms_delta_distance_2D)
-        filtered_mean_mean_delta_distance_2D = mean(delta_distances(distance_between_two_points2D, filtered_measurement_points))
-        filtered_mean_delta_distances_2D.append(filtered_mean_mean_delta_distance_2D)
-        filtered_rms_delta_distance_2D = root_mean_square(delta_distances(distance_between_two_points2D, filtered_measurement_points))
-        filtered_rms_delta_distances_2D.append(filtered_rms_delta_distance_2D)
-
-        # 3D Get mean and rms distance differences from measurements to their next ones
-        uwb_mean_mean_delta_distance_3D = mean(delta_distances(distance_between_two_points3D, uwb_measurement_points))
-        uwb_mean_delta_distances_3D.append(uwb_mean_mean_delta_distance_3D)
-        uwb_rms_delta_distance_3D = root_mean_square(delta_distances(distance_between_two_points3D, uwb_measurement_points))
-        uwb_rms_delta_distances_3D.append(uwb_rms_delta_distance_3D)
-        filtered_mean_mean_delta_distance_3D = mean(delta_distances(distance_between_two_points3D, filtered_measurement_points))
-        filtered_mean_delta_distances_3D.append(filtered_mean_mean_delta_distance_3D)
-        filtered_rms_delta_distance_3D = root_mean_square(delta_distances(distance_between_two_points3D, filtered_measurement_points))
-        filtered_rms_delta_distances_3D.append(filtered_rms_delta_distance_3D)
+    uwb_mean_delta_distances_2D = [result['uwb_mean_delta_distance_2D'] for result in results]
+    uwb_rms_delta_distances_2D = [result['uwb_rms_delta_distance_2D'] for result in results]
+    filtered_mean_delta_distances_2D = [result['filtered_mean_delta_distance_2D'] for result in results]
+    filtered_rms_delta_distances_2D = [result['filtered_rms_delta_distance_2D'] for result in results]
+    uwb_mean_delta_distances_3D = [result['uwb_mean_delta_distance_3D'] for result in results]
+    uwb_rms_delta_distances_3D = [result['uwb_rms_delta_distance_3D'] for result in results]
+    filtered_mean_delta_distances_3D = [result['filtered_mean_delta_distance_3D'] for result in results]
+    filtered_rms_delta_distances_3D = [result['filtered_rms_delta_distance_3D'] for result in results]
 
     # Calculate the measurement centroid of all measurement centroids of each reference position
-    for k, v in uwb_positions_dictionary.items():
-        uwb_x_mean = 0
-        uwb_y_mean = 0
-        uwb_z_mean = 0
-        for uwb_position in v:
-            uwb_x_mean += uwb_position[0]
-            uwb_y_mean += uwb_position[1]
-            uwb_z_mean += uwb_position[2]
-        uwb_x_mean /= len(v)
-        uwb_y_mean /= len(v)
-        uwb_z_mean /= len(v)
-        uwb_mean_positions.append([uwb_x_mean, uwb_y_mean, uwb_z_mean])
-    for k, v in filtered_positions_dictionary.items():
-        filtered_x_mean = 0
-        filtered_y_mean = 0
-        filtered_z_mean = 0
-        for filtered_position in v:
-            filtered_x_mean += filtered_position[0]
-            filtered_y_mean += filtered_position[1]
-            filtered_z_mean += filtered_position[2]
-        filtered_x_mean /= len(v)
-        filtered_y_mean /= len(v)
-        filtered_z_mean /= len(v)
-        filtered_mean_positions.append([filtered_x_mean, filtered_y_mean, filtered_z_mean])
-    
+    unique_reference_positions, reference_position_ids = group_by_reference_position(reference_positions)
+    uwb_mean_positions = group_means([result['uwb_measurements_centroid'] for result in results], reference_position_ids, len(unique_reference_positions))
+    filtered_mean_positions = group_means([result['filtered_measurements_centroid'] for result in results], reference_position_ids, len(unique_reference_positions))
+
     # Final accuracy evaluation
     # 2D and 3D position accuracy evaluation
     # UWB
@@ -379,26 +271,12 @@ def evaluate_and_plot_data(directory):
 
     # Axis accuracy evaluation
     # UWB
-    uwb_mean_distance_on_x_axis_to_reference_x = mean(uwb_distances_on_x_axis_to_reference_x)
-    uwb_median_distance_on_x_axis_to_reference_x = median(uwb_distances_on_x_axis_to_reference_x)
-    uwb_std_of_distances_on_x_axis_to_reference_x = standard_deviation(uwb_distances_on_x_axis_to_reference_x)
-    uwb_mean_distance_on_y_axis_to_reference_y = mean(uwb_distances_on_y_axis_to_reference_y)
-    uwb_median_distance_on_y_axis_to_reference_y = median(uwb_distances_on_y_axis_to_reference_y)
-    uwb_std_of_distances_on_y_axis_to_reference_y = standard_deviation(uwb_distances_on_y_axis_to_reference_y)
-    uwb_mean_distance_on_z_axis_to_reference_z = mean(uwb_distances_on_z_axis_to_reference_z)
-    uwb_median_distance_on_z_axis_to_reference_z = median(uwb_distances_on_z_axis_to_reference_z)
-    uwb_std_of_distances_on_z_axis_to_reference_z = standard_deviation(uwb_distances_on_z_axis_to_reference_z)
+    (uwb_mean_distance_on_x_axis_to_reference_x, uwb_mean_distance_on_y_axis_to_reference_y, uwb_mean_distance_on_z_axis_to_reference_z), (uwb_std_of_distances_on_x_axis_to_reference_x, uwb_std_of_distances_on_y_axis_to_reference_y, uwb_std_of_distances_on_z_axis_to_reference_z) = axis_means_and_standard_deviations(results, 'uwb_distances_on_axes_to_reference')
+    uwb_median_distance_on_x_axis_to_reference_x, uwb_median_distance_on_y_axis_to_reference_y, uwb_median_distance_on_z_axis_to_reference_z = merged_quantiles(results, 'uwb_distances_on_axes_to_reference', [0.5], AXIS_COUNT, relative_accuracy)[0]
     
     # Filtered
-    filtered_mean_distance_on_x_axis_to_reference_x = mean(filtered_distances_on_x_axis_to_reference_x)
-    filtered_median_distance_on_x_axis_to_reference_x = median(filtered_distances_on_x_axis_to_reference_x)
-    filtered_std_of_distances_on_x_axis_to_reference_x = standard_deviation(filtered_distances_on_x_axis_to_reference_x)
-    filtered_mean_distance_on_y_axis_to_reference_y = mean(filtered_distances_on_y_axis_to_reference_y)
-    filtered_median_distance_on_y_axis_to_reference_y = median(filtered_distances_on_y_axis_to_reference_y)
-    filtered_std_of_distances_on_y_axis_to_reference_y = standard_deviation(filtered_distances_on_y_axis_to_reference_y)
-    filtered_mean_distance_on_z_axis_to_reference_z = mean(filtered_distances_on_z_axis_to_reference_z)
-    filtered_median_distance_on_z_axis_to_reference_z = median(filtered_distances_on_z_axis_to_reference_z)
-    filtered_std_of_distances_on_z_axis_to_reference_z = standard_deviation(filtered_distances_on_z_axis_to_reference_z)
+    (filtered_mean_distance_on_x_axis_to_reference_x, filtered_mean_distance_on_y_axis_to_reference_y, filtered_mean_distance_on_z_axis_to_reference_z), (filtered_std_of_distances_on_x_axis_to_reference_x, filtered_std_of_distances_on_y_axis_to_reference_y, filtered_std_of_distances_on_z_axis_to_reference_z) = axis_means_and_standard_deviations(results, 'filtered_distances_on_axes_to_reference')
+    filtered_median_distance_on_x_axis_to_reference_x, filtered_median_distance_on_y_axis_to_reference_y, filtered_median_distance_on_z_axis_to_reference_z = merged_quantiles(results, 'filtered_distances_on_axes_to_reference', [0.5], AXIS_COUNT, relative_accuracy)[0]
 
     # Final precision evaluation
     # 2D and 3D position precision evaluation
@@ -420,26 +298,12 @@ def evaluate_and_plot_data(directory):
 
     # Axis precision evaluation
     # UWB
-    uwb_mean_distance_on_x_axis_to_measurement_centroid_x = mean(uwb_distances_on_x_axis_to_measurement_centroid_x)
-    uwb_median_distance_on_x_axis_to_measurement_centroid_x = median(uwb_distances_on_x_axis_to_measurement_centroid_x)
-    uwb_std_of_distances_on_x_axis_to_measurement_centroid_x = standard_deviation(uwb_distances_on_x_axis_to_measurement_centroid_x)
-    uwb_mean_distance_on_y_axis_to_measurement_centroid_y = mean(uwb_distances_on_y_axis_to_measurement_centroid_y)
-    uwb_median_distance_on_y_axis_to_measurement_centroid_y = median(uwb_distances_on_y_axis_to_measurement_centroid_y)
-    uwb_std_of_distances_on_y_axis_to_measurement_centroid_y = standard_deviation(uwb_distances_on_y_axis_to_measurement_centroid_y)
-    uwb_mean_distance_on_z_axis_to_measurement_centroid_z = mean(uwb_distances_on_z_axis_to_measurement_centroid_z)
-    uwb_median_distance_on_z_axis_to_measurement_centroid_z = median(uwb_distances_on_z_axis_to_measurement_centroid_z)
-    uwb_std_of_distances_on_z_axis_to_measurement_centroid_z = standard_deviation(uwb_distances_on_z_axis_to_measurement_centroid_z)
+    (uwb_mean_distance_on_x_axis_to_measurement_centroid_x, uwb_mean_distance_on_y_axis_to_measurement_centroid_y, uwb_mean_distance_on_z_axis_to_measurement_centroid_z), (uwb_std_of_distances_on_x_axis_to_measurement_centroid_x, uwb_std_of_distances_on_y_axis_to_measurement_centroid_y, uwb_std_of_distances_on_z_axis_to_measurement_centroid_z) = axis_means_and_standard_deviations(results, 'uwb_distances_on_axes_to_measurement_centroid')
+    uwb_median_distance_on_x_axis_to_measurement_centroid_x, uwb_median_distance_on_y_axis_to_measurement_centroid_y, uwb_median_distance_on_z_axis_to_measurement_centroid_z = merged_quantiles(results, 'uwb_distances_on_axes_to_measurement_centroid', [0.5], AXIS_COUNT, relative_accuracy)[0]
     
     # Filtered
-    filtered_mean_distance_on_x_axis_to_measurement_centroid_x = mean(filtered_distances_on_x_axis_to_measurement_centroid_x)
-    filtered_median_distance_on_x_axis_to_measurement_centroid_x = median(filtered_distances_on_x_axis_to_measurement_centroid_x)
-    filtered_std_of_distances_on_x_axis_to_measurement_centroid_x = standard_deviation(filtered_distances_on_x_axis_to_measurement_centroid_x)
-    filtered_mean_distance_on_y_axis_to_measurement_centroid_y = mean(filtered_distances_on_y_axis_to_measurement_centroid_y)
-    filtered_median_distance_on_y_axis_to_measurement_centroid_y = median(filtered_distances_on_y_axis_to_measurement_centroid_y)
-    filtered_std_of_distances_on_y_axis_to_measurement_centroid_y = standard_deviation(filtered_distances_on_y_axis_to_measurement_centroid_y)
-    filtered_mean_distance_on_z_axis_to_measurement_centroid_z = mean(filtered_distances_on_z_axis_to_measurement_centroid_z)
-    filtered_median_distance_on_z_axis_to_measurement_centroid_z = median(filtered_distances_on_z_axis_to_measurement_centroid_z)
-    filtered_std_of_distances_on_z_axis_to_measurement_centroid_z = standard_deviation(filtered_distances_on_z_axis_to_measurement_centroid_z)
+    (filtered_mean_distance_on_x_axis_to_measurement_centroid_x, filtered_mean_distance_on_y_axis_to_measurement_centroid_y, filtered_mean_distance_on_z_axis_to_measurement_centroid_z), (filtered_std_of_distances_on_x_axis_to_measurement_centroid_x, filtered_std_of_distances_on_y_axis_to_measurement_centroid_y, filtered_std_of_distances_on_z_axis_to_measurement_centroid_z) = axis_means_and_standard_deviations(results, 'filtered_distances_on_axes_to_measurement_centroid')
+    filtered_median_distance_on_x_axis_to_measurement_centroid_x, filtered_median_distance_on_y_axis_to_measurement_centroid_y, filtered_median_distance_on_z_axis_to_measurement_centroid_z = merged_quantiles(results, 'filtered_distances_on_axes_to_measurement_centroid', [0.5], AXIS_COUNT, relative_accuracy)[0]
 
     # Final jitter evaluation
     # UWB
@@ -462,6 +326,13 @@ def evaluate_and_plot_data(directory):
     filtered_median_delta_distance_3D = median(filtered_mean_delta_distances_3D)
     filtered_std_of_delta_distances_3D = standard_deviation(filtered_mean_delta_distances_3D)
 
+    # Final percentile evaluation of the distances of all measurements to their reference positions
+    uwb_percentiles_of_distances_to_reference_point_2D, uwb_percentiles_of_distances_to_reference_point_3D = zip(*merged_quantiles(results, 'uwb_distances_to_reference_point', REPORTED_QUANTILES, len(REFERENCE_DISTANCE_DIMENSIONS), relative_accuracy))
+    filtered_percentiles_of_distances_to_reference_point_2D, filtered_percentiles_of_distances_to_reference_point_3D = zip(*merged_quantiles(results, 'filtered_distances_to_reference_point', REPORTED_QUANTILES, len(REFERENCE_DISTANCE_DIMENSIONS), relative_accuracy))
+
+    # Final filter consistency evaluation of the innovations of all files
+    consistency = merged_consistency_statistics(results) if results and all(has_consistency_sums(result) for result in results) else None
+
     print('')
     print("ACCURACY RESULTS")
     print("Mean | Median | Std raw distances to reference position 2D: {:.3f} | {:.3f} | {:.3f}m".format(uwb_mean_distance_to_reference_point_2D, uwb_median_distance_to_reference_point_2D, uwb_mean_std_of_distances_to_reference_point_2D))
@@ -494,12 +365,27 @@ def evaluate_and_plot_data(directory):
     print("Mean | RMS | Median | Std raw delta distances 3D: {:.3f} | {:.3f} | {:.3f} | {:.3f}m".format(uwb_mean_mean_delta_distance_3D, uwb_mean_rms_delta_distance_3D, uwb_median_delta_distance_3D, uwb_std_of_delta_distances_3D))
     print("Mean | RMS | Median | Std filtered delta distances 2D: {:.3f} | {:.3f} | {:.3f} | {:.3f}m".format(filtered_mean_mean_delta_distance_2D, filtered_mean_rms_delta_distance_2D, filtered_median_delta_distance_2D, filtered_std_of_delta_distances_2D))
     print("Mean | RMS | Median | Std filtered delta distances 3D: {:.3f} | {:.3f} | {:.3f} | {:.3f}m".format(filtered_mean_mean_delta_distance_3D, filtered_mean_rms_delta_distance_3D, filtered_median_delta_distance_3D, filtered_std_of_delta_distances_3D))
+
+    if consistency is not None:
+        print('\n')
+        print("CONSISTENCY RESULTS (replayed Kalman filter, windows of {} updates)".format(DEFAULT_WINDOW_SIZE))
+        print("Mean NIS X | Y | Z | All: {:.2f} | {:.2f} | {:.2f} | {:.2f} (consistent: {} | {} | {} | {})".format(*consistency['mean_nis'], *NIS_DEGREES_OF_FREEDOM))
+        print("Windows within the 95% interval X | Y | Z | All: {:.1%} | {:.1%} | {:.1%} | {:.1%}".format(*consistency['consistent_window_rate']))
+        print("Windows below | above the interval All: {:.1%} | {:.1%}".format(consistency['window_below_rate'][-1], consistency['window_above_rate'][-1]))
+        print("Lag 1 innovation autocorrelation X | Y | Z: {:.3f} | {:.3f} | {:.3f} (insignificant below {:.3f})".format(*consistency['innovation_autocorrelation'][0], consistency['autocorrelation_bound']))
+
+    print('\n')
+    print("PERCENTILE RESULTS (within {:g}% of the exact values)".format(relative_accuracy * 100))
+    print("Median | P90 | P95 | P99 raw distances to reference position 2D: {:.3f} | {:.3f} | {:.3f} | {:.3f}m".format(*uwb_percentiles_of_distances_to_reference_point_2D))
+    print("Median | P90 | P95 | P99 raw distances to reference position 3D: {:.3f} | {:.3f} | {:.3f} | {:.3f}m".format(*uwb_percentiles_of_distances_to_reference_point_3D))
+    print("Median | P90 | P95 | P99 filtered distances to reference position 2D: {:.3f} | {:.3f} | {:.3f} | {:.3f}m".format(*filtered_percentiles_of_distances_to_reference_point_2D))
+    print("Median | P90 | P95 | P99 filtered distances to reference position 3D: {:.3f} | {:.3f} | {:.3f} | {:.3f}m".format(*filtered_percentiles_of_distances_to_reference_point_3D))
     print('')
     print("All values in meter units")
     print('')
     
     plot_coordinates(reference_positions, uwb_mean_positions, filtered_mean_positions)
-    plot_heat_maps(uwb_positions_dictionary, filtered_positions_dictionary)
+    plot_heat_maps(unique_reference_positions, uwb_mean_positions, filtered_mean_positions)
 
 def plot_coordinates(reference_positions, uwb_positions, filtered_positions):
     fig = plt.figure("2D and 3D visualization", figsize=(23, 9))
@@ -508,21 +394,19 @@ def plot_coordinates(reference_positions, uwb_positions, filtered_positions):
     plt.title("Positions accuracy visualization")
     plot_2d_cartesian(reference_positions, uwb_positions, filtered_positions, ax0)
     plot_3d(reference_positions, uwb_positions, filtered_positions, ax1)
-    plt.show()
+    show_figures('positions')
 
 def plot_2d_cartesian(reference_positions, uwb_positions, filtered_positions, axs):
     axs.set_title("2D Plot of reference positions, raw positions and filtered positions")
     axs.set_xlabel('X')
     axs.set_ylabel('Y')
-    # Plot 2D reference positions
-    for x, y, z in reference_positions:
-        axs.scatter(x, y, label='Reference positions', c='g', marker='o')
+    reference_positions, uwb_positions, filtered_positions = array(reference_positions), array(uwb_positions), array(filtered_positions)
+    # Plot 2D reference positions, one collection per series
+    axs.scatter(reference_positions[:, 0], reference_positions[:, 1], label='Reference positions', c='g', marker='o')
     # Plot 2D raw UWB positions
-    for x, y, z in uwb_positions:
-        axs.scatter(x, y, label='Raw positions', c='b', marker='^')
+    axs.scatter(uwb_positions[:, 0], uwb_positions[:, 1], label='Raw positions', c='b', marker='^')
     # Plot 2D filtered positions
-    for x, y, z in filtered_positions:
-        axs.scatter(x, y, label='Filtered positions', c='r', marker='x')
+    axs.scatter(filtered_positions[:, 0], filtered_positions[:, 1], label='Filtered positions', c='r', marker='x')
     axs.grid(True)
     legend(axs)
 
@@ -531,15 +415,13 @@ def plot_3d(reference_positions, uwb_positions, filtered_positions, axs):
     axs.set_xlabel('X')
     axs.set_ylabel('Y')
     axs.set_zlabel('Z')
-    # Plot 3D reference_positions
-    for x, y, z in reference_positions:
-        axs.scatter(x, y, z, label='Reference positions', c='g', marker='o')
+    reference_positions, uwb_positions, filtered_positions = array(reference_positions), array(uwb_positions), array(filtered_positions)
+    # Plot 3D reference_positions, one collection per series
+    axs.scatter(reference_positions[:, 0], reference_positions[:, 1], reference_positions[:, 2], label='Reference positions', c='g', marker='o')
     # Plot 3D raw uwb positions
-    for x, y, z in uwb_positions:
-        axs.scatter(x, y, z, label="UWB positions", c='b', marker='^')
+    axs.scatter(uwb_positions[:, 0], uwb_positions[:, 1], uwb_positions[:, 2], label="UWB positions", c='b', marker='^')
     # Plot 3D filtered positions
-    for x, y, z in filtered_positions:
-        axs.scatter(x, y, z, label="Filtered positions", c='r', marker='x')
+    axs.scatter(filtered_positions[:, 0], filtered_positions[:, 1], filtered_positions[:, 2], label="Filtered positions", c='r', marker='x')
     legend(axs)
 
 # Plot a legend and remove duplicate legend elements
@@ -552,50 +434,14 @@ def legend(axs):
     # by_label = OrderedDict(zip(labels, handles))
     axs.legend(by_label.values(), by_label.keys())
 
-def plot_heat_maps(uwb_positions_dictionary, filtered_positions_dictionary):
-    uwb_data = []
-    filtered_data = []
-    for key, value in uwb_positions_dictionary.items():
-        x = float(key.split(',')[0])
-        y = float(key.split(',')[1])
-        heights = []
-        for position in value:
-            heights.append(position[2])
-        z = mean(heights)
-        uwb_data.append([x, y, z])
-    for key, value in filtered_positions_dictionary.items():
-        x = float(key.split(',')[0])
-        y = float(key.split(',')[1])
-        heights = []
-        for position in value:
-            heights.append(position[2])
-        z = mean(heights)
-        filtered_data.append([x, y, z])
-
-    # Add missing data
-    # Remove if you do not have any "holes" in your measurements
-    uwb_data.append([2.0, 3.0, nan])
-    uwb_data.append([3.0, 3.0, nan])
-    filtered_data.append([2.0, 3.0, nan])
-    filtered_data.append([3.0, 3.0, nan])
-
-    uwb_data = array(uwb_data)
-    filtered_data = array(filtered_data)
-    uwb_data = uwb_data[lexsort((uwb_data[:, 0], uwb_data[:, 1]))]
-    filtered_data = filtered_data[lexsort((filtered_data[:, 0], filtered_data[:, 1]))]
-    
-    uwb_z_values = []
-    filtered_z_values = []
-
-    for i in range(len(uwb_data)):
-        uwb_z_values.append(uwb_data[i][2])
-    for i in range(len(filtered_data)):
-        filtered_z_values.append(filtered_data[i][2])
-
-    uwb_z_values = array(uwb_z_values)
-    filtered_z_values = array(filtered_z_values)
-    uwb_z_data = ndarray(buffer=uwb_z_values, shape=(4, 3))
-    filtered_z_data = ndarray(buffer=filtered_z_values, shape=(4, 3))
+# Plots the mean height of each reference position in a grid spanned by the reference positions.
+# Grid cells without measurements are shown in black.
+def plot_heat_maps(reference_positions, uwb_mean_positions, filtered_mean_positions):
+    x_coordinates, y_coordinates, uwb_z_data = grid_of_reference_positions(reference_positions, uwb_mean_positions[:, 2])
+    _, _, filtered_z_data = grid_of_reference_positions(reference_positions, filtered_mean_positions[:, 2])
+    extent = (x_coordinates.min()-.5, x_coordinates.max()+.5, y_coordinates.min()-.5, y_coordinates.max()+.5)
+    cmap = plt.get_cmap('jet').copy()
+    cmap.set_bad(color='black')
 
     # Plot uwb and filtered z heat map
     fig = plt.figure("Height Map", figsize=(23, 9))
@@ -607,21 +453,41 @@ def plot_heat_maps(uwb_positions_dictionary, filtered_positions_dictionary):
     ax1.set_title("Filtered height map")
     ax1.set_xlabel('X')
     ax1.set_ylabel('Y')
-    a0 = ax0.imshow(uwb_z_data, interpolation='None', origin='lower', cmap='jet', extent=(uwb_data.min(axis=0)[0]-.5 , uwb_data.max(axis=0)[0]+.5, uwb_data.min(axis=0)[1]-.5, uwb_data.max(axis=0)[1]+.5))
-    a1 = ax1.imshow(filtered_z_data, interpolation='None', origin='lower', cmap='jet', extent=(filtered_data.min(axis=0)[0]-.5 , filtered_data.max(axis=0)[0]+.5, filtered_data.min(axis=0)[1]-.5, filtered_data.max(axis=0)[1]+.5))
+    a0 = ax0.imshow(uwb_z_data, interpolation='None', origin='lower', cmap=cmap, extent=extent)
+    a1 = ax1.imshow(filtered_z_data, interpolation='None', origin='lower', cmap=cmap, extent=extent)
     a0_colorbar = fig.colorbar(a0, ax=ax0)
     a0_colorbar.ax.set_title("Z", size=18)
     a1_colorbar = fig.colorbar(a1, ax=ax1)
     a1_colorbar.ax.set_title("Z", size=18)
-    current_cmap = cm.get_cmap()
-    current_cmap.set_bad(color='black')
-    plt.show()
+    show_figures('height_maps')
 
 if __name__ == "__main__":
-    try:
-        directory = sys.argv[1]
-    except IndexError:
+    parser = argparse.ArgumentParser(description="Evaluates accuracy, precision and jitter of all stationary measurements in a directory.")
+    parser.add_argument('directory', nargs='?', help="Directory holding the .txt measurements")
+    parser.add_argument('--shard', type=parse_shard, help="Only evaluate shard INDEX of COUNT shards of the directory's files, given as INDEX/COUNT, e.g. 0/4")
+    parser.add_argument('--partial-output', help="Write the per-file results as a partial aggregate to this file instead of reporting them, see --merge")
+    parser.add_argument('--merge', nargs='+', metavar='PARTIAL_AGGREGATE', help="Report and plot the merged partial aggregates of all shards instead of evaluating a directory")
+    parser.add_argument('--jobs', type=int, default=1, help="Number of processes evaluating files in parallel (default: %(default)s)")
+    parser.add_argument('--no-summaries', action='store_true', help="Evaluate all files again instead of reusing the per-file summaries persisted in the directory's '.summaries' folder")
+    parser.add_argument('--output-dir', help="Render headless and save all figures into this directory instead of showing them")
+    parser.add_argument('--output-format', default=','.join(DEFAULT_OUTPUT_FORMATS), help="Comma separated formats of saved figures, png and/or svg (default: %(default)s)")
+    parser.add_argument('--cache-dir', help="Cache parsed measurements as .npy files in this directory and reuse them on later runs")
+    parser.add_argument('--quantile-accuracy', type=float, default=DEFAULT_RELATIVE_ACCURACY, help="Relative accuracy of medians and percentiles, which are taken from mergeable quantile sketches of this accuracy (default: %(default)s)")
+    parser.add_argument('--consistency', action='store_true', help="Also replay the app's Kalman filter over all files and report the consistency of its innovations, see filter_consistency.py")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024), help="Size cap of the cache in MB, least recently used entries are evicted first (default: %(default)s)")
+    args = parser.parse_args()
+    if args.directory is None and args.merge is None:
         print_no_document_found_error()
         exit(1)
-
-    evaluate_and_plot_data(directory)
+    if args.output_dir is not None:
+        enable_headless_output(args.output_dir, parse_output_formats(args.output_format))
+
+    if args.merge is not None:
+        merge_and_plot_data(args.merge)
+    elif args.partial_output is not None:
+        paths, reference_positions, results = evaluate_directory(args.directory, args.jobs, args.cache_dir, args.cache_size * 1024 * 1024, not args.no_summaries, args.quantile_accuracy, args.shard, args.consistency)
+        save_partial_aggregate(args.partial_output, paths, reference_positions, results)
+        print("Wrote partial aggregate of {} files to {}".format(len(paths), args.partial_output))
+    else:
+        # Without --partial-output a shard is reported on its own
+        evaluate_and_plot_data(args.directory, args.jobs, args.cache_dir, args.cache_size * 1024 * 1024, not args.no_summaries, args.quantile_accuracy, args.shard, args.consistency)
@@ -1,7 +1,14 @@
 import matplotlib.pyplot as plt
+import os
 import sys
-from math import pow
-from numpy import arctan2, linspace, mean, pi, std, sqrt, square
+from numpy import arctan2, array, linspace, pi, sqrt
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'helper_scripts'))
+from figure_output import parse_output_arguments, show_figures
+from kalman_filter import smooth_recording
+from plot_decimation import plot_decimated
+from position_metrics import position_metrics, running_position_metrics
+from recording_loader import DEFAULT_CHUNK_SIZE, FILTERED_POSITION, UWB_POSITION, iterate_recording, load_recording, split_recording
 
 """
 This script evaluates and prints the accuracy of given position estimations in a .txt document.
@@ -9,272 +16,171 @@ The document must have been created by the related LocationApp for Android in or
 """
 
 quiver_directions = {'N': [0, 1], 'E': [1, 0], 'S': [0, -1], 'W': [-1, 0]}
+# Option adding the metrics of an offline Rauch-Tung-Striebel smoother (see kalman_filter.smooth_recording()) to the results
+SMOOTHED_OPTION = '--smoothed'
 
 def print_no_document_found_error():
     print("ERROR: No .txt document found.")
     print("Please add a .txt document as first argument when calling this script.")
     print("Note that this document has had to be created by the related \"LocationApp\" for Android.")
-    print("Usage: python3 measurements_evaluation.py <your_doc.txt>")
+    print("Usage: python3 measurements_evaluation.py <your_doc.txt or -> [--reference <x>,<y>,<z> --direction <N|E|S|W>] [--stream [--chunk-size <samples>] | --smoothed]")
     print("Exiting")
 
-# Returns the amount of samples collected
-def get_sample_count(filename):
-    with open(filename) as f:
-        for i, l in enumerate(f):
-            pass
-    return i + 1
-
-def distance_between_two_points2D(measurement_point, reference_point):
-    if reference_point == None:
-        return
-    return sqrt(pow(measurement_point[0] - reference_point[0], 2) + pow(measurement_point[1] - reference_point[1], 2))
-
-def distance_between_two_points3D(measurement_point, reference_point):
-    if reference_point == None:
-        return
-    return sqrt(pow(measurement_point[0] - reference_point[0], 2) + pow(measurement_point[1] - reference_point[1], 2) + pow(measurement_point[2] - reference_point[2], 2))
-
-# Calculates the distance between consecutive positions in a list. The parameter fun must be either distance_between_two_points_2D or distance_between_two_points_3D. The parameter points must be a list that stores positions in a form of [x, y, z].
-def delta_distances(fun, points):
-    return list(map(fun, points, points[1:]))[:len(points)-1]
-
-def standard_deviation(samples):
-    return std(samples)
-
-def root_mean_square(data):
-    return sqrt(mean(square(data)))
+# Removes the streaming options from argv and returns the chunk size to stream with or None if streaming is disabled.
+# With --stream the recording is read in chunks instead of at once, so recordings larger than the memory can be evaluated.
+def parse_stream_arguments(argv=sys.argv):
+    chunk_size = None
+    if '--stream' in argv:
+        argv.remove('--stream')
+        chunk_size = DEFAULT_CHUNK_SIZE
+    if '--chunk-size' in argv:
+        index = argv.index('--chunk-size')
+        chunk_size = int(argv[index + 1])
+        del argv[index:index + 2]
+    return chunk_size
+
+# Removes the reference options from argv and returns the direction and reference point they give, each None if not
+# given. They are needed for documents whose name does not hold them, e.g. '-' for stdin.
+def parse_reference_arguments(argv=sys.argv):
+    direction = reference_point = None
+    if '--direction' in argv:
+        index = argv.index('--direction')
+        direction = argv[index + 1]
+        del argv[index:index + 2]
+    if '--reference' in argv:
+        index = argv.index('--reference')
+        reference_point = [float(value) for value in argv[index + 1].split(',')]
+        del argv[index:index + 2]
+    return direction, reference_point
+
+# Returns the direction and reference point held by a filename like 'N(1_2_1,73)_15-10-2020-19-17-32.txt' or None, None
+def parse_filename_reference(filename):
+    name = os.path.basename(filename)
+    try:
+        direction = name.split('(')[0]
+        x_reference = float((name.split('(')[1].split(')')[0].split('_')[0]).replace(',', '.'))
+        y_reference = float((name.split('(')[1].split(')')[0].split('_')[1]).replace(',', '.'))
+        z_reference = float((name.split('(')[1].split(')')[0].split('_')[2]).replace(',', '.'))
+    except (IndexError, ValueError):
+        return None, None
+    return direction, [x_reference, y_reference, z_reference]
 
 def cart2pol(x, y):
     rho = sqrt(x**2 + y**2)
     phi = arctan2(y, x)
     return(rho, phi)
 
-def evaluate_data(filename, reference_point):
-    ''' Local variables '''
-    # Variables making up the mean coordinate
-    uwb_x_mean = 0.0
-    uwb_y_mean = 0.0
-    uwb_z_mean = 0.0
-    filtered_x_mean = 0.0
-    filtered_y_mean = 0.0
-    filtered_z_mean = 0.0
-
-    # Lists holding all coordinates on axis
-    uwb_x_coords = []
-    uwb_y_coords = []
-    uwb_z_coords = []
-    filtered_x_coords = []
-    filtered_y_coords = []
-    filtered_z_coords = []
-    raw_x_accs = []
-    raw_y_accs = []
-    raw_z_accs = []
-    filtered_x_accs = []
-    filtered_y_accs = []
-    filtered_z_accs = []
-
-    # List holding all sample points
-    uwb_points = []
-    filtered_points = []
-
-    # Lists holding distances on each axis of a sample to reference point
-    uwb_distances_x = []
-    uwb_distances_y = []
-    uwb_distances_z = []
-    filtered_distances_x = []
-    filtered_distances_y = []
-    filtered_distances_z = []
-
-    # Lists holding all distances from sample points to reference point
-    uwb_distances_to_ref_point_2D = []
-    uwb_distances_to_ref_point_3D = []
-    filtered_distances_to_ref_point_2D = []
-    filtered_distances_to_ref_point_3D = []
-
-    # Lists holding all distances from sample points to mean point
-    uwb_distances_to_samples_center_point_2D = []
-    uwb_distances_to_samples_center_point_3D = []
-    filtered_distances_to_samples_center_point_2D = []
-    filtered_distances_to_samples_center_point_3D = []
-
-    # Experimental
-    # Lists holding all distance differences from positions to their next one
-    uwb_delta_distances_2D = []
-    uwb_delta_distances_3D = []
-    filtered_delta_distances_2D = []
-    filtered_delta_distances_3D = []
-
-    ''' Go! '''
-    # Get amount of samples collected
-    sample_count = get_sample_count(filename)
-
-    # Go through samples
-    with open(filename) as file:
-        for line in file:
-            uwb_position = line.split('|')[0]
-            filtered_position = line.split('|')[1]
-            raw_acceleration = line.split('|')[2]
-            filtered_acceleration = line.split('|')[3]
-
-            # Extract x, y and z coordinates out of each line
-            uwb_x = float(uwb_position.split(',')[0])
-            uwb_y = float(uwb_position.split(',')[1])
-            uwb_z = float(uwb_position.split(',')[2])
-
-            filtered_x = float(filtered_position.split(',')[0])
-            filtered_y = float(filtered_position.split(',')[1])
-            filtered_z = float(filtered_position.split(',')[2])
-
-            raw_acceleration_x = float(raw_acceleration.split(',')[0])
-            raw_acceleration_y = float(raw_acceleration.split(',')[1])
-            raw_acceleration_z = float(raw_acceleration.split(',')[2])
-
-            filtered_acceleration_x = float(filtered_acceleration.split(',')[0])
-            filtered_acceleration_y = float(filtered_acceleration.split(',')[1])
-            filtered_acceleration_z = float(filtered_acceleration.split(',')[2])
-
-            # Add individual coordinates to coord's means
-            uwb_x_mean += uwb_x
-            uwb_y_mean += uwb_y
-            uwb_z_mean += uwb_z
-            filtered_x_mean += filtered_x
-            filtered_y_mean += filtered_y
-            filtered_z_mean += filtered_z
-
-            # Add individual coordinates and accelerations to lists
-            uwb_x_coords.append(uwb_x)
-            uwb_y_coords.append(uwb_y)
-            uwb_z_coords.append(uwb_z)
-            filtered_x_coords.append(filtered_x)
-            filtered_y_coords.append(filtered_y)
-            filtered_z_coords.append(filtered_z)
-            raw_x_accs.append(raw_acceleration_x)
-            raw_y_accs.append(raw_acceleration_y)
-            raw_z_accs.append(raw_acceleration_z)
-            filtered_x_accs.append(filtered_acceleration_x)
-            filtered_y_accs.append(filtered_acceleration_y)
-            filtered_z_accs.append(filtered_acceleration_z)
-
-            # Calculate distances on each axis
-            uwb_axis_distance_x = uwb_x - reference_point[0]
-            uwb_axis_distance_y = uwb_y - reference_point[1]
-            uwb_axis_distance_z = uwb_z - reference_point[2]
-            uwb_distances_x.append(uwb_axis_distance_x)
-            uwb_distances_y.append(uwb_axis_distance_y)
-            uwb_distances_z.append(uwb_axis_distance_z)
-            filtered_axis_distance_x = filtered_x - reference_point[0]
-            filtered_axis_distance_y = filtered_y - reference_point[1]
-            filtered_axis_distance_z = filtered_z - reference_point[2]
-            filtered_distances_x.append(filtered_axis_distance_x)
-            filtered_distances_y.append(filtered_axis_distance_y)
-            filtered_distances_z.append(filtered_axis_distance_z)
-
-            # Make up coordinates and accelerations and add to list
-            uwb_sample_point = [uwb_x, uwb_y, uwb_z]
-            uwb_points.append(uwb_sample_point)
-            filtered_sample_point = [filtered_x, filtered_y, filtered_z]
-            filtered_points.append(filtered_sample_point)
-
-            # Calculate distance of sample point to reference point in 2D and 3D and add to distances lists
-            uwb_distance_to_ref_point_2D = distance_between_two_points2D(uwb_sample_point, reference_point)
-            uwb_distances_to_ref_point_2D.append(uwb_distance_to_ref_point_2D)
-            uwb_distance_to_ref_point_3D = distance_between_two_points3D(uwb_sample_point, reference_point)
-            uwb_distances_to_ref_point_3D.append(uwb_distance_to_ref_point_3D)
-            filtered_distance_to_ref_point_2D = distance_between_two_points2D(filtered_sample_point, reference_point)
-            filtered_distances_to_ref_point_2D.append(filtered_distance_to_ref_point_2D)
-            filtered_distance_to_ref_point_3D = distance_between_two_points3D(filtered_sample_point, reference_point)
-            filtered_distances_to_ref_point_3D.append(filtered_distance_to_ref_point_3D)
+def evaluate_data(filename, reference_point, chunk_size=None, smoothed=False):
+    smoothed_metrics = None
+    if chunk_size is None:
+        # Load all samples in one pass, filename may also be an opened file or '-' for stdin
+        data = load_recording(filename)
+        uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations = split_recording(data)
+
+        # Get amount of samples collected
+        sample_count = len(uwb_positions)
+
+        # Individual coordinates and accelerations on each axis
+        uwb_x_coords, uwb_y_coords, uwb_z_coords = uwb_positions.T.tolist()
+        filtered_x_coords, filtered_y_coords, filtered_z_coords = filtered_positions.T.tolist()
+        raw_x_accs, raw_y_accs, raw_z_accs = raw_accelerations.T.tolist()
+        filtered_x_accs, filtered_y_accs, filtered_z_accs = filtered_accelerations.T.tolist()
+
+        # Lists holding all sample points
+        uwb_points = uwb_positions.tolist()
+        filtered_points = filtered_positions.tolist()
+
+        # Accuracy, precision and jitter metrics of both position series
+        uwb_metrics = position_metrics(uwb_positions, reference_point)
+        filtered_metrics = position_metrics(filtered_positions, reference_point)
+        # Metrics of the positions smoothed offline with all samples, before and after each of them
+        if smoothed:
+            smoothed_metrics = position_metrics(smooth_recording(data)[0], reference_point)
+    else:
+        # Streaming mode: read the recording twice in chunks of chunk_size samples and only keep running statistics.
+        # No samples are kept, so there is nothing to plot.
+        uwb_x_coords = uwb_y_coords = uwb_z_coords = filtered_x_coords = filtered_y_coords = filtered_z_coords = None
+        raw_x_accs = raw_y_accs = raw_z_accs = filtered_x_accs = filtered_y_accs = filtered_z_accs = None
+        uwb_points = filtered_points = None
+
+        get_chunks = lambda: (chunk[:, UWB_POSITION:FILTERED_POSITION + 1] for chunk in iterate_recording(filename, chunk_size))
+        uwb_metrics, filtered_metrics = running_position_metrics(get_chunks, reference_point)
+        sample_count = uwb_metrics['count']
 
     '''#############################################################
     #################### ACCURACY EVALUATION ####################
     #############################################################'''
-    # Calculate average, min and max distance of samples to reference point
-    uwb_mean_distance_to_ref_point_2D = mean(uwb_distances_to_ref_point_2D)
-    uwb_rms_distance_to_ref_point_2D = root_mean_square(uwb_distances_to_ref_point_2D)
-    uwb_max_distance_to_ref_point_2D = max(uwb_distances_to_ref_point_2D)
-    uwb_std_2D_distances_to_ref_point = standard_deviation(uwb_distances_to_ref_point_2D)
-    uwb_mean_distance_to_ref_point_3D = mean(uwb_distances_to_ref_point_3D)
-    uwb_rms_distance_to_ref_point_3D = root_mean_square(uwb_distances_to_ref_point_3D)
-    uwb_max_distance_to_ref_point_3D = max(uwb_distances_to_ref_point_3D)
-    uwb_std_3D_distances_to_ref_point = standard_deviation(uwb_distances_to_ref_point_3D)
-
-    filtered_mean_distance_to_ref_point_2D = mean(filtered_distances_to_ref_point_2D)
-    filtered_rms_distance_to_ref_point_2D = root_mean_square(filtered_distances_to_ref_point_2D)
-    filtered_max_distance_to_ref_point_2D = max(filtered_distances_to_ref_point_2D)
-    filtered_std_2D_distances_to_ref_point = standard_deviation(filtered_distances_to_ref_point_2D)
-    filtered_mean_distance_to_ref_point_3D = mean(filtered_distances_to_ref_point_3D)
-    filtered_rms_distance_to_ref_point_3D = root_mean_square(filtered_distances_to_ref_point_3D)
-    filtered_max_distance_to_ref_point_3D = max(filtered_distances_to_ref_point_3D)
-    filtered_std_3D_distances_to_ref_point = standard_deviation(filtered_distances_to_ref_point_3D)
+    # Average, rms, max and std distance of samples to reference point
+    uwb_mean_distance_to_ref_point_2D = uwb_metrics['mean_distance_to_reference_2D']
+    uwb_rms_distance_to_ref_point_2D = uwb_metrics['rms_distance_to_reference_2D']
+    uwb_max_distance_to_ref_point_2D = uwb_metrics['max_distance_to_reference_2D']
+    uwb_std_2D_distances_to_ref_point = uwb_metrics['std_distance_to_reference_2D']
+    uwb_mean_distance_to_ref_point_3D = uwb_metrics['mean_distance_to_reference_3D']
+    uwb_rms_distance_to_ref_point_3D = uwb_metrics['rms_distance_to_reference_3D']
+    uwb_max_distance_to_ref_point_3D = uwb_metrics['max_distance_to_reference_3D']
+    uwb_std_3D_distances_to_ref_point = uwb_metrics['std_distance_to_reference_3D']
+
+    filtered_mean_distance_to_ref_point_2D = filtered_metrics['mean_distance_to_reference_2D']
+    filtered_rms_distance_to_ref_point_2D = filtered_metrics['rms_distance_to_reference_2D']
+    filtered_max_distance_to_ref_point_2D = filtered_metrics['max_distance_to_reference_2D']
+    filtered_std_2D_distances_to_ref_point = filtered_metrics['std_distance_to_reference_2D']
+    filtered_mean_distance_to_ref_point_3D = filtered_metrics['mean_distance_to_reference_3D']
+    filtered_rms_distance_to_ref_point_3D = filtered_metrics['rms_distance_to_reference_3D']
+    filtered_max_distance_to_ref_point_3D = filtered_metrics['max_distance_to_reference_3D']
+    filtered_std_3D_distances_to_ref_point = filtered_metrics['std_distance_to_reference_3D']
 
     '''#############################################################
     #################### PRECISION EVALUATION ###################
     #############################################################'''
-    # Get measurement centroid coordinates
-    uwb_x_mean /= sample_count
-    uwb_y_mean /= sample_count
-    uwb_z_mean /= sample_count
-    uwb_mean_point = [uwb_x_mean, uwb_y_mean, uwb_z_mean]
-    filtered_x_mean /= sample_count
-    filtered_y_mean /= sample_count
-    filtered_z_mean /= sample_count
-    filtered_mean_point = [filtered_x_mean, filtered_y_mean, filtered_z_mean]
-
-    # Calculate distance of each sample point to measurement centroid point
-    for uwb_sample_point in uwb_points:
-        uwb_distance_to_sample_center_point_2D = distance_between_two_points2D(uwb_sample_point, uwb_mean_point)
-        uwb_distances_to_samples_center_point_2D.append(uwb_distance_to_sample_center_point_2D)
-        uwb_distance_to_sample_center_point_3D = distance_between_two_points3D(uwb_sample_point, uwb_mean_point)
-        uwb_distances_to_samples_center_point_3D.append(uwb_distance_to_sample_center_point_3D)
-    for filtered_sample_point in filtered_points:
-        filtered_distance_to_sample_center_point_2D = distance_between_two_points2D(filtered_sample_point, filtered_mean_point)
-        filtered_distances_to_samples_center_point_2D.append(filtered_distance_to_sample_center_point_2D)
-        filtered_distance_to_sample_center_point_3D = distance_between_two_points3D(filtered_sample_point, filtered_mean_point)
-        filtered_distances_to_samples_center_point_3D.append(filtered_distance_to_sample_center_point_3D)
-
-    # Calculate mean, rms, max and std distance of samples to samples center point
-    uwb_mean_distance_to_samples_center_point_2D = mean(uwb_distances_to_samples_center_point_2D)
-    uwb_rms_distance_to_samples_center_point_2D = root_mean_square(uwb_distances_to_samples_center_point_2D)
-    uwb_max_distance_to_samples_center_point_2D = max(uwb_distances_to_samples_center_point_2D)
-    uwb_std_2D_distances_to_samples_center_point = standard_deviation(uwb_distances_to_samples_center_point_2D)
-    uwb_mean_distance_to_samples_center_point_3D = mean(uwb_distances_to_samples_center_point_3D)
-    uwb_rms_distance_to_samples_center_point_3D = root_mean_square(uwb_distances_to_samples_center_point_3D)
-    uwb_max_distance_to_samples_center_point_3D = max(uwb_distances_to_samples_center_point_3D)
-    uwb_std_3D_distances_to_samples_center_point = standard_deviation(uwb_distances_to_samples_center_point_3D)
-
-    filtered_mean_distance_to_samples_center_point_2D = mean(filtered_distances_to_samples_center_point_2D)
-    filtered_rms_distance_to_samples_center_point_2D = root_mean_square(filtered_distances_to_samples_center_point_2D)
-    filtered_max_distance_to_samples_center_point_2D = max(filtered_distances_to_samples_center_point_2D)
-    filtered_std_2D_distances_to_samples_center_point = standard_deviation(filtered_distances_to_samples_center_point_2D)
-    filtered_mean_distance_to_samples_center_point_3D = mean(filtered_distances_to_samples_center_point_3D)
-    filtered_rms_distance_to_samples_center_point_3D = root_mean_square(filtered_distances_to_samples_center_point_3D)
-    filtered_max_distance_to_samples_center_point_3D = max(filtered_distances_to_samples_center_point_3D)
-    filtered_std_3D_distances_to_samples_center_point = standard_deviation(filtered_distances_to_samples_center_point_3D)
+    # Measurement centroid coordinates
+    uwb_mean_point = uwb_metrics['centroid'].tolist()
+    uwb_x_mean, uwb_y_mean, uwb_z_mean = uwb_mean_point
+    filtered_mean_point = filtered_metrics['centroid'].tolist()
+    filtered_x_mean, filtered_y_mean, filtered_z_mean = filtered_mean_point
+
+    # Mean, rms, max and std distance of samples to samples center point
+    uwb_mean_distance_to_samples_center_point_2D = uwb_metrics['mean_distance_to_centroid_2D']
+    uwb_rms_distance_to_samples_center_point_2D = uwb_metrics['rms_distance_to_centroid_2D']
+    uwb_max_distance_to_samples_center_point_2D = uwb_metrics['max_distance_to_centroid_2D']
+    uwb_std_2D_distances_to_samples_center_point = uwb_metrics['std_distance_to_centroid_2D']
+    uwb_mean_distance_to_samples_center_point_3D = uwb_metrics['mean_distance_to_centroid_3D']
+    uwb_rms_distance_to_samples_center_point_3D = uwb_metrics['rms_distance_to_centroid_3D']
+    uwb_max_distance_to_samples_center_point_3D = uwb_metrics['max_distance_to_centroid_3D']
+    uwb_std_3D_distances_to_samples_center_point = uwb_metrics['std_distance_to_centroid_3D']
+
+    filtered_mean_distance_to_samples_center_point_2D = filtered_metrics['mean_distance_to_centroid_2D']
+    filtered_rms_distance_to_samples_center_point_2D = filtered_metrics['rms_distance_to_centroid_2D']
+    filtered_max_distance_to_samples_center_point_2D = filtered_metrics['max_distance_to_centroid_2D']
+    filtered_std_2D_distances_to_samples_center_point = filtered_metrics['std_distance_to_centroid_2D']
+    filtered_mean_distance_to_samples_center_point_3D = filtered_metrics['mean_distance_to_centroid_3D']
+    filtered_rms_distance_to_samples_center_point_3D = filtered_metrics['rms_distance_to_centroid_3D']
+    filtered_max_distance_to_samples_center_point_3D = filtered_metrics['max_distance_to_centroid_3D']
+    filtered_std_3D_distances_to_samples_center_point = filtered_metrics['std_distance_to_centroid_3D']
 
     '''###################################################################
     #################### JITTER EVALUATION ###################
     ###################################################################'''
-    # 2D Get mean, rms, max and std distance differences from measurements to their next ones
-    uwb_mean_delta_distance_2D = mean(delta_distances(distance_between_two_points2D, uwb_points))
-    uwb_rms_delta_distance_2D = root_mean_square(delta_distances(distance_between_two_points2D, uwb_points))
-    uwb_max_delta_distance_2D = max(delta_distances(distance_between_two_points2D, uwb_points))
-    uwb_std_delta_distance_2D = standard_deviation(delta_distances(distance_between_two_points2D, uwb_points))
-    filtered_mean_delta_distance_2D = mean(delta_distances(distance_between_two_points2D, filtered_points))
-    filtered_rms_delta_distance_2D = root_mean_square(delta_distances(distance_between_two_points2D, filtered_points))
-    filtered_max_delta_distance_2D = max(delta_distances(distance_between_two_points2D, filtered_points))
-    filtered_std_delta_distance_2D = standard_deviation(delta_distances(distance_between_two_points2D, filtered_points))
-
-    # 3D Get mean, rms, max and std distance differences from measurements to their next ones
-    uwb_mean_delta_distance_3D = mean(delta_distances(distance_between_two_points3D, uwb_points))
-    uwb_rms_delta_distance_3D = root_mean_square(delta_distances(distance_between_two_points3D, uwb_points))
-    uwb_max_delta_distance_3D = max(delta_distances(distance_between_two_points3D, uwb_points))
-    uwb_std_delta_distance_3D = standard_deviation(delta_distances(distance_between_two_points3D, uwb_points))
-    filtered_mean_delta_distance_3D = mean(delta_distances(distance_between_two_points3D, filtered_points))
-    filtered_rms_delta_distance_3D = root_mean_square(delta_distances(distance_between_two_points3D, filtered_points))
-    filtered_max_delta_distance_3D = max(delta_distances(distance_between_two_points3D, filtered_points))
-    filtered_std_delta_distance_3D = standard_deviation(delta_distances(distance_between_two_points3D, filtered_points))
-
-    return sample_count, uwb_x_mean, uwb_y_mean, uwb_z_mean, filtered_x_mean, filtered_y_mean, filtered_z_mean, uwb_mean_distance_to_ref_point_2D, uwb_mean_distance_to_ref_point_3D, uwb_rms_distance_to_ref_point_2D, uwb_rms_distance_to_ref_point_3D, uwb_max_distance_to_ref_point_2D, uwb_max_distance_to_ref_point_3D, filtered_mean_distance_to_ref_point_2D, filtered_mean_distance_to_ref_point_3D, filtered_rms_distance_to_ref_point_2D, filtered_rms_distance_to_ref_point_3D, filtered_max_distance_to_ref_point_2D, filtered_max_distance_to_ref_point_3D, uwb_std_2D_distances_to_ref_point, uwb_std_3D_distances_to_ref_point, filtered_std_2D_distances_to_ref_point, filtered_std_3D_distances_to_ref_point, uwb_mean_distance_to_samples_center_point_2D, uwb_mean_distance_to_samples_center_point_3D, uwb_rms_distance_to_samples_center_point_2D, uwb_rms_distance_to_samples_center_point_3D, uwb_max_distance_to_samples_center_point_2D, uwb_max_distance_to_samples_center_point_3D, uwb_std_2D_distances_to_samples_center_point, uwb_std_3D_distances_to_samples_center_point, filtered_mean_distance_to_samples_center_point_2D, filtered_mean_distance_to_samples_center_point_3D, filtered_rms_distance_to_samples_center_point_2D, filtered_rms_distance_to_samples_center_point_3D, filtered_max_distance_to_samples_center_point_2D, filtered_max_distance_to_samples_center_point_3D, filtered_std_2D_distances_to_samples_center_point, filtered_std_3D_distances_to_samples_center_point, uwb_mean_delta_distance_2D, uwb_mean_delta_distance_3D, uwb_rms_delta_distance_2D, uwb_rms_delta_distance_3D, uwb_max_delta_distance_2D, uwb_max_delta_distance_3D, uwb_std_delta_distance_2D, uwb_std_delta_distance_3D, filtered_mean_delta_distance_2D, filtered_mean_delta_distance_3D, filtered_rms_delta_distance_2D, filtered_rms_delta_distance_3D, filtered_max_delta_distance_2D, filtered_max_delta_distance_3D, filtered_std_delta_distance_2D, filtered_std_delta_distance_3D, uwb_x_coords, uwb_y_coords, uwb_z_coords, filtered_x_coords, filtered_y_coords, filtered_z_coords, uwb_points, filtered_points, uwb_x_mean, uwb_y_mean, uwb_z_mean, uwb_mean_point, filtered_x_mean, filtered_y_mean, filtered_z_mean, filtered_mean_point, raw_x_accs, raw_y_accs, raw_z_accs, filtered_x_accs, filtered_y_accs, filtered_z_accs
+    # 2D mean, rms, max and std distance differences from measurements to their next ones
+    uwb_mean_delta_distance_2D = uwb_metrics['mean_delta_distance_2D']
+    uwb_rms_delta_distance_2D = uwb_metrics['rms_delta_distance_2D']
+    uwb_max_delta_distance_2D = uwb_metrics['max_delta_distance_2D']
+    uwb_std_delta_distance_2D = uwb_metrics['std_delta_distance_2D']
+    filtered_mean_delta_distance_2D = filtered_metrics['mean_delta_distance_2D']
+    filtered_rms_delta_distance_2D = filtered_metrics['rms_delta_distance_2D']
+    filtered_max_delta_distance_2D = filtered_metrics['max_delta_distance_2D']
+    filtered_std_delta_distance_2D = filtered_metrics['std_delta_distance_2D']
+
+    # 3D mean, rms, max and std distance differences from measurements to their next ones
+    uwb_mean_delta_distance_3D = uwb_metrics['mean_delta_distance_3D']
+    uwb_rms_delta_distance_3D = uwb_metrics['rms_delta_distance_3D']
+    uwb_max_delta_distance_3D = uwb_metrics['max_delta_distance_3D']
+    uwb_std_delta_distance_3D = uwb_metrics['std_delta_distance_3D']
+    filtered_mean_delta_distance_3D = filtered_metrics['mean_delta_distance_3D']
+    filtered_rms_delta_distance_3D = filtered_metrics['rms_delta_distance_3D']
+    filtered_max_delta_distance_3D = filtered_metrics['max_delta_distance_3D']
+    filtered_std_delta_distance_3D = filtered_metrics['std_delta_distance_3D']
+
+    return sample_count, uwb_x_mean, uwb_y_mean, uwb_z_mean, filtered_x_mean, filtered_y_mean, filtered_z_mean, uwb_mean_distance_to_ref_point_2D, uwb_mean_distance_to_ref_point_3D, uwb_rms_distance_to_ref_point_2D, uwb_rms_distance_to_ref_point_3D, uwb_max_distance_to_ref_point_2D, uwb_max_distance_to_ref_point_3D, filtered_mean_distance_to_ref_point_2D, filtered_mean_distance_to_ref_point_3D, filtered_rms_distance_to_ref_point_2D, filtered_rms_distance_to_ref_point_3D, filtered_max_distance_to_ref_point_2D, filtered_max_distance_to_ref_point_3D, uwb_std_2D_distances_to_ref_point, uwb_std_3D_distances_to_ref_point, filtered_std_2D_distances_to_ref_point, filtered_std_3D_distances_to_ref_point, uwb_mean_distance_to_samples_center_point_2D, uwb_mean_distance_to_samples_center_point_3D, uwb_rms_distance_to_samples_center_point_2D, uwb_rms_distance_to_samples_center_point_3D, uwb_max_distance_to_samples_center_point_2D, uwb_max_distance_to_samples_center_point_3D, uwb_std_2D_distances_to_samples_center_point, uwb_std_3D_distances_to_samples_center_point, filtered_mean_distance_to_samples_center_point_2D, filtered_mean_distance_to_samples_center_point_3D, filtered_rms_distance_to_samples_center_point_2D, filtered_rms_distance_to_samples_center_point_3D, filtered_max_distance_to_samples_center_point_2D, filtered_max_distance_to_samples_center_point_3D, filtered_std_2D_distances_to_samples_center_point, filtered_std_3D_distances_to_samples_center_point, uwb_mean_delta_distance_2D, uwb_mean_delta_distance_3D, uwb_rms_delta_distance_2D, uwb_rms_delta_distance_3D, uwb_max_delta_distance_2D, uwb_max_delta_distance_3D, uwb_std_delta_distance_2D, uwb_std_delta_distance_3D, filtered_mean_delta_distance_2D, filtered_mean_delta_distance_3D, filtered_rms_delta_distance_2D, filtered_rms_delta_distance_3D, filtered_max_delta_distance_2D, filtered_max_delta_distance_3D, filtered_std_delta_distance_2D, filtered_std_delta_distance_3D, uwb_x_coords, uwb_y_coords, uwb_z_coords, filtered_x_coords, filtered_y_coords, filtered_z_coords, uwb_points, filtered_points, uwb_x_mean, uwb_y_mean, uwb_z_mean, uwb_mean_point, filtered_x_mean, filtered_y_mean, filtered_z_mean, filtered_mean_point, raw_x_accs, raw_y_accs, raw_z_accs, filtered_x_accs, filtered_y_accs, filtered_z_accs, smoothed_metrics
 
 def get_values(uwb_positions, filtered_positions, raw_accelerations, filtered_accelerations):
     uwb_x_coordinates = []
@@ -335,16 +241,15 @@ def plot_coordinates(direction, uwb_points, filtered_points, uwb_mean_point, fil
     #plot_2d_cartesian(uwb_points, filtered_points, uwb_mean_point, filtered_mean_point, reference_point, ax0)
     plot_2d_polar(uwb_points, filtered_points, uwb_mean_point, filtered_mean_point, reference_point, direction, ax1)
 
-    plt.show()
+    show_figures('polar_measurements')
 
 def plot_2d_cartesian(uwb_points, filtered_points, uwb_mean_point, filtered_mean_point, reference_point, axs):
     plt.xlabel = "X AXIS"
     plt.ylabel = "Y AXIS"
-    # Plot samples
-    for x, y, z in uwb_points:
-        axs.scatter(x, y, label='Raw Coordinates', c='b', marker='^')
-    for x, y, z in filtered_points:
-        axs.scatter(x, y, label='Filtered Coordinates', c='r', marker='x')
+    uwb_points, filtered_points = array(uwb_points), array(filtered_points)
+    # Plot samples, one collection per series
+    axs.scatter(uwb_points[:, 0], uwb_points[:, 1], label='Raw Coordinates', c='b', marker='^')
+    axs.scatter(filtered_points[:, 0], filtered_points[:, 1], label='Filtered Coordinates', c='r', marker='x')
     # Plot reference point
     axs.scatter(uwb_mean_point[0], uwb_mean_point[1], label='Raw Mean Coordinate', c='g', marker='^')
     axs.scatter(filtered_mean_point[0], filtered_mean_point[1], label='Filtered Mean Coordinate', c='g', marker='x')
@@ -356,13 +261,12 @@ def plot_2d_polar(uwb_points, filtered_points, uwb_mean_point, filtered_mean_poi
     d = quiver_directions[direction]
     axs.set_thetalim(0, pi * 2)
     axs.set_xticks(linspace(0, pi * 2, 4, endpoint=False))
-    # Plot samples
-    for x, y, z in uwb_points:
-        r, theta = cart2pol(x - reference_point[0], y - reference_point[1])
-        axs.scatter(theta, r, label='Raw Coordinates', c='b', marker='^')
-    for x, y, z in filtered_points:
-        r, theta = cart2pol(x - reference_point[0], y - reference_point[1])
-        axs.scatter(theta, r, label='Filtered Coordinates', c='r', marker='x')
+    uwb_points, filtered_points = array(uwb_points), array(filtered_points)
+    # Plot samples, one collection per series
+    r, theta = cart2pol(uwb_points[:, 0] - reference_point[0], uwb_points[:, 1] - reference_point[1])
+    axs.scatter(theta, r, label='Raw Coordinates', c='b', marker='^')
+    r, theta = cart2pol(filtered_points[:, 0] - reference_point[0], filtered_points[:, 1] - reference_point[1])
+    axs.scatter(theta, r, label='Filtered Coordinates', c='r', marker='x')
     # Plot reference point
     r, theta = cart2pol(uwb_mean_point[0] - reference_point[0], uwb_mean_point[1] - reference_point[1])
     axs.scatter(theta, r, label='Raw Mean Coordinate', c='g', marker='^')
@@ -389,8 +293,8 @@ def plot_line_charts(uwb_x_coords, uwb_y_coords, uwb_z_coords, filtered_x_coords
     # Plot coordinates
     ax1 = plt.subplot(311)
     ax1.set_title("Raw and filtered positions")
-    ax1.plot(range(sample_count), uwb_x_coords, label='Raw', c='b')
-    ax1.plot(range(sample_count), filtered_x_coords, label='Filtered', c='r')
+    plot_decimated(ax1, range(sample_count), uwb_x_coords, label='Raw', c='b')
+    plot_decimated(ax1, range(sample_count), filtered_x_coords, label='Filtered', c='r')
     ax1.axhline(uwb_x_mean, 0, 1, label='Raw Mean', c='b', linestyle='dashed')
     ax1.axhline(filtered_x_mean, 0, 1, label='Filtered Mean', c='r', linestyle='dashed')
     ax1.axhline(reference_point[0], 0, 1, label='Reference', c='g')
@@ -399,8 +303,8 @@ def plot_line_charts(uwb_x_coords, uwb_y_coords, uwb_z_coords, filtered_x_coords
     ax1.set_ylabel('X')
 
     ax2 = plt.subplot(312)
-    ax2.plot(range(sample_count), uwb_y_coords, label='Raw Y', c='b')
-    ax2.plot(range(sample_count), filtered_y_coords, label='Filtered Y', c='r')
+    plot_decimated(ax2, range(sample_count), uwb_y_coords, label='Raw Y', c='b')
+    plot_decimated(ax2, range(sample_count), filtered_y_coords, label='Filtered Y', c='r')
     ax2.axhline(uwb_y_mean, 0, 1, label='Raw Y Mean', c='b', linestyle='dashed')
     ax2.axhline(filtered_y_mean, 0, 1, label='Filtered Y Mean', c='r', linestyle='dashed')
     ax2.axhline(reference_point[1], 0, 1, label='User Y', c='g')
@@ -408,8 +312,8 @@ def plot_line_charts(uwb_x_coords, uwb_y_coords, uwb_z_coords, filtered_x_coords
     ax2.set_ylabel('Y')
 
     ax3 = plt.subplot(313)
-    ax3.plot(range(sample_count), uwb_z_coords, label='Raw Z', c='b')
-    ax3.plot(range(sample_count), filtered_z_coords, label='Filtered Z', c='r')
+    plot_decimated(ax3, range(sample_count), uwb_z_coords, label='Raw Z', c='b')
+    plot_decimated(ax3, range(sample_count), filtered_z_coords, label='Filtered Z', c='r')
     ax3.axhline(uwb_z_mean, 0, 1, label='Raw Z Mean', c='b', linestyle='dashed')
     ax3.axhline(filtered_z_mean, 0, 1, label='Filtered Z Mean', c='r', linestyle='dashed')
     ax3.axhline(reference_point[2], 0, 1, label='User Z', c='g')
@@ -430,49 +334,65 @@ def plot_line_charts(uwb_x_coords, uwb_y_coords, uwb_z_coords, filtered_x_coords
     ax2.set_ylim(y_axis_y_min - 0.1, y_axis_y_min + highest_range)
     ax3.set_ylim(z_axis_y_min - 0.1, z_axis_y_min + highest_range)
 
-    plt.show()
+    show_figures('line_charts')
 
     # Plot accelerations
     fig = plt.figure()
     ax1 = plt.subplot(311)
     ax1.set_title("Raw and filtered accelerations")
-    ax1.plot(range(sample_count), raw_x_accs, label='Raw X', c='b')
-    ax1.plot(range(sample_count), filtered_x_accs, label='Filtered X', c='r')
+    plot_decimated(ax1, range(sample_count), raw_x_accs, label='Raw X', c='b')
+    plot_decimated(ax1, range(sample_count), filtered_x_accs, label='Filtered X', c='r')
     #ax1.legend()
     ax1.legend(bbox_to_anchor=(1, 1.5), loc='upper center', ncol=1)
     ax1.set_ylabel('X')
 
     ax2 = plt.subplot(312)
-    ax2.plot(range(sample_count), raw_y_accs, label='Raw Y', c='b')
-    ax2.plot(range(sample_count), filtered_y_accs, label='Filtered Y', c='r')
+    plot_decimated(ax2, range(sample_count), raw_y_accs, label='Raw Y', c='b')
+    plot_decimated(ax2, range(sample_count), filtered_y_accs, label='Filtered Y', c='r')
     #ax2.legend()
     ax2.set_ylabel('Y')
 
     ax3 = plt.subplot(313)
-    ax3.plot(range(sample_count), raw_z_accs, label='Raw Z', c='b')
-    ax3.plot(range(sample_count), filtered_z_accs, label='Filtered Z', c='r')
+    plot_decimated(ax3, range(sample_count), raw_z_accs, label='Raw Z', c='b')
+    plot_decimated(ax3, range(sample_count), filtered_z_accs, label='Filtered Z', c='r')
     ax3.axhline(2.0, 0, 1, label='Z Acc Threshold', c='g')
     ax3.axhline(-2.0, 0, 1, c='g')
     #ax3.legend()
     ax3.set_xlabel('Time')
     ax3.set_ylabel('Z')
 
-    plt.show()
+    show_figures('accelerations')
 
 if __name__ == "__main__":
+    parse_output_arguments()
+    chunk_size = parse_stream_arguments()
+    direction, reference_point = parse_reference_arguments()
+    smoothed = SMOOTHED_OPTION in sys.argv
+    if smoothed:
+        sys.argv.remove(SMOOTHED_OPTION)
     try:
         filename = sys.argv[1]
     except IndexError:
         print_no_document_found_error()
         sys.exit(1)
+    if chunk_size is not None and not os.path.isfile(filename):
+        print("ERROR: Streaming reads the document twice and therefore needs a regular file, not {}".format(filename))
+        sys.exit(1)
+    if chunk_size is not None and smoothed:
+        print("ERROR: Smoothing needs all samples at once and cannot be combined with streaming")
+        sys.exit(1)
 
-    direction = filename.split('(')[0]
-    x_reference = float((filename.split('(')[1].split(')')[0].split('_')[0]).replace(',', '.'))
-    y_reference = float((filename.split('(')[1].split(')')[0].split('_')[1]).replace(',', '.'))
-    z_reference = float((filename.split('(')[1].split(')')[0].split('_')[2]).replace(',', '.'))
-    reference_point = [x_reference, y_reference, z_reference]
+    # The options take precedence over the values held by the filename
+    filename_direction, filename_reference_point = parse_filename_reference(filename)
+    direction = direction if direction is not None else filename_direction
+    reference_point = reference_point if reference_point is not None else filename_reference_point
+    if reference_point is None or len(reference_point) != 3 or direction not in quiver_directions:
+        print("ERROR: {} does not hold the direction and reference point in its name".format(filename))
+        print("Please give them with --direction <N|E|S|W> and --reference <x>,<y>,<z>, e.g. --direction N --reference 1,0,1.73")
+        sys.exit(1)
+    x_reference, y_reference, z_reference = reference_point
 
-    sample_count, uwb_x_mean, uwb_y_mean, uwb_z_mean, filtered_x_mean, filtered_y_mean, filtered_z_mean, uwb_mean_distance_to_ref_point_2D, uwb_mean_distance_to_ref_point_3D, uwb_rms_distance_to_ref_point_2D, uwb_rms_distance_to_ref_point_3D, uwb_max_distance_to_ref_point_2D, uwb_max_distance_to_ref_point_3D, filtered_mean_distance_to_ref_point_2D, filtered_mean_distance_to_ref_point_3D, filtered_rms_distance_to_ref_point_2D, filtered_rms_distance_to_ref_point_3D, filtered_max_distance_to_ref_point_2D, filtered_max_distance_to_ref_point_3D, uwb_std_2D_distances_to_ref_point, uwb_std_3D_distances_to_ref_point, filtered_std_2D_distances_to_ref_point, filtered_std_3D_distances_to_ref_point, uwb_mean_distance_to_samples_center_point_2D, uwb_mean_distance_to_samples_center_point_3D, uwb_rms_distance_to_samples_center_point_2D, uwb_rms_distance_to_samples_center_point_3D, uwb_max_distance_to_samples_center_point_2D, uwb_max_distance_to_samples_center_point_3D, uwb_std_2D_distances_to_samples_center_point, uwb_std_3D_distances_to_samples_center_point, filtered_mean_distance_to_samples_center_point_2D, filtered_mean_distance_to_samples_center_point_3D, filtered_rms_distance_to_samples_center_point_2D, filtered_rms_distance_to_samples_center_point_3D, filtered_max_distance_to_samples_center_point_2D, filtered_max_distance_to_samples_center_point_3D, filtered_std_2D_distances_to_samples_center_point, filtered_std_3D_distances_to_samples_center_point, uwb_mean_delta_distance_2D, uwb_mean_delta_distance_3D, uwb_rms_delta_distance_2D, uwb_rms_delta_distance_3D, uwb_max_delta_distance_2D, uwb_max_delta_distance_3D, uwb_std_delta_distance_2D, uwb_std_delta_distance_3D, filtered_mean_delta_distance_2D, filtered_mean_delta_distance_3D, filtered_rms_delta_distance_2D, filtered_rms_delta_distance_3D, filtered_max_delta_distance_2D, filtered_max_delta_distance_3D, filtered_std_delta_distance_2D, filtered_std_delta_distance_3D, uwb_x_coords, uwb_y_coords, uwb_z_coords, filtered_x_coords, filtered_y_coords, filtered_z_coords, uwb_points, filtered_points, uwb_x_mean, uwb_y_mean, uwb_z_mean, uwb_mean_point, filtered_x_mean, filtered_y_mean, filtered_z_mean, filtered_mean_point, raw_x_accs, raw_y_accs, raw_z_accs, filtered_x_accs, filtered_y_accs, filtered_z_accs = evaluate_data(filename, reference_point)
+    sample_count, uwb_x_mean, uwb_y_mean, uwb_z_mean, filtered_x_mean, filtered_y_mean, filtered_z_mean, uwb_mean_distance_to_ref_point_2D, uwb_mean_distance_to_ref_point_3D, uwb_rms_distance_to_ref_point_2D, uwb_rms_distance_to_ref_point_3D, uwb_max_distance_to_ref_point_2D, uwb_max_distance_to_ref_point_3D, filtered_mean_distance_to_ref_point_2D, filtered_mean_distance_to_ref_point_3D, filtered_rms_distance_to_ref_point_2D, filtered_rms_distance_to_ref_point_3D, filtered_max_distance_to_ref_point_2D, filtered_max_distance_to_ref_point_3D, uwb_std_2D_distances_to_ref_point, uwb_std_3D_distances_to_ref_point, filtered_std_2D_distances_to_ref_point, filtered_std_3D_distances_to_ref_point, uwb_mean_distance_to_samples_center_point_2D, uwb_mean_distance_to_samples_center_point_3D, uwb_rms_distance_to_samples_center_point_2D, uwb_rms_distance_to_samples_center_point_3D, uwb_max_distance_to_samples_center_point_2D, uwb_max_distance_to_samples_center_point_3D, uwb_std_2D_distances_to_samples_center_point, uwb_std_3D_distances_to_samples_center_point, filtered_mean_distance_to_samples_center_point_2D, filtered_mean_distance_to_samples_center_point_3D, filtered_rms_distance_to_samples_center_point_2D, filtered_rms_distance_to_samples_center_point_3D, filtered_max_distance_to_samples_center_point_2D, filtered_max_distance_to_samples_center_point_3D, filtered_std_2D_distances_to_samples_center_point, filtered_std_3D_distances_to_samples_center_point, uwb_mean_delta_distance_2D, uwb_mean_delta_distance_3D, uwb_rms_delta_distance_2D, uwb_rms_delta_distance_3D, uwb_max_delta_distance_2D, uwb_max_delta_distance_3D, uwb_std_delta_distance_2D, uwb_std_delta_distance_3D, filtered_mean_delta_distance_2D, filtered_mean_delta_distance_3D, filtered_rms_delta_distance_2D, filtered_rms_delta_distance_3D, filtered_max_delta_distance_2D, filtered_max_delta_distance_3D, filtered_std_delta_distance_2D, filtered_std_delta_distance_3D, uwb_x_coords, uwb_y_coords, uwb_z_coords, filtered_x_coords, filtered_y_coords, filtered_z_coords, uwb_points, filtered_points, uwb_x_mean, uwb_y_mean, uwb_z_mean, uwb_mean_point, filtered_x_mean, filtered_y_mean, filtered_z_mean, filtered_mean_point, raw_x_accs, raw_y_accs, raw_z_accs, filtered_x_accs, filtered_y_accs, filtered_z_accs, smoothed_metrics = evaluate_data(filename, reference_point, chunk_size, smoothed)
     print("\n")
     print("GENERAL INFORMATION")
     print("Direction: {}, Samples collected: {}".format(direction, sample_count))
@@ -502,8 +422,21 @@ if __name__ == "__main__":
     print("Mean | RMS | Max | Std filtered delta distances 3D: {:.3f} | {:.3f} | {:.3f} | {:.3f}m".format(filtered_mean_delta_distance_3D, filtered_rms_delta_distance_3D, filtered_max_delta_distance_3D, filtered_std_delta_distance_3D))
     print("\n")
 
+    if smoothed_metrics is not None:
+        print("SMOOTHED RESULTS")
+        print("Smoothed X Mean: {:.3f}, Smoothed Y Mean: {:.3f}, Smoothed Z Mean: {:.3f}".format(*smoothed_metrics['centroid']))
+        for title, key in [('distances to reference point', 'distance_to_reference'), ('distances to measurement centroid', 'distance_to_centroid'), ('delta distances', 'delta_distance')]:
+            for dimensions in ['2D', '3D']:
+                values = [smoothed_metrics['{}_{}_{}'.format(statistic, key, dimensions)] for statistic in ['mean', 'rms', 'max', 'std']]
+                print("Mean | RMS | Max | Std smoothed {} {}: {:.3f} | {:.3f} | {:.3f} | {:.3f}m".format(title, dimensions, *values))
+        print("\n")
+
     print("All values in meter units")
 
+    # Nothing to plot without the samples
+    if chunk_size is not None:
+        sys.exit(0)
+
     # Plot 2D coordinates in cartesian and polar coordinate system
     plot_coordinates(direction, uwb_points, filtered_points, uwb_mean_point, filtered_mean_point, reference_point)
 
@@ -0,0 +1,209 @@
+import argparse
+import fnmatch
+import hashlib
+import numpy as np
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'helper_scripts'))
+from all_measurements_evaluation import parse_reference_position
+from kalman_filter import DEFAULT_FILTER_PARAMETERS, replay_batch
+from position_metrics import segmented_position_metrics
+from recording_loader import load_recording
+from recording_summaries import get_recording_state
+
+"""
+This script searches the noise constants of the app's Kalman filter which give the best filtered positions on a
+stationary measurement campaign. Every candidate set of constants is replayed over all recordings of the campaign (see
+kalman_filter.py) and scored with the accuracy, precision and jitter definitions of all_measurements_evaluation.py:
+the mean over all files of the mean distance of the filtered positions to the reference position, to their centroid
+and to the previous position. Candidates come from a grid or are drawn at random from the ranges below.
+Candidates are replayed in batches of lock-step filters, spread over a pool of processes. The scores of every finished
+batch are written to a checkpoint file, and running the same sweep again resumes with the batches not finished yet.
+The app's constants are always evaluated as the first candidate for comparison.
+"""
+
+# Searched range of every filter constant as (low, high, logarithmic)
+SWEEP_RANGES = {
+    'process_noise_z_coordinate_regular': (1e-9, 1e-5, True),
+    'process_noise_z_coordinate_dynamic': (1.0, 1e4, True),
+    'measurement_noise_z_acceleration_regular': (1e2, 1e6, True),
+    'measurement_noise_z_acceleration_static': (1e2, 1e6, True),
+    'acceleration_height_change_threshold': (1.0, 4.0, False),
+}
+PARAMETER_NAMES = list(DEFAULT_FILTER_PARAMETERS)
+
+# Campaign scores of a candidate and the per-file position metric (see position_metrics.py) each of them is the mean of
+SCORE_METRICS = {
+    'accuracy_2D': 'mean_distance_to_reference_2D',
+    'accuracy_3D': 'mean_distance_to_reference_3D',
+    'precision_2D': 'mean_distance_to_centroid_2D',
+    'precision_3D': 'mean_distance_to_centroid_3D',
+    'jitter_2D': 'mean_delta_distance_2D',
+    'jitter_3D': 'mean_delta_distance_3D',
+}
+SCORE_NAMES = list(SCORE_METRICS)
+# Scores weighted into the objective, see --weights
+OBJECTIVE_SCORE_NAMES = ['accuracy_3D', 'precision_3D', 'jitter_3D']
+
+DEFAULT_GRID_SIZE = 4
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_CHECKPOINT = 'kalman_sweep_checkpoint.npz'
+# Number of the best candidates printed
+REPORTED_CANDIDATE_COUNT = 10
+
+# Returns the names of the swept constants. The static Z acceleration noise only applies to a device lying on its back
+# and the regular one only to an upright device, so only the one used by the replay is swept.
+def get_swept_parameter_names(z_acceleration_reliable=True):
+    unused_name = 'measurement_noise_z_acceleration_static' if z_acceleration_reliable else 'measurement_noise_z_acceleration_regular'
+    return [name for name in PARAMETER_NAMES if name != unused_name]
+
+def get_range_values(name, count):
+    low, high, logarithmic = SWEEP_RANGES[name]
+    return np.geomspace(low, high, count) if logarithmic else np.linspace(low, high, count)
+
+# Returns the candidates as an array of shape (candidates, parameters) holding the constants in the order of
+# PARAMETER_NAMES, the app's constants first. Constants which are not swept keep the app's value.
+def get_candidates(swept_parameter_names, grid_size=DEFAULT_GRID_SIZE, random_count=None, seed=0):
+    defaults = np.array([DEFAULT_FILTER_PARAMETERS[name] for name in PARAMETER_NAMES])
+    if random_count is None:
+        swept_values = np.array(list(product(*[get_range_values(name, grid_size) for name in swept_parameter_names]))).reshape(-1, len(swept_parameter_names))
+    else:
+        rng = np.random.default_rng(seed)
+        swept_values = np.empty((random_count, len(swept_parameter_names)))
+        for i, name in enumerate(swept_parameter_names):
+            low, high, logarithmic = SWEEP_RANGES[name]
+            swept_values[:, i] = np.exp(rng.uniform(np.log(low), np.log(high), random_count)) if logarithmic else rng.uniform(low, high, random_count)
+    candidates = np.repeat(defaults[np.newaxis], len(swept_values) + 1, axis=0)
+    candidates[1:, [PARAMETER_NAMES.index(name) for name in swept_parameter_names]] = swept_values
+    return candidates
+
+def get_parameter_set(candidate):
+    return {name: float(value) for name, value in zip(PARAMETER_NAMES, candidate)}
+
+# Replays every candidate over all recordings in one batch of lock-step filters and returns the scores of shape
+# (candidates, scores) in the order of SCORE_NAMES
+def evaluate_candidates(recordings, reference_positions, candidates, z_acceleration_reliable=True):
+    file_count = len(recordings)
+    recording_indices = np.tile(np.arange(file_count), len(candidates))
+    parameter_sets = [get_parameter_set(candidate) for candidate in candidates for _ in range(file_count)]
+    # Filters are ordered by candidate, then by file
+    positions = replay_batch(recordings, parameter_sets, recording_indices, z_acceleration_reliable)[0]
+    lengths = np.array([len(recording) for recording in recordings], dtype=np.int64)[recording_indices]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    # Dropping the padding leaves the positions of all filters one after the other
+    valid = np.arange(positions.shape[1]) < lengths[:, np.newaxis]
+    metrics = segmented_position_metrics(positions[valid], offsets, np.asarray(reference_positions, dtype=float)[recording_indices])
+    return np.stack([metrics[SCORE_METRICS[name]].reshape(len(candidates), file_count).mean(axis=1) for name in SCORE_NAMES], axis=1)
+
+# Returns a key identifying a sweep, which changes with the candidates, the recordings and the replay options
+def get_sweep_key(paths, candidates, z_acceleration_reliable):
+    key = hashlib.sha1(np.ascontiguousarray(candidates).tobytes())
+    for path in paths:
+        key.update("{}:{};".format(os.path.basename(path), get_recording_state(path)).encode('utf-8'))
+    key.update(str(z_acceleration_reliable).encode('utf-8'))
+    return key.hexdigest()[:16]
+
+# Returns the scores of the checkpoint of a sweep, with NaN for candidates not evaluated yet, or None if there is no
+# checkpoint. A checkpoint of another sweep is an error rather than being overwritten.
+def load_checkpoint(checkpoint_path, sweep_key):
+    try:
+        with np.load(checkpoint_path) as f:
+            checkpoint_sweep_key, scores = str(f['sweep_key']), f['scores']
+    except FileNotFoundError:
+        return None
+    if checkpoint_sweep_key != sweep_key:
+        raise ValueError("{} is the checkpoint of another sweep, remove it or choose another checkpoint file".format(checkpoint_path))
+    return scores
+
+# Persists the scores of a sweep. It is written to a temporary file first so that an interruption while writing never
+# leaves a broken checkpoint behind.
+def save_checkpoint(checkpoint_path, sweep_key, candidates, scores):
+    temporary_path = '{}.{}.tmp'.format(checkpoint_path, os.getpid())
+    with open(temporary_path, 'wb') as f:
+        np.savez(f, sweep_key=sweep_key, parameter_names=np.array(PARAMETER_NAMES), score_names=np.array(SCORE_NAMES), candidates=candidates, scores=scores)
+    os.replace(temporary_path, checkpoint_path)
+
+# Evaluates all candidates not evaluated yet in batches, in a pool of 'jobs' processes if jobs > 1, and returns the
+# scores of all candidates. The checkpoint is updated after every finished batch.
+def run_sweep(paths, reference_positions, candidates, z_acceleration_reliable=True, jobs=1, batch_size=DEFAULT_BATCH_SIZE, checkpoint_path=DEFAULT_CHECKPOINT):
+    sweep_key = get_sweep_key(paths, candidates, z_acceleration_reliable)
+    scores = load_checkpoint(checkpoint_path, sweep_key)
+    if scores is None:
+        scores = np.full((len(candidates), len(SCORE_NAMES)), np.nan)
+    pending_indices = np.flatnonzero(np.isnan(scores).any(axis=1))
+    if len(pending_indices) < len(candidates):
+        print("Resuming from {}, {} of {} candidates evaluated".format(checkpoint_path, len(candidates) - len(pending_indices), len(candidates)))
+    batches = [pending_indices[i:i + batch_size] for i in range(0, len(pending_indices), batch_size)]
+    recordings = [load_recording(path) for path in paths]
+
+    def finish_batch(batch, batch_scores):
+        scores[batch] = batch_scores
+        save_checkpoint(checkpoint_path, sweep_key, candidates, scores)
+        print("{} of {} candidates evaluated".format(np.count_nonzero(~np.isnan(scores).any(axis=1)), len(candidates)))
+
+    if jobs <= 1:
+        for batch in batches:
+            finish_batch(batch, evaluate_candidates(recordings, reference_positions, candidates[batch], z_acceleration_reliable))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(evaluate_candidates, recordings, reference_positions, candidates[batch], z_acceleration_reliable): batch for batch in batches}
+            for future in as_completed(futures):
+                finish_batch(futures[future], future.result())
+    return scores
+
+def parse_weights(string):
+    weights = [float(value) for value in string.split(',')]
+    if len(weights) != len(OBJECTIVE_SCORE_NAMES):
+        raise argparse.ArgumentTypeError("Expected {} comma separated weights".format(len(OBJECTIVE_SCORE_NAMES)))
+    return weights
+
+def print_candidate(title, candidate, candidate_scores, swept_parameter_names):
+    print(title)
+    print("   " + " | ".join("{} {:.3g}".format(name, candidate[PARAMETER_NAMES.index(name)]) for name in swept_parameter_names))
+    print("   Accuracy 2D | 3D: {:.3f} | {:.3f}m, Precision 2D | 3D: {:.3f} | {:.3f}m, Jitter 2D | 3D: {:.3f} | {:.3f}m".format(*candidate_scores))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Searches the Kalman filter noise constants giving the best filtered positions on a stationary measurement campaign.")
+    parser.add_argument('directory', help="Directory holding the .txt measurements")
+    parser.add_argument('--grid-size', type=int, default=DEFAULT_GRID_SIZE, help="Number of values of every constant in the grid search (default: %(default)s)")
+    parser.add_argument('--random', type=int, metavar='COUNT', help="Draw COUNT random candidates instead of searching a grid")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random candidates (default: %(default)s)")
+    parser.add_argument('--static-z-acceleration', action='store_true', help="Replay as if the device was lying on its back, which sweeps the static instead of the regular Z acceleration noise")
+    parser.add_argument('--weights', type=parse_weights, default=[1.0, 1.0, 1.0], help="Weights of 3D accuracy, precision and jitter in the objective (default: 1,1,1)")
+    parser.add_argument('--jobs', type=int, default=1, help="Number of processes evaluating batches in parallel (default: %(default)s)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Number of candidates replayed at once (default: %(default)s)")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="Checkpoint file, an interrupted sweep resumes from it (default: %(default)s)")
+    args = parser.parse_args()
+
+    files = sorted(fnmatch.filter(os.listdir(args.directory), '*.txt'))
+    if len(files) == 0:
+        parser.error("No .txt measurements in {}".format(args.directory))
+    paths = [os.path.join(args.directory, filename) for filename in files]
+    reference_positions = [parse_reference_position(filename) for filename in files]
+    z_acceleration_reliable = not args.static_z_acceleration
+    swept_parameter_names = get_swept_parameter_names(z_acceleration_reliable)
+    candidates = get_candidates(swept_parameter_names, args.grid_size, args.random, args.seed)
+
+    print("")
+    print("Sweeping {} candidates over {} files".format(len(candidates), len(files)))
+    try:
+        scores = run_sweep(paths, reference_positions, candidates, z_acceleration_reliable, args.jobs, args.batch_size, args.checkpoint)
+    except KeyboardInterrupt:
+        print("Interrupted, run the same sweep again to resume from {}".format(args.checkpoint))
+        sys.exit(1)
+    except ValueError as error:
+        parser.error(str(error))
+    objectives = scores[:, [SCORE_NAMES.index(name) for name in OBJECTIVE_SCORE_NAMES]] @ np.array(args.weights)
+
+    print("")
+    print("KALMAN FILTER PARAMETER SWEEP RESULTS")
+    print_candidate("App constants: objective {:.4f}".format(objectives[0]), candidates[0], scores[0], swept_parameter_names)
+    for rank, i in enumerate(np.argsort(objectives, kind='stable')[:REPORTED_CANDIDATE_COUNT]):
+        print_candidate("{}. Objective {:.4f}".format(rank + 1, objectives[i]), candidates[i], scores[i], swept_parameter_names)
+    print("")
+    print("All values in meter units")
+    print("")
@@ -0,0 +1,34 @@
+import fnmatch
+import os
+import shutil
+from all_measurements_evaluation import evaluate_directory
+from recording_summaries import SUMMARY_SUFFIX, get_summary_directory
+
+"""
+Tests of the campaign evaluation. Run with: python3 -m pytest test_all_measurements_evaluation.py
+"""
+
+CAMPAIGN_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# Recordings copied into the temporary campaign of a test
+RECORDING_COUNT = 6
+
+def copy_campaign(directory):
+    filenames = sorted(fnmatch.filter(os.listdir(CAMPAIGN_DIRECTORY), '*.txt'))[:RECORDING_COUNT]
+    for filename in filenames:
+        shutil.copy(os.path.join(CAMPAIGN_DIRECTORY, filename), directory)
+    return filenames
+
+def get_summary_names(directory):
+    return set(name for name in os.listdir(get_summary_directory(directory)) if name.endswith(SUMMARY_SUFFIX))
+
+# Shards sharing a campaign directory keep each other's summaries, and a later run reuses the summaries of all shards
+def test_shards_keep_the_summaries_of_other_shards(tmp_path):
+    filenames = copy_campaign(tmp_path)
+    shard_paths = [evaluate_directory(str(tmp_path), shard=(shard_index, 2))[0] for shard_index in range(2)]
+    assert sorted(os.path.basename(path) for paths in shard_paths for path in paths) == filenames
+    assert get_summary_names(tmp_path) == set(filename + SUMMARY_SUFFIX for filename in filenames)
+
+    # Summaries of removed recordings are still removed
+    os.remove(os.path.join(tmp_path, filenames[0]))
+    evaluate_directory(str(tmp_path), shard=(1, 2))
+    assert get_summary_names(tmp_path) == set(filename + SUMMARY_SUFFIX for filename in filenames[1:])